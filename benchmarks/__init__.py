@@ -0,0 +1,16 @@
+"""Benchmarks for derivater.
+
+Run them like this:
+
+    python3 -m benchmarks --output results.json
+
+See ``python3 -m benchmarks --help`` for all options. The benchmarks time
+derivater operations on random expressions of increasing sizes, and then fit
+``seconds = c * nodes**exponent`` to the results. Operations with an exponent
+clearly above 1 are reported as superlinear, and the exit status is 1 if
+there are any, so this can be ran before releasing to catch quadratic
+regressions.
+
+These are not ran by pytest. The results depend on the computer, so compare
+results from the same computer only.
+"""
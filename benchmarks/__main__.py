@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+
+from benchmarks import run
+
+
+def _int_list(string):
+    return [int(item) for item in string.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks',
+        description="Time derivater on random expressions.")
+    parser.add_argument(
+        '--sizes', type=_int_list, default=run.DEFAULT_SIZES,
+        help="comma-separated numbers of terms, default: %(default)s")
+    parser.add_argument(
+        '--operations', type=lambda string: string.split(','),
+        default=sorted(run.OPERATIONS),
+        help="comma-separated subset of: " + ', '.join(sorted(run.OPERATIONS)))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--samples', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--width', type=int, default=3)
+    parser.add_argument('--sharing', type=float, default=0.1)
+    parser.add_argument(
+        '--threshold', type=float, default=1.3,
+        help="exponents above this are superlinear, default: %(default)s")
+    parser.add_argument(
+        '--max-seconds', type=float, default=5.0,
+        help="skip bigger sizes after a call takes this long")
+    parser.add_argument(
+        '--output', help="save results to this JSON file")
+    args = parser.parse_args()
+
+    for name in args.operations:
+        if name not in run.OPERATIONS:
+            parser.error("unknown operation: %r" % name)
+
+    results = run.run(
+        sizes=args.sizes, operations=args.operations, seed=args.seed,
+        samples=args.samples, repeat=args.repeat, threshold=args.threshold,
+        max_seconds=args.max_seconds,
+        generator_settings={'depth': args.depth, 'width': args.width,
+                            'sharing': args.sharing},
+        progress=print)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+
+    print()
+    for name, exponent in sorted(results['exponents'].items()):
+        if exponent is None:
+            print('%-16s not enough data' % name)
+        else:
+            print('%-16s nodes**%.2f' % (name, exponent))
+
+    if results['superlinear']:
+        print("superlinear: " + ', '.join(results['superlinear']),
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
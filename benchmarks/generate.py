@@ -0,0 +1,99 @@
+"""Seeded random expressions for benchmarking."""
+
+import random
+
+import derivater
+
+
+# how often each kind of node is chosen when a non-leaf node is created
+DEFAULT_OPERATORS = {'add': 3, 'mul': 3, 'pow': 2, 'function': 2}
+
+DEFAULT_FUNCTIONS = ['sin', 'cos', 'tan', 'ln', 'exp']
+
+SYMBOLS = [derivater.Symbol(name) for name in 'xyz']
+
+
+class Generator:
+    """Creates random math objects.
+
+    The same seed and settings always give the same expressions.
+
+    * *depth* is the maximum depth of each term.
+    * *width* is the maximum number of things added or multiplied together in
+      one :class:`derivater.Add` or :class:`derivater.Mul`.
+    * *operators* is a dict like :data:`DEFAULT_OPERATORS` with relative
+      weights as values.
+    * *functions* is a list of names of functions in the derivater module.
+    * *sharing* is the probability of reusing a subtree that has already been
+      created instead of creating a new one. Shared subtrees are the same
+      Python object, like they often are in trees that derivater creates.
+    """
+
+    def __init__(self, seed=0, *, depth=4, width=3, operators=None,
+                 functions=None, sharing=0.1):
+        if operators is None:
+            operators = DEFAULT_OPERATORS
+        if functions is None:
+            functions = DEFAULT_FUNCTIONS
+
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.width = width
+        self.operator_names = sorted(operators)
+        self.operator_weights = [operators[name]
+                                 for name in self.operator_names]
+        self.functions = [getattr(derivater, name) for name in functions]
+        self.sharing = sharing
+        self._created = []
+
+    def leaf(self):
+        if self.random.random() < 0.7:
+            return self.random.choice(SYMBOLS)
+        return derivater.mathify(self.random.randint(1, 9))
+
+    def tree(self, depth=None):
+        """Return a random math object that is at most *depth* levels deep.
+
+        The depth defaults to the *depth* given to the generator.
+        """
+        if depth is None:
+            depth = self.depth
+        if depth <= 1 or self.random.random() < 0.2:
+            return self.leaf()
+        if self._created and self.random.random() < self.sharing:
+            return self.random.choice(self._created)
+
+        [kind] = self.random.choices(self.operator_names,
+                                     self.operator_weights)
+        if kind == 'add' or kind == 'mul':
+            count = self.random.randint(2, max(2, self.width))
+            objects = [self.tree(depth - 1) for i in range(count)]
+            klass = derivater.Add if kind == 'add' else derivater.Mul
+            result = klass(objects).gentle_simplify()
+        elif kind == 'pow':
+            exponent = self.random.choice([-2, -1, 2, 3])
+            result = self.tree(depth - 1)**exponent
+        elif kind == 'function':
+            result = self.random.choice(self.functions)(self.tree(depth - 1))
+        else:
+            raise ValueError("unknown operator: %r" % kind)
+
+        self._created.append(result)
+        return result
+
+    def expression(self, size):
+        """Return a sum of *size* random trees.
+
+        The sum is usually a bit smaller than *size* terms because similar
+        terms get combined.
+        """
+        return derivater.Add([self.tree() for i in range(size)]
+                             ).gentle_simplify()
+
+
+def generate(size, seed=0, **settings):
+    """Return a random expression.
+
+    This is a shorthand for ``Generator(seed, **settings).expression(size)``.
+    """
+    return Generator(seed, **settings).expression(size)
@@ -0,0 +1,126 @@
+"""Time fitting a model with derivater.optimize.
+
+Run this like this:
+
+    python3 -m benchmarks.optimize --points 2,4,8
+
+This fits ``a*e**(b*t) + c`` to data points with least squares. The same
+gradient descent loop runs with two ways to get the value and the gradient:
+differentiating the sum of squares and substituting the parameters on every
+step, and calling the function that derivater.optimize compiles once. Then
+minimize() is timed with each method, with and without the setup that
+differentiates and compiles. Differentiating the sum of squares is slow, so
+the default numbers of points and steps are small.
+"""
+
+import argparse
+import math
+import random
+
+import derivater
+import derivater.optimize
+from derivater import Symbol, e
+from benchmarks.run import time_call
+
+
+a, b, c = map(Symbol, 'abc')
+PARAMETERS = (a, b, c)
+
+
+def sum_of_squares(points, seed=0):
+    """Return the least squares error of ``a*e**(b*t) + c`` as a math object.
+
+    The data is ``2*e**(t/2) - 1`` with a little bit of noise.
+    """
+    rng = random.Random(seed)
+    terms = []
+    for i in range(points):
+        t = derivater.mathify(i) / points
+        data = 2*math.exp(float(t)/2) - 1 + rng.uniform(-0.01, 0.01)
+        data = derivater.mathify(round(data * 1000)) / 1000
+        terms.append((a*e**(b*t) + c - data)**2)
+    # adding the terms one by one would simplify the sum many times
+    return derivater.Add(terms).gentle_simplify()
+
+
+def naive_evaluator(expr):
+    """Differentiate and substitute on every call."""
+    def evaluate(point):
+        substitutions = dict(zip(PARAMETERS, point))
+        results = [expr] + [expr.derivative(p) for p in PARAMETERS]
+        return [float(derivater.evalf(result, substitutions, prec=17))
+                for result in results]
+    return evaluate
+
+
+def compiled_evaluator(expr):
+    """Call the fused function that derivater.optimize compiles."""
+    func = derivater.optimize._compile_objective(expr, PARAMETERS, (), False)
+    return lambda point: func(*point)
+
+
+def gradient_descent(evaluate, steps, step_size=1e-3):
+    point = [1.0, 1.0, 0.0]
+    for i in range(steps):
+        value, *gradient = evaluate(point)
+        point = [p - step_size*g for p, g in zip(point, gradient)]
+    return point
+
+
+def _int_list(string):
+    return [int(item) for item in string.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks.optimize',
+        description="Time fitting a model with derivater.optimize.")
+    parser.add_argument(
+        '--points', type=_int_list, default=[2, 4, 8],
+        help="comma-separated numbers of data points")
+    parser.add_argument(
+        '--steps', type=int, default=100,
+        help="gradient descent steps with the compiled function")
+    parser.add_argument(
+        '--naive-steps', type=int, default=2,
+        help="gradient descent steps when differentiating every step")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for points in args.points:
+        expr = sum_of_squares(points)
+        print("%d points" % points)
+
+        # the first call differentiates and compiles
+        derivater.optimize._compile_objective.cache_clear()
+        setup = time_call(compiled_evaluator, expr, 1)
+
+        naive = time_call(
+            lambda evaluate: gradient_descent(evaluate, args.naive_steps),
+            naive_evaluator(expr), 1) / args.naive_steps
+        compiled = time_call(
+            lambda evaluate: gradient_descent(evaluate, args.steps),
+            compiled_evaluator(expr), args.repeat) / args.steps
+        print("  differentiating every step: %.6f sec/step" % naive)
+        print("  compiled once:              %.6f sec/step "
+              "(%.0fx faster, setup took %.6f sec)" % (
+                  compiled, naive / compiled, setup))
+
+        for method in derivater.optimize.METHODS:
+            def fit(expr):
+                return derivater.optimize.minimize(
+                    expr, PARAMETERS, [1, 1, 0], method=method,
+                    max_iterations=10000)
+
+            derivater.optimize._compile_objective.cache_clear()
+            first = time_call(fit, expr, 1)
+            again = time_call(fit, expr, args.repeat)
+            result = fit(expr)
+            print("  minimize(method=%r): %.6f sec, first call %.6f sec, "
+                  "%d iterations, converged=%s" % (
+                      method, again, first, result.iterations,
+                      result.converged))
+
+
+if __name__ == '__main__':
+    main()
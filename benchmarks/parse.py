@@ -0,0 +1,67 @@
+"""Time derivater.parse() on many expressions.
+
+Run this like this:
+
+    python3 -m benchmarks.parse --count 100000
+
+The expressions are reprs of random expressions, and eval() with the
+namespace of derivater.__main__ is timed too for comparison, with fewer
+expressions because it's slow. Note that eval() gets some expressions wrong
+because 1 / 2 is 0.5 in Python, and those are skipped when timing it.
+"""
+
+import argparse
+import time
+
+import derivater
+import derivater.__main__
+from benchmarks.generate import Generator
+
+
+def make_strings(count, unique=1000, seed=0):
+    """Return a list of *count* strings with *unique* different strings."""
+    generator = Generator(seed, depth=3, sharing=0)
+    strings = [repr(generator.expression(3)) for i in range(unique)]
+    return [strings[i % unique] for i in range(count)]
+
+
+def time_parsing(strings, parse):
+    start = time.perf_counter()
+    for string in strings:
+        parse(string)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks.parse',
+        description="Time derivater.parse() against eval().")
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--unique', type=int, default=1000)
+    parser.add_argument('--eval-count', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    strings = make_strings(args.count, args.unique, args.seed)
+    namespace = vars(derivater.__main__)
+
+    def can_eval(string):
+        try:
+            eval(string, namespace)
+            return True
+        except TypeError:
+            return False
+
+    evaluable = set(filter(can_eval, set(strings)))
+    for name, parse, strings in [
+            ('parse', derivater.parse, strings),
+            ('eval', lambda string: eval(string, namespace),
+             [string for string in strings[:args.eval_count]
+              if string in evaluable])]:
+        seconds = time_parsing(strings, parse)
+        print('%-6s %d expressions in %.3f sec, %.1f usec each' % (
+            name, len(strings), seconds, seconds / len(strings) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
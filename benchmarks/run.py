@@ -0,0 +1,112 @@
+"""Time derivater operations and fit complexity exponents."""
+
+import math
+import platform
+import time
+
+import derivater
+from derivater._stats import tree_size
+from benchmarks.generate import Generator, SYMBOLS
+
+
+x, y, z = SYMBOLS
+
+OPERATIONS = {
+    'derivative': lambda expr: expr.derivative(x),
+    'gentle_simplify': lambda expr: expr.gentle_simplify(),
+    'simplify': lambda expr: derivater.simplify(expr),
+    'trig_simplify': lambda expr: derivater.trig_simplify(expr),
+    'repr': repr,
+    'replace': lambda expr: expr.replace(x, y + 1),
+}
+
+DEFAULT_SIZES = [5, 10, 20, 40, 80]
+
+
+def time_call(func, arg, repeat):
+    """Return the fastest of *repeat* runs of func(arg) in seconds."""
+    best = math.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def fit_exponent(points):
+    """Fit ``seconds = c * nodes**exponent`` to ``(nodes, seconds)`` pairs.
+
+    This returns the exponent, or None if there are less than 2 distinct node
+    counts. The fit is a least squares line in log-log scale.
+    """
+    points = [(math.log(nodes), math.log(seconds))
+              for nodes, seconds in points if nodes > 0 and seconds > 0]
+    if len({log_nodes for log_nodes, log_seconds in points}) < 2:
+        return None
+
+    mean_x = sum(px for px, py in points) / len(points)
+    mean_y = sum(py for px, py in points) / len(points)
+    numerator = sum((px - mean_x)*(py - mean_y) for px, py in points)
+    denominator = sum((px - mean_x)**2 for px, py in points)
+    return numerator / denominator
+
+
+def run(*, sizes=DEFAULT_SIZES, operations=None, seed=0, samples=3,
+        repeat=3, threshold=1.3, max_seconds=5.0, generator_settings=None,
+        progress=None):
+    """Run the benchmarks and return the results as a JSON-compatible dict.
+
+    For each size, *samples* different expressions are generated, and each
+    operation is timed *repeat* times on each of them. An operation is skipped
+    for bigger sizes once a single call takes more than *max_seconds*.
+    Operations whose fitted exponent is more than *threshold* are listed in
+    the ``'superlinear'`` list of the result.
+
+    If *progress* is given, it's called with a string after each measurement.
+    """
+    if operations is None:
+        operations = sorted(OPERATIONS)
+    if generator_settings is None:
+        generator_settings = {}
+
+    # generate everything first so that all operations get the same input
+    inputs = []
+    for size in sizes:
+        for sample in range(samples):
+            generator = Generator(seed + sample, **generator_settings)
+            expr = generator.expression(size)
+            inputs.append((size, tree_size(expr, {}), expr))
+
+    results = {}
+    exponents = {}
+    for name in operations:
+        func = OPERATIONS[name]
+        results[name] = []
+        for size, nodes, expr in inputs:
+            seconds = time_call(func, expr, repeat)
+            results[name].append({
+                'size': size, 'nodes': nodes, 'seconds': seconds})
+            if progress is not None:
+                progress('%-16s size=%-5d nodes=%-7d %.6f sec' % (
+                    name, size, nodes, seconds))
+            if seconds > max_seconds:
+                break
+
+        exponents[name] = fit_exponent(
+            [(result['nodes'], result['seconds'])
+             for result in results[name]])
+
+    return {
+        'derivater_version': derivater.__version__,
+        'python_version': platform.python_version(),
+        'settings': {
+            'sizes': list(sizes), 'seed': seed, 'samples': samples,
+            'repeat': repeat, 'threshold': threshold,
+            'generator': generator_settings,
+        },
+        'results': results,
+        'exponents': exponents,
+        'superlinear': sorted(
+            name for name, exponent in exponents.items()
+            if exponent is not None and exponent > threshold),
+    }
@@ -0,0 +1,73 @@
+"""Time derivatives of power towers like ``x**x**x**x``.
+
+Run this like this:
+
+    python3 -m benchmarks.towers --heights 2,3,4
+
+Both the base and the exponent of every power in a tower depend on x, so
+this times the general rule of Pow.derivative(). The towers with integer
+exponents, like ``(((x**2)**2)**2)``, are not gentle_simplified and they time
+the fast path for constant exponents. The result of x**x**x**x**x is already
+huge, so the default heights are small.
+"""
+
+import argparse
+
+from derivater import Pow, Symbol
+from derivater._stats import tree_size
+from benchmarks.run import time_call, fit_exponent
+
+
+x = Symbol('x')
+
+
+def tower(height):
+    """Return ``x**x**...**x`` with *height* x's."""
+    result = x
+    for i in range(height - 1):
+        result = x**result
+    return result
+
+
+def integer_tower(height):
+    """Return ``Pow(Pow(...Pow(x, 2)..., 2), 2)`` with *height* Pows."""
+    result = x
+    for i in range(height):
+        result = Pow(result, 2)
+    return result
+
+
+def _int_list(string):
+    return [int(item) for item in string.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks.towers',
+        description="Time derivatives of power towers.")
+    parser.add_argument(
+        '--heights', type=_int_list, default=[2, 3, 4],
+        help="comma-separated heights of x**x**x towers")
+    parser.add_argument(
+        '--integer-heights', type=_int_list, default=[10, 20, 40, 80],
+        help="comma-separated heights of integer exponent towers")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for name, make_tower, heights in [
+            ('x**x**x', tower, args.heights),
+            ('integer', integer_tower, args.integer_heights)]:
+        points = []
+        for height in heights:
+            expr = make_tower(height)
+            seconds = time_call(lambda expr: expr.derivative(x), expr,
+                                args.repeat)
+            nodes = tree_size(expr, {})
+            points.append((nodes, seconds))
+            print('%-8s height=%-3d nodes=%-5d %.6f sec' % (
+                name, height, nodes, seconds))
+        print('%-8s exponent: %s' % (name, fit_exponent(points)))
+
+
+if __name__ == '__main__':
+    main()
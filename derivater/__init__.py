@@ -3,9 +3,20 @@ from derivater._base import (
     mathify, pythonify, MathObject, eq_and_hash, Symbol, SymbolFunction,
     Integer, Add, Mul, Pow, sqrt)
 from derivater._constants import NamedConstant, e, tau, pi
+from derivater._functions import register_function
 from derivater._explog import NaturalLog, exp, ln, log, log2, log10
 from derivater._trig import (
     trig_simplify, Sine, Cosine, Tangent, ArcSine, ArcCosine, ArcTangent,
     sin, cos, tan, sec, csc, cot, asin, acos, atan, asec, acsc, acot)
+from derivater._derivative import Derivative
+from derivater._budget import Budget, BudgetExceeded
+from derivater._egraph import simplify, egraph_simplify
+from derivater._stats import Stats, collect_stats
+from derivater._trace import Trace, TraceEntry, trace_rewrites
+from derivater._parse import parse
+from derivater._serialize import dumps, loads
+from derivater._evalf import evalf
+from derivater._interval import evaluate_interval
+from derivater._compile import compile_function, specialize
 
 __version__ = '1.0'
@@ -19,3 +19,9 @@ z = Symbol('z')
 # it's enough to mathify one of the objects, the other will be converted
 # automatically
 half = mathify(1) / 2
+
+if __name__ == '__main__':
+    import sys as _sys
+    if len(_sys.argv) > 1:
+        from derivater._cli import main as _main
+        _sys.exit(_main())
@@ -1,9 +1,12 @@
 import collections
 import fractions
 import functools
+import hashlib
 import math
 import operator
 
+from derivater import _budget, _trace
+
 try:
     from math import gcd
 except ImportError:     # pragma: no cover
@@ -61,6 +64,9 @@ def eq_and_hash(converters):
     ``frozenset(cdlist)`` will be used when hashing and comparing ``cdlist``.
     This means that it doesn't matter which order things are in, but any
     duplicates are ignored.
+
+    The hash is computed only once for each object, so don't change the
+    attributes after creating the object.
     """
     def get_stuff(instance):
         result = []
@@ -70,14 +76,29 @@ def eq_and_hash(converters):
             result.append(converter(getattr(instance, attr)))
         return tuple(result)
 
+    if converters and all(converter is None
+                          for converter in converters.values()):
+        # much faster, and this is what most classes use
+        get_stuff = operator.attrgetter(*sorted(converters))    # noqa
+
     def decorate(klass):
         def eq(self, other):
+            if self is other:
+                return True
             if not isinstance(other, klass):
                 return NotImplemented
             return get_stuff(self) == get_stuff(other)
 
+        # the objects don't change, so the hash is computed only once
+        #
+        # klass is hashed too, because otherwise e.g. sin(x) and x would have
+        # the same hash, and so would sin(sin(x)), sin(sin(sin(x))) etc
         def hash_(self):
-            return hash(get_stuff(self))
+            try:
+                return self._cached_hash
+            except AttributeError:
+                self._cached_hash = hash((klass, get_stuff(self)))
+                return self._cached_hash
 
         klass.__eq__ = eq
         klass.__hash__ = hash_
@@ -202,7 +223,7 @@ bject contains.
         ...         return 'Lol(%r)' % self.content
         ...
         >>> (x + y*z).apply_recursively(Lol)
-        Lol(Lol(x) + Lol(Lol(y)*Lol(z)))
+        Lol(Lol(Lol(y)*Lol(z)) + Lol(x))
 
         This function is implemented with :func:`apply_to_content`, so you
         might want to override :func:`apply_to_content` instead if you think
@@ -230,6 +251,49 @@ to.
         self.apply_to_content(callback)
         return result
 
+    def digest(self):
+        """Return 16 bytes that identify the structure of the object.
+
+        >>> (x + 2*y).digest() == (2*y + x).digest()
+        True
+        >>> (x + 2*y).digest() == (x + 3*y).digest()
+        False
+        >>> len(x.digest())
+        16
+
+        Unlike ``hash()``, this gives the same result in every process and
+        every time Python runs, so it can be used for storing things to files
+        or sending them to other processes. The digest is computed from the
+        class, the name or value of the object and the digests of the
+        :meth:`content <get_content>`, and it's cached, so calling this
+        again or for a bigger object that contains this object is fast. There's
+        no recursion, so this works with huge and deep objects.
+
+        Objects that aren't equal get different digests, except
+        :class:`NamedConstants <NamedConstant>` that have the same name and
+        value. You don't need to override this.
+        """
+        try:
+            return self._cached_digest
+        except AttributeError:
+            pass
+
+        # postorder without recursion
+        stack = [self]
+        while stack:
+            obj = stack[-1]
+            if hasattr(obj, '_cached_digest'):
+                stack.pop()
+                continue
+            missing = [child for child in _content(obj)
+                       if not hasattr(child, '_cached_digest')]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            obj._cached_digest = _make_digest(obj)
+        return self._cached_digest
+
     def add_parenthesize(self):
         return repr(self)
 
@@ -304,7 +368,7 @@ to.
         >>> sin(y).derivative(x)      # Symbols are independent
         0
         >>> sin(f(x)).derivative(x)   # but SymbolFunctions work better
-        cos(f(x))*f'(x)
+        f'(x)*cos(f(x))
 
         The *wrt* must be a :class:`Symbol`.
 
@@ -549,6 +613,170 @@ class Integer(MathObject):
         return repr(self)
 
 
+def _raw_fraction(fraction):
+    # a math object without gentle_simplify() calls, they would show up when
+    # tracing
+    if fraction.denominator == 1:
+        return Integer(fraction.numerator)
+    return Mul([fraction.numerator, Pow(fraction.denominator, -1)])
+
+
+# Add and Mul keep their objects sorted with these keys, so equal objects
+# always have the same order and Add([x, y]) == Add([y, x]) is a tuple
+# comparison. A key is (rank, payload, exponent key, other factor keys):
+#
+#   0   Integer
+#   1   Integer ** Integer, e.g. the 3**(-1) of 2/3
+#   2   Mul of only those, e.g. 2/3
+#   3   Integer ** something else
+#   4   NamedConstant
+#   5   Symbol
+#   6   SymbolFunction
+#   7   other classes, e.g. sin(x)
+#   8   Add
+#   9   other Mul
+#   10  other Pow
+#
+# Pows get the rank and payload of their base, so x**2 is next to x. Muls are
+# keyed like their biggest object, with the other objects as the last item,
+# so a*x**2 + b*x + c is sorted as c + b*x + a*x**2. Keys of different
+# objects are different, except for NamedConstants with the same name and
+# value, and objects of other classes that contain equal things.
+_NUMBER_RANKS = {0, 1, 2}
+_POWER_BASE_RANKS = {4, 5, 6, 7, 8}
+
+
+def _content(obj):
+    # like obj.get_content(), but faster for the usual classes
+    klass = type(obj)
+    if klass is Add or klass is Mul:
+        return obj.objects
+    if klass is Pow:
+        return (obj.base, obj.exponent)
+    if klass is SymbolFunction:
+        return (obj.arg,)
+    if klass is Integer or klass is Symbol:
+        return ()
+    return obj.get_content()
+
+
+def _mul_sort_key(keys):
+    # the objects are sorted already, so the last key is the biggest
+    if all(key[0] in _NUMBER_RANKS for key in keys):
+        return (2, keys, (), ())
+    if len(keys) >= 2 and not keys[-1][3]:
+        return keys[-1][:3] + (keys[:-1],)
+    return (9, keys, (), ())
+
+
+def _pow_sort_key(base_key, exponent_key):
+    if base_key[0] == 0:
+        rank = 1 if exponent_key[0] == 0 else 3
+        return (rank, base_key[1], exponent_key, ())
+    if (base_key[0] in _POWER_BASE_RANKS and
+            not base_key[2] and not base_key[3]):
+        return (base_key[0], base_key[1], exponent_key, ())
+    return (10, (base_key, exponent_key), (), ())
+
+
+def _make_sort_key(obj):
+    # the keys of the children must be computed already
+    klass = type(obj)
+    if klass is Integer:
+        return (0, obj.python_int, (), ())
+    if klass is Symbol:
+        return (5, obj.name, (), ())
+    if klass is SymbolFunction:
+        payload = (obj.name, obj.derivative_count, obj.arg._cached_sort_key)
+        return (6, payload, (), ())
+    if klass is Add:
+        keys = tuple(child._cached_sort_key for child in obj.objects)
+        return (8, keys, (), ())
+
+    if klass is Mul:
+        return _mul_sort_key(
+            tuple(child._cached_sort_key for child in obj.objects))
+    if klass is Pow:
+        return _pow_sort_key(obj.base._cached_sort_key,
+                             obj.exponent._cached_sort_key)
+
+    # derivater._constants needs this file
+    from derivater._constants import NamedConstant
+    if isinstance(obj, NamedConstant):
+        return (4, (str(obj), float(obj)), (), ())
+    content = obj.get_content()
+    keys = tuple(child._cached_sort_key for child in content)
+    return (7, (klass.__name__, keys, '' if content else repr(obj)), (), ())
+
+
+def _sort_key(obj):
+    """Return the key that Add and Mul use for sorting their objects.
+
+    The keys are cached to the objects, and there's no recursion, so this
+    works with huge and deep objects.
+    """
+    try:
+        return obj._cached_sort_key
+    except AttributeError:
+        pass
+
+    # postorder without recursion
+    stack = [obj]
+    while stack:
+        node = stack[-1]
+        if hasattr(node, '_cached_sort_key'):
+            stack.pop()
+            continue
+        missing = [child for child in _content(node)
+                   if not hasattr(child, '_cached_sort_key')]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        node._cached_sort_key = _make_sort_key(node)
+    return obj._cached_sort_key
+
+
+def _add_sort_key(obj):
+    # numbers go last, e.g. x + 1 instead of 1 + x
+    key = _sort_key(obj)
+    return (key[0] in _NUMBER_RANKS, key)
+
+
+def _digest_payload(obj):
+    # the things that aren't in the content of the object, as a string
+    klass = type(obj)
+    if klass is Integer:
+        return str(obj.python_int)
+    if klass is Symbol:
+        return obj.name
+    if klass is SymbolFunction:
+        return '%s %d' % (obj.name, obj.derivative_count)
+    if klass is Add or klass is Mul or klass is Pow:
+        return ''
+
+    # derivater._constants needs this file
+    from derivater._constants import NamedConstant
+    if isinstance(obj, NamedConstant):
+        return '%s %s' % (obj, float(obj).hex())
+    return '' if _content(obj) else repr(obj)
+
+
+def _make_digest(obj):
+    # the digests of the children must be computed already
+    klass = type(obj)
+    payload = _digest_payload(obj)
+    # md5 is not for security here, it's fast and in every Python version,
+    # unlike blake2b
+    hasher = hashlib.md5()
+    hasher.update(('%s.%s\0%d\0%s' % (
+        klass.__module__, klass.__qualname__, len(payload), payload,
+    )).encode('utf-8'))
+    for child in _content(obj):
+        hasher.update(child._cached_digest)
+    return hasher.digest()
+
+
 def _looks_like_negative(expr):
     if isinstance(expr, Mul):
         # len(expr.objects) >= 1 would be more readable in this context, but
@@ -561,31 +789,25 @@ def _looks_like_negative(expr):
     return False
 
 
-@eq_and_hash({'objects': frozenset})
+@eq_and_hash({'objects': None})
 class Add(MathObject):
     """An object that represents a bunch of things added together.
 
     .. attribute:: objects
 
-        List of the added objects.
+        Tuple of the added objects. They are always sorted in the same order,
+        numbers last, so ``Add([x, y]) == Add([y, x])`` and ``repr()`` gives
+        the same result for both.
     """
 
     def __init__(self, objects):
-        self.objects = list(map(mathify, objects))
+        if _budget.state.active:
+            _budget.charge(nodes=1)
+        self.objects = tuple(sorted(map(mathify, objects), key=_add_sort_key))
 
     def __repr__(self):
-        if not self.objects:
-            return '0'
-
-        result = [self.objects[0].add_parenthesize()]
-        for obj in self.objects[1:]:
-            if _looks_like_negative(obj):
-                result.append(' - ')
-                result.append((-obj).add_parenthesize())
-            else:
-                result.append(' + ')
-                result.append(obj.add_parenthesize())
-        return ''.join(result)
+        from derivater._printer import print_object
+        return print_object(self)
 
     def __float__(self):
         return sum(map(float, self.objects))
@@ -609,7 +831,7 @@ class Add(MathObject):
                     "gentle_simplify() to turn Add([])'s into zeros?")
 
             if set(old.objects).issubset(self.objects):
-                new_add_objects = self.objects.copy()
+                new_add_objects = list(self.objects)
                 while set(old.objects).issubset(new_add_objects):
                     # put the new object to the last old object's location
                     for obj in old.objects[:-1]:
@@ -623,6 +845,8 @@ class Add(MathObject):
         return super().replace(old, new)
 
     def derivative(self, wrt):
+        if _budget.state.active:
+            _budget.charge(steps=1)
         # d/dx (f(x) + g(x)) = f'(x) + g'(x)
         # also works with more than 2 functions
         return (Add(obj.derivative(wrt) for obj in self.objects)
@@ -668,12 +892,18 @@ ngs:
         * If there are no objects left, ``mathify(0)`` is returned instead of
           an Add object.
         """
+        if _budget.state.active:
+            _budget.charge(steps=1)
+        steps = _trace.state.active and _trace._Steps('Add', self)
+
         flat = []
         for obj in map(operator.methodcaller('gentle_simplify'), self.objects):
             if isinstance(obj, Add):
                 flat.extend(obj.objects)
             else:
                 flat.append(obj)
+        if steps:
+            steps('flatten', Add(flat))
 
         # extract fractions
         frac_value = fractions.Fraction(0)
@@ -685,6 +915,9 @@ ngs:
                 frac_value += pythonify(obj)
             else:
                 no_fracs.append(obj)
+        if steps:
+            fracs = [_raw_fraction(frac_value)] if frac_value != 0 else []
+            steps('collect-numbers', Add(no_fracs + fracs))
 
         # turn repeated objects into _Muls
         while max(collections.Counter(no_fracs).values(), default=1) != 1:
@@ -705,12 +938,18 @@ ngs:
             parts.remove(mathify(0))
         if frac_value != 0:
             parts.append(mathify(frac_value))
+        if steps:
+            steps('combine-terms', Add(parts))
 
         if not parts:
-            return mathify(0)
-        if len(parts) == 1:
-            return parts[0]
-        return Add(parts)
+            result = mathify(0)
+        elif len(parts) == 1:
+            result = parts[0]
+        else:
+            return Add(parts)
+        if steps:
+            steps('unwrap', result)
+        return result
 
     # TODO
     def simplify(self):
@@ -718,53 +957,29 @@ ngs:
                 .gentle_simplify())
 
 
-@eq_and_hash({'objects': frozenset})
+@eq_and_hash({'objects': None})
 class Mul(MathObject):
     """An object that represents a bunch of stuff multiplied with each other.
 
     .. attribute:: objects
 
-        List of the multiplied objects.
+        Tuple of the multiplied objects, sorted like with :class:`Add` but
+        numbers first.
     """
 
     def __init__(self, objects):
-        self.objects = list(map(mathify, objects))
+        if _budget.state.active:
+            _budget.charge(nodes=1)
+        self.objects = tuple(sorted(map(mathify, objects), key=_sort_key))
 
     def __repr__(self):
-        if _looks_like_negative(self):
-            return '-' + (-self).mul_parenthesize()
-
-        # a/b is represented as a*b**(-1)
-        top = []
-        bottom = []
-        for obj in self.objects:
-            if isinstance(obj, Pow) and _looks_like_negative(obj.exponent):
-                # 1/obj is the same thing with inverted exponent
-                bottom.append(1/obj)
-            else:
-                top.append(obj)
-
-        if not bottom:
-            return '*'.join(obj.mul_parenthesize() for obj in top) or '1'
-
-        # the top uses mul_parenthesize() instead of repr() because otherwise
-        # repr((x + y)/z) == 'x + y / z'
-        top_string = repr(Mul(top))
-
-        # Mul([Pow(x/y, -2)]) must be represented as 1 / (x**2 / y**2)
-        # changing a tiny detail in this breaks some detail in that...
-        if len(bottom) == 1:
-            bottom_string = (bottom[0].pow_parenthesize()
-                             if isinstance(bottom[0], Mul)
-                             else bottom[0].mul_parenthesize())
-        else:
-            bottom_string = Mul(bottom).pow_parenthesize()
-        return top_string + ' / ' + bottom_string
+        from derivater._printer import print_object
+        return print_object(self)
 
     def __float__(self):
-        if not self.content:
+        if not self.objects:
             return 1.0
-        return functools.reduce(operator.mul, map(float, self.content))
+        return functools.reduce(operator.mul, map(float, self.objects))
 
     def apply_to_content(self, func):
         return Mul(map(func, self.objects))
@@ -784,7 +999,7 @@ class Mul(MathObject):
                     "gentle_simplify() to turn Mul([])'s into ones?")
 
             if set(old.objects).issubset(self.objects):
-                new_mul_objects = self.objects.copy()
+                new_mul_objects = list(self.objects)
                 while set(old.objects).issubset(new_mul_objects):
                     # put the new object to the last old object's location
                     for obj in old.objects[:-1]:
@@ -798,12 +1013,14 @@ class Mul(MathObject):
         return super().replace(old, new)
 
     def derivative(self, wrt):
+        if _budget.state.active:
+            _budget.charge(steps=1)
         # d/dx (f(x)g(x)h(x)) = f'(x)g(x)h(x) + f(x)g'(x)h(x) + f(x)g(x)h'(x)
         # it works like this for more functions
         parts = []
         for i in range(len(self.objects)):      # OMG ITS RANGELEN KITTENS DIE
             parts.append(Mul(self.objects[:i] +
-                             [self.objects[i].derivative(wrt)] +
+                             (self.objects[i].derivative(wrt),) +
                              self.objects[i+1:]))
         return Add(parts).gentle_simplify()
 
@@ -843,23 +1060,36 @@ ngs:
         * If there are no objects left, ``mathify(1)`` is returned instead of
           a Mul object.
         """
+        if _budget.state.active:
+            _budget.charge(steps=1)
+        steps = _trace.state.active and _trace._Steps('Mul', self)
+
         flat = []
         for obj in map(operator.methodcaller('gentle_simplify'), self.objects):
             if isinstance(obj, Mul):
                 flat.extend(obj.objects)
             elif obj == mathify(0):
+                if steps:
+                    steps('zero-factor', mathify(0))
                 return mathify(0)
             else:
                 flat.append(obj)
+        if steps:
+            steps('flatten', Mul(flat))
 
         # extract the coefficient
         coeff, no_coeff = Mul(flat)._raw_with_fraction_coeff()
         if coeff == 0:
+            if steps:
+                steps('zero-factor', mathify(0))
             return mathify(0)
 
         # not quite sure why, but it recurses if this is moved later :D
         while mathify(1) in no_coeff:
             no_coeff.remove(mathify(1))
+        if steps:
+            coeffs = [_raw_fraction(coeff)] if coeff != 1 else []
+            steps('extract-coefficient', Mul(coeffs + no_coeff))
 
         # turn repeated objects into Pows
         while max(collections.Counter(no_coeff).values(), default=1) != 1:
@@ -889,12 +1119,18 @@ ngs:
             parts.insert(0, Pow(coeff.denominator, -1))
         if coeff.numerator != 1:
             parts.insert(0, mathify(coeff.numerator))
+        if steps:
+            steps('combine-powers', Mul(parts))
 
         if not parts:
-            return mathify(1)
-        if len(parts) == 1:
-            return parts[0]
-        return Mul(parts)
+            result = mathify(1)
+        elif len(parts) == 1:
+            result = parts[0]
+        else:
+            return Mul(parts)
+        if steps:
+            steps('unwrap', result)
+        return result
 
     # TODO
     def simplify(self):
@@ -912,18 +1148,14 @@ class Pow(MathObject):
     """
 
     def __init__(self, base, exponent):
+        if _budget.state.active:
+            _budget.charge(nodes=1)
         self.base = mathify(base)
         self.exponent = mathify(exponent)
 
     def __repr__(self):
-        if self.exponent == mathify(-1):
-            # same code as in Mul
-            bottom_string = (self.base.pow_parenthesize()
-                             if isinstance(self.base, Mul)
-                             else self.base.mul_parenthesize())
-            return '1 / ' + bottom_string
-        return (self.base.pow_parenthesize() + '**' +
-                self.exponent.pow_parenthesize())
+        from derivater._printer import print_object
+        return print_object(self)
 
     def __float__(self):
         # derivater._constants needs this file
@@ -942,35 +1174,47 @@ class Pow(MathObject):
         return Pow(func(self.base), func(self.exponent))
 
     def derivative(self, wrt):
-        # _explog.py wants lots of stuff from this file
-        # this file wants exp and ln from _explog.py
-        from derivater._explog import exp, ln
+        if _budget.state.active:
+            _budget.charge(steps=1)
 
-        if not self.may_depend_on(wrt):
-            return mathify(0)
-        if not self.base.may_depend_on(wrt):
-            # d/dx a**f(x) = a**f(x) ln(a) * f'(x)
-            return self * ln(self.base) * self.exponent.derivative(wrt)
-        if not self.exponent.may_depend_on(wrt):
+        if (isinstance(self.exponent, Integer) or
+                _sort_key(self.exponent)[0] in _NUMBER_RANKS):
             # d/dx f(x)**c = c*f(x)**(c-1) * f'(x)
-            # must be handled specially because this is defined if self.base
-            # is negative and self.exponent is an integer, but the stuff below
-            # needs ln(self.base)
+            # this is also defined if self.base is negative and self.exponent
+            # is an integer, unlike the ln(self.base) below
+            base_derivative = self.base.derivative(wrt)
+            if base_derivative == mathify(0):
+                return base_derivative
+            exponent_minus_one = _raw_fraction(pythonify(self.exponent) - 1)
+            return (self.exponent * self.base**exponent_minus_one *
+                    base_derivative)
+
+        base_derivative = self.base.derivative(wrt)
+        exponent_derivative = self.exponent.derivative(wrt)
+        if exponent_derivative == mathify(0):
+            if base_derivative == mathify(0):
+                return exponent_derivative
+            # d/dx f(x)**c = c*f(x)**(c-1) * f'(x), same as above
             return (self.exponent * self.base**(self.exponent - 1) *
-                    self.base.derivative(wrt))
+                    base_derivative)
 
-        #                  /     g(x) \
-        #     g(x)       ln| f(x)     |      g(x)*ln(f(x))
-        # f(x)      =  e   \          /  =  e
-        #
-        # rest of the code can take the derivative of that
-        rewrite = exp(self.exponent * ln(self.base))
-        result = rewrite.derivative(wrt)
-        return result.replace(rewrite, self)    # a bit simpler
+        # _explog.py wants lots of stuff from this file
+        from derivater._explog import ln
+        if base_derivative == mathify(0):
+            # d/dx a**g(x) = a**g(x) ln(a) * g'(x)
+            return self * ln(self.base) * exponent_derivative
+
+        # d/dx f(x)**g(x) = f(x)**g(x) * (g'(x) ln(f(x)) + g(x) f'(x)/f(x))
+        # gentle_simplify() only once, it's slow with big objects
+        return Mul([self, Add([
+            Mul([exponent_derivative, ln(self.base)]),
+            Mul([self.exponent, base_derivative, Pow(self.base, -1)]),
+        ])]).gentle_simplify()
 
     def with_fraction_coeff(self):
+        # 3**(-2) is a fraction, but 3**(1/2) is not
         if (self.base.with_fraction_coeff()[0] == self.base and
-                self.exponent.with_fraction_coeff()[0] == self.exponent):
+                isinstance(self.exponent, Integer)):
             return (self, mathify(1))
         return (mathify(1), self)
 
@@ -996,35 +1240,50 @@ ngs:
           Currently this does not detect all possible ways to create an
           integer.
         """
+        if _budget.state.active:
+            _budget.charge(steps=1)
+        steps = _trace.state.active and _trace._Steps('Pow', self)
+
         base = self.base.gentle_simplify()
         exponent = self.exponent.gentle_simplify()
+        if steps:
+            steps('simplify-content', Pow(base, exponent))
+        rule, result = self._gentle_simplify_rule(base, exponent)
+        if steps:
+            steps(rule, result)
+        return result
+
+    def _gentle_simplify_rule(self, base, exponent):
+        # returns (rule_name, result) for tracing
         if isinstance(base, Pow):
             # (x**y)**z = x**(y * z)
-            return base.base ** (base.exponent * exponent)
+            return ('power-of-power', base.base ** (base.exponent * exponent))
         if isinstance(base, Mul):
-            return (Mul(obj**self.exponent for obj in base.objects)
+            return ('power-of-product',
+                    Mul(obj**self.exponent for obj in base.objects)
                     .gentle_simplify())
 
         # TODO: buts, e.g. 0**x == 0  but x > 0 ???
         if base == mathify(0) and exponent == mathify(0):
             # python does this wrong, so let's blame it for the result...
-            return mathify(0**0)
+            return ('zero-to-zero', mathify(0**0))
         if base == mathify(0):
-            return mathify(0)
+            return ('zero-base', mathify(0))
         if base == mathify(1):
-            return mathify(1)
+            return ('one-base', mathify(1))
         if exponent == mathify(0):
-            return mathify(1)
+            return ('zero-exponent', mathify(1))
         if exponent == mathify(1):
-            return base
+            return ('one-exponent', base)
 
         if (isinstance(base, Integer) and isinstance(exponent, Integer) and
                 (exponent.python_int >= 0 or base == mathify(-1))):
             # this must be an integer
             # TODO: handle more cases
-            return mathify(round(base.python_int ** exponent.python_int))
+            return ('integer-power',
+                    mathify(round(base.python_int ** exponent.python_int)))
 
-        return Pow(base, exponent)
+        return ('nothing', Pow(base, exponent))
 
     def simplify(self):
         return self.base.simplify() ** self.exponent.simplify()
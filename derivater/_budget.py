@@ -0,0 +1,141 @@
+import threading
+import time as _time
+
+
+class _State(threading.local):
+
+    def __init__(self):
+        # the budgets that are currently in use in this thread, innermost
+        # last, this is checked with "if state.active:" in hot code, so it
+        # must be empty when no budgets are used
+        self.active = []
+
+
+# budgets don't affect what other threads are doing
+state = _State()
+
+
+class BudgetExceeded(Exception):
+    """This is raised when a :class:`Budget` runs out.
+
+    .. attribute:: budget
+
+        The :class:`Budget` object that ran out.
+    """
+
+    def __init__(self, budget, message):
+        super().__init__(message)
+        self.budget = budget
+
+
+class Budget:
+    """Limit how much work derivater may do.
+
+    Use this as a context manager. Everything that derivater does inside the
+    ``with`` statement counts towards the budget, and :class:`BudgetExceeded`
+    is raised when the budget runs out.
+
+    >>> with Budget(steps=100):
+    ...     (x**x**x**x).derivative(x)
+    Traceback (most recent call last):
+      ...
+    derivater._budget.BudgetExceeded: more than 100 rewrite steps
+
+    The limits are:
+
+    * *time* is the wall time in seconds, counted from the first time the
+      ``with`` statement starts.
+    * *nodes* is the number of :class:`Add`, :class:`Mul` and :class:`Pow`
+      objects created.
+    * *steps* is the number of ``derivative()`` and ``gentle_simplify()``
+      calls of those classes, plus the number of rewrites that
+      :func:`trig_simplify` does.
+
+    None means no limit. Budgets can be nested; everything done in the inner
+    ``with`` counts towards the outer budget as well. A budget counts only
+    what is done in the thread that entered the ``with`` statement, so other
+    threads can use budgets of their own.
+
+    Things that can return a partially simplified result, like
+    :func:`simplify` and :func:`trig_simplify`, have a *budget* argument.
+    Those functions don't raise :class:`BudgetExceeded` when the budget they
+    are given runs out, unless *raise_error* is True; instead, they return the
+    simplest thing found so far.
+
+    >>> trig_simplify(sin(x)**2 + cos(x)**2, budget=Budget(steps=10))
+    (cos(x))**2 + (sin(x))**2
+    >>> trig_simplify(sin(x)**2 + cos(x)**2, budget=Budget(steps=10000))
+    1
+
+    .. attribute:: steps_used
+                   nodes_used
+
+        How much work has been done so far.
+    """
+
+    def __init__(self, *, time=None, nodes=None, steps=None,
+                 raise_error=False):
+        self.time = time
+        self.nodes = nodes
+        self.steps = steps
+        self.raise_error = raise_error
+        self.steps_used = 0
+        self.nodes_used = 0
+        self._start_time = None
+
+    def __repr__(self):
+        limits = ['%s=%r' % (name, getattr(self, name))
+                  for name in ['time', 'nodes', 'steps']
+                  if getattr(self, name) is not None]
+        return '%s(%s)' % (type(self).__name__, ', '.join(limits))
+
+    def __enter__(self):
+        if self._start_time is None:
+            self._start_time = _time.monotonic()
+        state.active.append(self)
+        return self
+
+    def __exit__(self, *error):
+        state.active.remove(self)
+
+    def elapsed(self):
+        """Return the number of seconds since the budget was first used."""
+        if self._start_time is None:
+            return 0.0
+        return _time.monotonic() - self._start_time
+
+    def check(self):
+        """Raise :class:`BudgetExceeded` if the budget has run out."""
+        if self.steps is not None and self.steps_used > self.steps:
+            raise BudgetExceeded(
+                self, "more than %d rewrite steps" % self.steps)
+        if self.nodes is not None and self.nodes_used > self.nodes:
+            raise BudgetExceeded(
+                self, "more than %d nodes created" % self.nodes)
+        if self.time is not None and self.elapsed() > self.time:
+            raise BudgetExceeded(
+                self, "more than %r seconds elapsed" % self.time)
+
+
+def charge(steps=0, nodes=0):
+    for budget in state.active:
+        budget.steps_used += steps
+        budget.nodes_used += nodes
+        budget.check()
+
+
+def run_with_budget(budget, func, best_so_far):
+    """Call func() within the budget.
+
+    If the budget runs out and it doesn't want errors, the last item of the
+    best_so_far list is returned.
+    """
+    if budget is None:
+        return func()
+    try:
+        with budget:
+            return func()
+    except BudgetExceeded as e:
+        if e.budget is not budget or budget.raise_error:
+            raise
+        return best_so_far[-1]
@@ -0,0 +1,110 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import sys
+
+import derivater
+
+
+def _derivative(wrt, expr):
+    return expr.derivative(wrt)
+
+
+def _process_line(operation, line):
+    # returns (output line, error message or None)
+    line = line.strip()
+    if not line:
+        return ('', None)
+    try:
+        return (repr(operation(derivater.parse(line))), None)
+    except Exception as e:
+        return ('', '%s: %s' % (type(e).__name__, e))
+
+
+def _process_chunk(operation, lines):
+    return [_process_line(operation, line) for line in lines]
+
+
+def _results(operation, lines, workers, chunksize):
+    # yields (output line, error message or None) tuples in order
+    if workers <= 1:
+        for line in lines:
+            yield _process_line(operation, line)
+        return
+
+    # at most this many chunks are in memory at a time
+    max_pending = 2*workers
+    chunks = iter(lambda: list(itertools.islice(lines, chunksize)), [])
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                pending.append(executor.submit(
+                    _process_chunk, operation, chunk))
+            while pending and (chunk is None or pending[0].done() or
+                               len(pending) >= max_pending):
+                yield from pending.popleft().result()
+
+
+def main(args=None, stdin=None, stdout=None, stderr=None):
+    """Run the command line program and return an exit status."""
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+
+    parser = argparse.ArgumentParser(
+        prog='python3 -m derivater',
+        description=(
+            "Read expressions, one per line, and write the results, one per "
+            "line. Lines that can't be processed produce an empty output "
+            "line and an error message. Run without arguments to get an "
+            "interactive prompt with python3 -im derivater."))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    diff = subparsers.add_parser('diff', help="take derivatives")
+    diff.add_argument('--wrt', required=True, help="name of the variable")
+    simplify = subparsers.add_parser('simplify', help="simplify")
+    simplify.add_argument(
+        '--method', default='default', help="see derivater.simplify()")
+    subparsers.add_parser('trig_simplify', help="simplify trig functions")
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument(
+            'file', nargs='?', help="read this file instead of stdin")
+        subparser.add_argument(
+            '--workers', type=int, default=1,
+            help="number of processes to use, default: %(default)s")
+        subparser.add_argument(
+            '--chunksize', type=int, default=100,
+            help="lines to send to a worker process at a time")
+
+    args = parser.parse_args(args)
+    if args.command == 'diff':
+        operation = functools.partial(_derivative, derivater.Symbol(args.wrt))
+    elif args.command == 'simplify':
+        operation = functools.partial(derivater.simplify, method=args.method)
+    else:
+        operation = derivater.trig_simplify
+
+    if args.file is None:
+        return _run(operation, stdin, stdout, stderr, args)
+    with open(args.file, 'r') as file:
+        return _run(operation, file, stdout, stderr, args)
+
+
+def _run(operation, lines, stdout, stderr, args):
+    status = 0
+    results = _results(operation, iter(lines), args.workers,
+                       max(args.chunksize, 1))
+    for lineno, (output, error) in enumerate(results, start=1):
+        if error is not None:
+            print('line %d: %s' % (lineno, error), file=stderr)
+            status = 1
+        print(output, file=stdout)
+        if args.workers <= 1:
+            # results are written as they are produced
+            stdout.flush()
+    return status
@@ -0,0 +1,653 @@
+import collections
+import fractions
+import keyword
+import math
+
+from derivater._base import (
+    MathObject, mathify, pythonify, Symbol, SymbolFunction, Integer, Add,
+    Mul, Pow, sqrt, _content, _sort_key, _NUMBER_RANKS)
+from derivater._constants import NamedConstant, e
+from derivater._derivative import Derivative, _derivative_value
+from derivater._evalf import evalf
+from derivater._explog import NaturalLog
+from derivater._functions import _registry
+
+
+# Python's parser doesn't like deeply nested parentheses, so things nested
+# deeper than this go to separate variables
+_MAX_NESTING = 30
+
+# Integer powers are calculated by multiplying, e.g. x**5 as x2 = x*x,
+# x3 = x2*x, x5 = x3*x2, and powers of the same base are reused. Python's **
+# takes about as long as this many multiplications, so longer chains use **.
+_POW_COST = 3
+
+# how tightly generated code binds, e.g. a product inside a sum doesn't need
+# parentheses, but a sum inside a product does
+_ATOM, _POWER, _PRODUCT, _SUM = range(4)
+
+
+def _find_symbols(root):
+    # returns a set of Symbols, without recursion except for Derivatives
+    # inside Derivatives
+    result = set()
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if obj in seen:
+            continue
+        seen.add(obj)
+        if isinstance(obj, Symbol):
+            result.add(obj)
+        elif type(obj) is Derivative:
+            result.update(_find_symbols(obj.expr) - {obj.wrt})
+            stack.append(obj.at)
+            continue
+        stack.extend(_content(obj))
+    return result
+
+
+def _children(obj):
+    # like _content(), but a Derivative is calculated with forward mode, and
+    # that needs only the values of at and the other symbols in expr
+    if type(obj) is Derivative:
+        symbols = _find_symbols(obj.expr) - {obj.wrt}
+        return (obj.at,) + tuple(sorted(symbols, key=(lambda s: s.name)))
+    return _content(obj)
+
+
+def _derivative_function(derivative, numpy):
+    # returns a function that takes the values of _children(derivative)
+    names = [symbol.name for symbol in _children(derivative)[1:]]
+
+    def evaluate(at, *values):
+        return _derivative_value(
+            derivative, at, dict(zip(names, values)), numpy)
+
+    return evaluate
+
+
+def _number_value(obj):
+    # returns a Fraction, or None if obj is not a rational number
+    if _sort_key(obj)[0] not in _NUMBER_RANKS:
+        return None
+    # pythonify() is exact, evalf() would round big integers
+    return fractions.Fraction(pythonify(obj))
+
+
+def _stable_form(obj):
+    # Returns (function name, arguments) if obj can be calculated more
+    # accurately with a special function, or None. For example, e**x - 1
+    # loses most of its digits when x is close to zero, but expm1(x) doesn't.
+    klass = type(obj)
+    if klass is Add and Integer(-1) in obj.objects:
+        for term in obj.objects:
+            if (type(term) is Pow and term.base is e and
+                    _number_value(term.exponent) is None):
+                others = [other for other in obj.objects
+                          if other is not term and other != Integer(-1)]
+                return ('expm1', (term.exponent,) + tuple(others))
+
+    if (klass is NaturalLog and type(obj.numerus) is Add and
+            Integer(1) in obj.numerus.objects):
+        rest = [term for term in obj.numerus.objects if term != Integer(1)]
+        return ('log1p', (_sum(rest),))
+
+    if (klass is Pow and type(obj.base) is Add and
+            _number_value(obj.exponent) in {fractions.Fraction(1, 2),
+                                            fractions.Fraction(-1, 2)}):
+        # sqrt(a**2 + b**2 + 3) is hypot(a, b, sqrt(3))
+        args = []
+        for term in obj.base.objects:
+            value = _number_value(term)
+            if type(term) is Pow and term.exponent == Integer(2):
+                args.append(term.base)
+            elif value is not None and value > 0:
+                args.append(sqrt(term))
+            else:
+                return None
+        if _number_value(obj.exponent) < 0:
+            return ('1/hypot', tuple(args))
+        return ('hypot', tuple(args))
+
+    return None
+
+
+def _power_chain(exponent, available):
+    # returns a list of (a, b) pairs, each pair means calculating
+    # base**(a+b) as base**a * base**b, and adds the new exponents to
+    # available (a set of exponents already calculated)
+    steps = []
+
+    def build(n):
+        if n in available:
+            return
+        for known in sorted(available, reverse=True):
+            if n - known in available:
+                pair = (known, n - known)
+                break
+        else:
+            pair = (n - n//2, n // 2)
+            build(pair[0])
+            build(pair[1])
+        steps.append(pair)
+        available.add(n)
+
+    build(exponent)
+    return steps
+
+
+def _powers_cost(exponents):
+    # how many multiplications it takes to calculate base**n for all n
+    available = {1}
+    return sum(min(len(_power_chain(n, available)), _POW_COST)
+               for n in sorted(exponents) if n >= 2)
+
+
+def _product(factors):
+    flat = []
+    for factor in factors:
+        if type(factor) is Mul:
+            flat.extend(factor.objects)
+        elif factor != Integer(1):
+            flat.append(factor)
+    factors = flat
+    if not factors:
+        return Integer(1)
+    if len(factors) == 1:
+        return factors[0]
+    return Mul(factors)
+
+
+def _sum(terms):
+    flat = []
+    for term in terms:
+        flat.extend(term.objects if type(term) is Add else [term])
+    if len(flat) == 1:
+        return flat[0]
+    return Add(flat)
+
+
+def _polynomial_terms(add, var):
+    # returns {degree: list of lists of factors}, so that add is the sum of
+    # coefficient*var**degree, where coefficients are products of factors
+    groups = {}
+    for term in add.objects:
+        degree = 0
+        others = []
+        for factor in (term.objects if type(term) is Mul else [term]):
+            if factor == var:
+                degree += 1
+            elif (type(factor) is Pow and factor.base == var and
+                    type(factor.exponent) is Integer and
+                    factor.exponent.python_int > 0):
+                degree += factor.exponent.python_int
+            else:
+                others.append(factor)
+        groups.setdefault(degree, []).append(others)
+    return groups
+
+
+def _naive_cost(groups):
+    # multiplications for calculating every term separately
+    cost = _powers_cost(groups)
+    for degree, terms in groups.items():
+        for others in terms:
+            cost += max(len(others) + (degree > 0) - 1, 0)
+    return cost
+
+
+def _horner_cost(groups):
+    # multiplications for (...(c3*x + c2)*x + c1)*x + c0
+    degrees = sorted(groups, reverse=True)
+    gaps = [high - low for high, low in zip(degrees, degrees[1:])]
+    gaps.append(degrees[-1])
+    cost = _powers_cost(set(gaps)) + sum(1 for gap in gaps if gap > 0)
+    for terms in groups.values():
+        cost += sum(max(len(others) - 1, 0) for others in terms)
+    return cost
+
+
+def _horner(add, symbols):
+    # returns add in Horner form with respect to the symbol that saves the
+    # most multiplications, or add itself if that doesn't save anything
+    candidates = set()
+    for term in add.objects:
+        for factor in (term.objects if type(term) is Mul else [term]):
+            if type(factor) is Pow:
+                factor = factor.base
+            if factor in symbols:
+                candidates.add(factor)
+
+    best = None     # (cost, name, var, groups)
+    for var in candidates:
+        groups = _polynomial_terms(add, var)
+        cost = _horner_cost(groups)
+        if cost < _naive_cost(groups) and (
+                best is None or (cost, var.name) < best[:2]):
+            best = (cost, var.name, var, groups)
+    if best is None:
+        return add
+    cost, name, var, groups = best
+
+    def coefficient(degree):
+        # the coefficients can be polynomials in the other symbols
+        terms = [_product(others) for others in groups[degree]]
+        if len(terms) == 1:
+            return terms[0]
+        return _horner(Add(terms), symbols)
+
+    def power(exponent):
+        return var if exponent == 1 else Pow(var, Integer(exponent))
+
+    degrees = sorted(groups, reverse=True)
+    result = coefficient(degrees[0])
+    for high, low in zip(degrees, degrees[1:]):
+        result = _sum([_product([result, power(high - low)]),
+                       coefficient(low)])
+    if degrees[-1] > 0:
+        result = _product([result, power(degrees[-1])])
+    return result
+
+
+def _rewrite_polynomials(roots, symbols):
+    # returns roots with sums rewritten by _horner(), postorder without
+    # recursion
+    symbols = set(symbols)
+    new = {}    # {obj: rewritten obj}
+    stack = list(roots)
+    while stack:
+        obj = stack[-1]
+        if obj in new:
+            stack.pop()
+            continue
+
+        if type(obj) is Derivative:
+            # expr is evaluated with forward mode, so only at is compiled
+            content = (obj.at,)
+        else:
+            content = _content(obj)
+        missing = [child for child in content if child not in new]
+        if missing:
+            stack.extend(missing)
+            continue
+
+        stack.pop()
+        result = obj
+        if any(new[child] is not child for child in content):
+            if type(obj) is Derivative:
+                result = Derivative(obj.expr, obj.wrt, obj.n, at=new[obj.at])
+            else:
+                result = obj.apply_to_content(
+                    lambda child: new.get(child, child))
+        if type(result) is Add:
+            result = _horner(result, symbols)
+        new[obj] = result
+
+    return [new[root] for root in roots]
+
+
+class _CodeGenerator:
+
+    def __init__(self, symbols, use_numpy, roots):
+        self.use_numpy = use_numpy
+        self.lines = []
+        self.namespace = {'_math': math}
+        if use_numpy:
+            import numpy
+            self.namespace['_numpy'] = numpy
+
+        self.arg_names = []
+        # {obj: (python code, nesting depth, binding level like _SUM)}
+        self.code = {}
+        # {base: {exponent: python code}}, for reusing powers
+        self.powers = {}
+        for index, symbol in enumerate(symbols):
+            if not isinstance(symbol, Symbol):
+                raise TypeError("expected a Symbol, got %r" % (symbol,))
+            name = symbol.name
+            if (not name.isidentifier() or keyword.iskeyword(name) or
+                    name.startswith('_') or name in self.arg_names):
+                name = '_arg%d' % index
+            self.arg_names.append(name)
+            self.code[symbol] = (name, 0, _ATOM)
+
+        # count how many times each part is used in all roots, so that parts
+        # used more than once can be calculated only once
+        # {obj: _stable_form(obj)}, the generator uses the arguments of a
+        # stable form instead of the content of obj
+        self.stable_forms = {}
+        self.uses = collections.Counter()
+        stack = list(roots)
+        while stack:
+            obj = stack.pop()
+            self.uses[obj] += 1
+            if self.uses[obj] == 1:
+                stack.extend(self._children(obj))
+
+        # find parts that don't depend on anything, postorder without
+        # recursion
+        self.constant = {}      # {obj: True or False}
+        stack = list(roots)
+        while stack:
+            obj = stack[-1]
+            if obj in self.constant:
+                stack.pop()
+                continue
+            content = self._children(obj)
+            missing = [child for child in content
+                       if child not in self.constant]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            self.constant[obj] = (
+                not isinstance(obj, (Symbol, SymbolFunction)) and
+                all(self.constant[child] for child in content))
+
+    def _children(self, obj):
+        try:
+            form = self.stable_forms[obj]
+        except KeyError:
+            form = self.stable_forms[obj] = _stable_form(obj)
+        if form is None:
+            return _children(obj)
+        return form[1]
+
+    def _function(self, name):
+        # returns python code for e.g. math.sin or numpy.sin
+        if self.use_numpy:
+            return '_numpy.' + name
+        return '_math.' + name
+
+    def _constant(self, obj):
+        value = float(evalf(obj, prec=20))
+        if math.isfinite(value):
+            return repr(value)
+        return "float('%r')" % value
+
+    def _variable(self, code):
+        variable = '_%d' % len(self.lines)
+        self.lines.append('%s = %s' % (variable, code))
+        return variable
+
+    # these take (code, level) pairs and return (code, level)
+
+    def _integer_power(self, base, base_code, exponent):
+        # returns None if ** is faster
+        powers = self.powers.get(base)
+        if powers is None:
+            if not base_code.isidentifier():
+                base_code = self._variable(base_code)
+            powers = self.powers[base] = {1: base_code}
+        steps = _power_chain(exponent, set(powers))
+        if len(steps) > _POW_COST:
+            return None
+        for a, b in steps:
+            powers[a + b] = self._variable('%s * %s' % (powers[a], powers[b]))
+        return powers[exponent]
+
+    def _pow(self, obj, base, exponent):
+        base_code, base_level = base
+        if base_level >= _POWER:
+            base_code = '(%s)' % base_code
+        if obj.base is e:
+            return ('%s(%s)' % (self._function('exp'), exponent[0]), _ATOM)
+        value = _number_value(obj.exponent)
+        if value is not None:
+            if value.denominator == 1 and abs(value) >= 2:
+                code = self._integer_power(obj.base, base[0], abs(value))
+                if code is None:
+                    # float ** int works with negative floats too
+                    return ('%s ** %d' % (base_code, value), _POWER)
+                if value < 0:
+                    return ('1.0 / %s' % code, _PRODUCT)
+                return (code, _ATOM)
+            if value == -1:
+                if base_level >= _PRODUCT:
+                    return ('1.0 / (%s)' % base[0], _PRODUCT)
+                return ('1.0 / %s' % base[0], _PRODUCT)
+            if value == fractions.Fraction(1, 2):
+                return ('%s(%s)' % (self._function('sqrt'), base[0]), _ATOM)
+        if self.use_numpy:
+            return ('_numpy.power(%s, %s)' % (base[0], exponent[0]), _ATOM)
+        # ** would return a complex number for a negative base
+        return ('_math.pow(%s, %s)' % (base[0], exponent[0]), _ATOM)
+
+    def _join(self, operator, args, level):
+        # a + (b + c) rounds differently than a + b + c, so parentheses are
+        # needed even when the operator is the same
+        return (operator.join('(%s)' % code if arg_level >= level else code
+                              for code, arg_level in args), level)
+
+    def _stable_code(self, name, args):
+        if name == 'expm1':
+            [(code, level), *others] = args
+            code = '%s(%s)' % (self._function('expm1'), code)
+            if not others:
+                return (code, _ATOM)
+            return self._join(' + ', [(code, _ATOM)] + others, _SUM)
+        args = [code for code, level in args]
+        if name == 'log1p':
+            return ('%s(%s)' % (self._function('log1p'), args[0]), _ATOM)
+
+        if self.use_numpy:
+            # numpy.hypot() takes only 2 arguments
+            code = args[0]
+            for arg in args[1:]:
+                code = '_numpy.hypot(%s, %s)' % (code, arg)
+        else:
+            code = '_math.hypot(%s)' % ', '.join(args)
+        if name == '1/hypot':
+            return ('1.0 / ' + code, _PRODUCT)
+        return (code, _ATOM)
+
+    def _node_code(self, obj, args):
+        # args is a list of (code, level) pairs for the content
+        form = self.stable_forms.get(obj)
+        if form is not None:
+            return self._stable_code(form[0], args)
+        klass = type(obj)
+        if klass is Add:
+            return self._join(' + ', args, _SUM)
+        if klass is Mul:
+            return self._join(' * ', args, _PRODUCT)
+        if klass is Pow:
+            return self._pow(obj, *args)
+        args = [code for code, level in args]
+        if klass is Symbol:
+            raise ValueError("%s is not in the symbols" % obj.name)
+        if klass is SymbolFunction:
+            raise TypeError("cannot compile " + repr(obj))
+        if klass is Derivative:
+            name = '_derivative_%d' % len(self.namespace)
+            self.namespace[name] = _derivative_function(
+                obj, self.namespace.get('_numpy'))
+            return ('%s(%s)' % (name, ', '.join(args)), _ATOM)
+
+        rules = _registry.get(klass)
+        if rules is None or len(args) != 1:
+            raise TypeError("cannot compile " + repr(obj))
+        if self.use_numpy:
+            if rules.numpy_name is None:
+                raise TypeError("no NumPy function for " + repr(obj))
+            return ('_numpy.%s(%s)' % (rules.numpy_name, args[0]), _ATOM)
+        if rules.evaluate is None:
+            raise TypeError("cannot compile " + repr(obj))
+
+        name = getattr(rules.evaluate, '__name__', '')
+        if getattr(math, name, None) is rules.evaluate:
+            name = '_math.' + name
+        else:
+            name = '_func_' + klass.__name__
+            self.namespace[name] = rules.evaluate
+        return ('%s(%s)' % (name, args[0]), _ATOM)
+
+    def add(self, root):
+        """Generate code for *root* and return a Python expression string."""
+        # postorder without recursion
+        stack = [root]
+        while stack:
+            obj = stack[-1]
+            if obj in self.code:
+                stack.pop()
+                continue
+
+            if self.constant[obj]:
+                self.code[obj] = (self._constant(obj), 0, _ATOM)
+                stack.pop()
+                continue
+
+            content = self._children(obj)
+            missing = [child for child in content if child not in self.code]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            args = []
+            depth = 0
+            for child in content:
+                child_code, child_depth, level = self.code[child]
+                args.append((child_code, level))
+                depth = max(depth, child_depth + 1)
+
+            code, level = self._node_code(obj, args)
+            if code.isidentifier():
+                # e.g. a power that went to a variable
+                self.code[obj] = (code, 0, _ATOM)
+            elif self.uses[obj] > 1 or depth > _MAX_NESTING:
+                self.code[obj] = (self._variable(code), 0, _ATOM)
+            else:
+                self.code[obj] = (code, depth, level)
+
+        return self.code[root][0]
+
+
+def compile_function(exprs, symbols, *, numpy=False):
+    """Convert math objects into a fast Python function.
+
+    >>> func = compile_function(x**2 + sin(x*y), [x, y])
+    >>> func(3, 0)
+    9.0
+
+    The function takes the values of *symbols* as arguments, in the same
+    order. If *exprs* is a list or tuple of math objects, the function
+    returns a tuple of floats, and parts that several objects have in common
+    are calculated only once:
+
+    >>> func = compile_function([x**2 + sin(x), cos(x) + x**2], [x])
+    >>> print(func.source)
+    def _compiled(x):
+        _0 = x * x
+        return (_0 + _math.sin(x), _0 + _math.cos(x))
+    <BLANKLINE>
+
+    The ``source`` attribute contains the Python code that was generated, and
+    parts that contain no symbols are calculated when compiling.
+
+    Polynomials are rewritten to need as few multiplications as possible.
+    Integer powers are calculated by multiplying, and powers of the same
+    base are reused. Sums are converted to Horner form when that needs fewer
+    multiplications:
+
+    >>> print(compile_function(a*x**3 + b*x**2 + x, [x, a, b]).source)
+    def _compiled(x, a, b):
+        return x * (x * (b + a * x) + 1.0)
+    <BLANKLINE>
+
+    ``e**u - 1``, ``ln(1 + u)`` and square roots of sums of squares are
+    calculated with ``expm1()``, ``log1p()`` and ``hypot()``. They give
+    accurate results even when ``u`` is close to zero or the squares would
+    overflow:
+
+    >>> func = compile_function([e**x - 1, sqrt(x**2 + y**2)], [x, y])
+    >>> print(func.source)
+    def _compiled(x, y):
+        return (_math.expm1(x), _math.hypot(x, y))
+    <BLANKLINE>
+    >>> func(1e-20, 1e200)
+    (1e-20, 1e+200)
+
+    If *numpy* is true, the function uses NumPy, and it can be called with
+    NumPy arrays to calculate many values at once.
+    """
+    if isinstance(exprs, MathObject):
+        single = True
+        exprs = [exprs]
+    else:
+        single = False
+        exprs = list(map(mathify, exprs))
+
+    # rewriting before generating code lets the generator find common parts
+    # of the rewritten objects
+    symbols = list(symbols)
+    exprs = _rewrite_polynomials(exprs, symbols)
+    generator = _CodeGenerator(symbols, numpy, exprs)
+    results = [generator.add(expr) for expr in exprs]
+
+    if single:
+        [return_value] = results
+    elif len(results) == 1:
+        return_value = '(%s,)' % results[0]
+    else:
+        return_value = '(%s)' % ', '.join(results)
+
+    source = 'def _compiled(%s):\n' % ', '.join(generator.arg_names)
+    for line in generator.lines:
+        source += '    %s\n' % line
+    source += '    return %s\n' % return_value
+
+    namespace = generator.namespace
+    exec(compile(source, '<compiled math>', 'exec'), namespace)
+    func = namespace['_compiled']
+    func.source = source
+    return func
+
+
+def _parameter_value(value):
+    if isinstance(value, float):
+        # floats are not exact, so they are only used in the compiled code
+        return NamedConstant(repr(value), value)
+    return mathify(value)
+
+
+def specialize(expr, values, symbols=None, *, numpy=False):
+    """Substitute *values* into *expr* and compile the result.
+
+    This is useful when some symbols are fixed for a while, and others vary
+    a lot. For example, ``a``, ``b`` and ``c`` could be parameters of a model,
+    and ``x`` the point where the model is evaluated:
+
+    >>> reduced, func = specialize(a*x**2 + b*x + c, {a: 2, b: half, c: 0})
+    >>> reduced
+    x / 2 + 2*x**2
+    >>> func(3)
+    19.5
+
+    *values* is a dict that maps :class:`Symbols <Symbol>` to Python ints,
+    :class:`fractions.Fraction` objects, floats or math objects. This returns
+    ``(reduced_expr, func)``, where ``reduced_expr`` is *expr* with the values
+    substituted and simplified with exact arithmetic. ``func`` is
+    ``compile_function(reduced_expr, symbols, numpy=numpy)``, and if
+    *symbols* is not given, it's the remaining symbols sorted by name.
+
+    Floats are inexact, so they become :class:`NamedConstant` objects in
+    ``reduced_expr`` instead of being simplified with other numbers.
+    """
+    substitutions = {}
+    for symbol, value in values.items():
+        if not isinstance(symbol, Symbol):
+            raise TypeError("expected a Symbol, got %r" % (symbol,))
+        substitutions[symbol] = _parameter_value(value)
+
+    def substitute(obj):
+        if isinstance(obj, Symbol):
+            return substitutions.get(obj, obj)
+        return obj
+
+    reduced = mathify(expr).apply_recursively(substitute).gentle_simplify()
+    if symbols is None:
+        symbols = sorted(_find_symbols(reduced), key=(lambda s: s.name))
+    return (reduced, compile_function(reduced, symbols, numpy=numpy))
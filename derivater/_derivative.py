@@ -0,0 +1,354 @@
+import functools
+import math
+import operator
+
+from derivater._base import (
+    MathObject, eq_and_hash, mathify, Symbol, SymbolFunction, Integer, Add,
+    Mul, Pow, _content)
+from derivater._constants import NamedConstant, e
+from derivater._explog import NaturalLog
+from derivater._functions import _registry
+from derivater._trig import Sine, Cosine
+
+
+# Forward mode with truncated Taylor series: a value that depends on the
+# variable is a list [c0, c1, ..., cn] where ck is the k'th derivative divided
+# by k!, and anything else is a plain float (or a NumPy array). The functions
+# below take and return these lists, and all lists have the same length.
+# The formulas come from differentiating y' = f'(a)*a' and comparing the
+# coefficients on both sides.
+
+def _series_mul(a, b):
+    return [sum(a[j] * b[k-j] for j in range(k+1)) for k in range(len(a))]
+
+
+def _series_reciprocal(a):
+    result = [1 / a[0]]
+    for k in range(1, len(a)):
+        result.append(-sum(a[j] * result[k-j] for j in range(1, k+1)) / a[0])
+    return result
+
+
+def _series_exp(a, numpy):
+    result = [(numpy or math).exp(a[0])]
+    for k in range(1, len(a)):
+        result.append(sum(j * a[j] * result[k-j] for j in range(1, k+1)) / k)
+    return result
+
+
+def _series_ln(a, numpy):
+    result = [(numpy or math).log(a[0])]
+    for k in range(1, len(a)):
+        total = sum(j * result[j] * a[k-j] for j in range(1, k))
+        result.append((a[k] - total/k) / a[0])
+    return result
+
+
+def _series_sin_cos(a, numpy):
+    sines = [(numpy or math).sin(a[0])]
+    cosines = [(numpy or math).cos(a[0])]
+    for k in range(1, len(a)):
+        sines.append(
+            sum(j * a[j] * cosines[k-j] for j in range(1, k+1)) / k)
+        cosines.append(
+            -sum(j * a[j] * sines[k-j] for j in range(1, k+1)) / k)
+    return (sines, cosines)
+
+
+def _series_integer_pow(a, n):
+    if n < 0:
+        return _series_reciprocal(_series_integer_pow(a, -n))
+    # this also works when a[0] is 0
+    result = [1.0] + [0.0]*(len(a) - 1)
+    for i in range(n):
+        result = _series_mul(result, a)
+    return result
+
+
+def _series_pow(a, exponent, numpy):
+    # exponent is a number
+    result = [numpy.power(a[0], exponent) if numpy else
+              math.pow(a[0], exponent)]
+    for k in range(1, len(a)):
+        total = sum(((exponent + 1)*j - k) * a[j] * result[k-j]
+                    for j in range(1, k+1))
+        result.append(total / (k * a[0]))
+    return result
+
+
+def _series_function(obj, rules, a, numpy):
+    # y' = f'(a)*a', so the derivative rule and the series of a is enough
+    if numpy:
+        if rules.numpy_name is None:
+            raise TypeError("no NumPy function for " + repr(obj))
+        first = getattr(numpy, rules.numpy_name)(a[0])
+    else:
+        if rules.evaluate is None:
+            raise TypeError("cannot evaluate " + repr(obj))
+        first = rules.evaluate(a[0])
+    if len(a) == 1:
+        return [first]
+
+    u = Symbol('u')
+    derivative = _series(rules.derivative(u), {'u': a[:-1]}, numpy)
+    derivative = _as_series(derivative, len(a) - 1)
+    result = [first]
+    for k in range(1, len(a)):
+        result.append(
+            sum(j * a[j] * derivative[k-j] for j in range(1, k+1)) / k)
+    return result
+
+
+def _as_series(value, length):
+    if isinstance(value, list):
+        return value
+    return [value] + [0.0]*(length - 1)
+
+
+def _series_node(obj, values, variables, numpy):
+    # values are the values or series of the content of obj
+    klass = type(obj)
+    if klass is Integer:
+        return float(obj.python_int)
+    if klass is Symbol:
+        try:
+            return variables[obj.name]
+        except KeyError:
+            raise TypeError("no value for %s was given" % obj.name)
+    if isinstance(obj, NamedConstant):
+        return float(obj)
+    if klass is Derivative:
+        # content is (obj.materialize(),), see _series_content()
+        return values[0]
+
+    series = [value for value in values if isinstance(value, list)]
+    if klass is Add or klass is Mul:
+        numbers = [value for value in values if not isinstance(value, list)]
+        if klass is Add:
+            number = sum(numbers)
+        else:
+            number = functools.reduce(operator.mul, numbers, 1.0)
+        if not series:
+            return number
+        if klass is Add:
+            result = [sum(coeffs) for coeffs in zip(*series)]
+            result[0] += number
+            return result
+        result = series[0]
+        for other in series[1:]:
+            result = _series_mul(result, other)
+        return [number * coeff for coeff in result]
+
+    if klass is SymbolFunction:
+        raise TypeError("cannot evaluate " + repr(obj))
+
+    if klass is Pow:
+        base, exponent = values
+        if obj.base is e:
+            if isinstance(exponent, list):
+                return _series_exp(exponent, numpy)
+            return (numpy or math).exp(exponent)
+        if isinstance(exponent, list):
+            # a**b = e**(b*ln(a))
+            base = _as_series(base, len(exponent))
+            return _series_exp(
+                _series_mul(exponent, _series_ln(base, numpy)), numpy)
+        if isinstance(base, list):
+            if type(obj.exponent) is Integer:
+                return _series_integer_pow(base, obj.exponent.python_int)
+            return _series_pow(base, exponent, numpy)
+        if type(obj.exponent) is Integer:
+            return base ** obj.exponent.python_int
+        return numpy.power(base, exponent) if numpy else math.pow(
+            base, exponent)
+
+    rules = _registry.get(klass)
+    if rules is None or len(values) != 1:
+        if values:
+            raise TypeError("cannot evaluate " + repr(obj))
+        return float(obj)
+    [arg] = values
+    if not isinstance(arg, list):
+        return _series_function(obj, rules, [arg], numpy)[0]
+
+    if klass is Sine:
+        return _series_sin_cos(arg, numpy)[0]
+    if klass is Cosine:
+        return _series_sin_cos(arg, numpy)[1]
+    if klass is NaturalLog:
+        return _series_ln(arg, numpy)
+    return _series_function(obj, rules, arg, numpy)
+
+
+def _series_content(obj):
+    if type(obj) is Derivative:
+        return (obj.materialize(),)
+    return _content(obj)
+
+
+def _series(root, variables, numpy=None):
+    # variables is {name: float or series}, and the result is a float if
+    # root doesn't depend on the series
+    results = {}    # {id(obj): value}, objects stay alive in root
+
+    # postorder without recursion
+    stack = [root]
+    while stack:
+        obj = stack[-1]
+        if id(obj) in results:
+            stack.pop()
+            continue
+
+        content = _series_content(obj)
+        missing = [child for child in content if id(child) not in results]
+        if missing:
+            stack.extend(missing)
+            continue
+
+        stack.pop()
+        results[id(obj)] = _series_node(
+            obj, [results[id(child)] for child in content], variables, numpy)
+
+    return results[id(root)]
+
+
+def _derivative_value(derivative, at, variables, numpy=None):
+    # the value of a Derivative object, calculated without materializing it
+    variables = dict(variables)
+    variables[derivative.wrt.name] = [at, 1.0] + [0.0]*(derivative.n - 1)
+    result = _series(derivative.expr, variables, numpy)
+    if not isinstance(result, list):
+        return result if derivative.n == 0 else 0.0
+    return result[derivative.n] * math.factorial(derivative.n)
+
+
+@eq_and_hash({'expr': None, 'wrt': None, 'n': None, 'at': None})
+class Derivative(MathObject):
+    """The *n*'th derivative of *expr* with respect to *wrt*, without
+    calculating it yet.
+
+    Taking a derivative with :meth:`~MathObject.derivative` creates a new
+    object and simplifies it, and for big objects, most of the time goes to
+    that. If you only need the values of a derivative, you can use this class
+    instead, and the derivative is calculated from *expr* when needed:
+
+    >>> d = Derivative(x**3 + sin(x), x, 2, at=2)
+    >>> float(d)
+    11.090702573174319
+    >>> func = compile_function(Derivative(x**3 + sin(x), x, 2), [x])
+    >>> func(2)
+    11.090702573174319
+
+    Here ``float()`` and :func:`compile_function` calculate the value with
+    forward mode automatic differentiation, so the derivative is never
+    created as a math object. If *at* is given, the derivative is evaluated
+    at ``wrt = at``.
+
+    ``repr()``, :meth:`~MathObject.simplify` and :func:`evalf` use
+    :meth:`materialize`, so a Derivative looks like the object that it
+    represents:
+
+    >>> d
+    -sin(2) + 12
+    >>> Derivative(f(x), x, 2)
+    f''(x)
+    >>> Derivative(x**3 + sin(x), x).derivative(x)      # still lazy
+    6*x - sin(x)
+    >>> _.n
+    2
+
+    Derivatives compare equal only with other Derivative objects of the same
+    *expr*, *wrt*, *n* and *at*.
+    """
+
+    def __init__(self, expr, wrt, n=1, *, at=None):
+        if not isinstance(wrt, Symbol):
+            raise TypeError("expected a Symbol, got %r" % (wrt,))
+        if n < 0:
+            raise ValueError("negative n is not supported")
+        self.expr = mathify(expr)
+        self.wrt = wrt
+        self.n = n
+        self.at = wrt if at is None else mathify(at)
+        # content must be the same objects every time, so that e.g. sort
+        # keys get cached to them
+        self._n_object = mathify(n)
+
+    def materialize(self):
+        """Calculate the derivative as a math object.
+
+        >>> Derivative(x**3, x, at=y).materialize()
+        3*y**2
+
+        The result is cached, so calling this again is fast.
+        """
+        try:
+            return self._cached_materialized
+        except AttributeError:
+            pass
+
+        def materialize_inner(obj):
+            if isinstance(obj, Derivative):
+                return obj.materialize()
+            return obj
+
+        result = self.expr.apply_recursively(materialize_inner)
+        for i in range(self.n):
+            result = result.derivative(self.wrt)
+        if self.at != self.wrt:
+            result = result.replace(self.wrt, self.at).gentle_simplify()
+        self._cached_materialized = result
+        return result
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def add_parenthesize(self):
+        return self.materialize().add_parenthesize()
+
+    def mul_parenthesize(self):
+        return self.materialize().mul_parenthesize()
+
+    def pow_parenthesize(self):
+        return self.materialize().pow_parenthesize()
+
+    def __float__(self):
+        return _derivative_value(self, float(self.at), {})
+
+    def apply_to_content(self, func):
+        wrt = func(self.wrt)
+        n = func(self._n_object)
+        if wrt != self.wrt or n != self._n_object:
+            # e.g. replacing wrt with 2, the derivative must be taken first
+            return self.materialize().apply_to_content(func)
+        return Derivative(func(self.expr), self.wrt, self.n, at=func(self.at))
+
+    def may_depend_on(self, var):
+        return (self.at.may_depend_on(var) or
+                (var != self.wrt and self.expr.may_depend_on(var)))
+
+    def derivative(self, wrt):
+        if wrt == self.wrt and self.at == self.wrt:
+            return Derivative(self.expr, self.wrt, self.n + 1)
+        return self.materialize().derivative(wrt)
+
+    def gentle_simplify(self):
+        expr = self.expr.gentle_simplify()
+        at = self.at.gentle_simplify()
+        wrt = self.wrt
+        if self.n == 0:
+            return expr.replace(wrt, at)
+        if not expr.may_depend_on(wrt):
+            return mathify(0)
+        if expr == wrt:
+            return mathify(1 if self.n == 1 else 0)
+        if type(expr) is SymbolFunction and expr.arg == wrt:
+            return SymbolFunction(
+                expr.name, at,
+                derivative_count=(expr.derivative_count + self.n))
+        if type(expr) is Derivative and expr.wrt == wrt and expr.at == wrt:
+            return Derivative(expr.expr, wrt, expr.n + self.n, at=at)
+        return Derivative(expr, wrt, self.n, at=at)
+
+    def simplify(self):
+        return self.materialize().simplify()
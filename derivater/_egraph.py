@@ -0,0 +1,488 @@
+import collections
+import functools
+import itertools
+import operator
+import time
+
+from derivater import _budget
+from derivater._base import (
+    MathObject, eq_and_hash, mathify, Integer, Add, Mul, Pow)
+from derivater._constants import e
+from derivater._explog import NaturalLog, ln
+from derivater._trig import Sine, Cosine, Tangent, sin, cos, tan
+
+
+@eq_and_hash({'index': None})
+class _Hole(MathObject):
+    # a placeholder for the children of an e-node, see _EGraph._skeleton()
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return '<hole %d>' % self.index
+
+
+@eq_and_hash({'class_id': None})
+class _ClassRef(MathObject):
+    # rewrite rules see these instead of subtrees that they don't need to look
+    # into, and _EGraph.add() turns them back into e-class ids
+
+    def __init__(self, class_id):
+        self.class_id = class_id
+
+    def __repr__(self):
+        return '<e-class %d>' % self.class_id
+
+    # an e-class may contain anything, so this must be conservative
+    def may_depend_on(self, var):
+        return True
+
+
+# an e-node is (head, child_class_ids), where head is Add or Mul for sums and
+# products (children are sorted, so commutativity is free), or a "skeleton"
+# object with _Holes where the children go for everything else
+_ENode = collections.namedtuple('_ENode', ['head', 'children'])
+
+
+class _EGraph:
+
+    def __init__(self):
+        self._parents = []              # union-find, index is class id
+        self._hashcons = {}             # {enode: class_id}
+        self.classes = {}               # {root class_id: set of enodes}
+
+    def find(self, class_id):
+        root = class_id
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[class_id] != root:   # path compression
+            self._parents[class_id], class_id = root, self._parents[class_id]
+        return root
+
+    def node_count(self):
+        return len(self._hashcons)
+
+    def _skeleton(self, obj):
+        holes = itertools.count()
+        return obj.apply_to_content(lambda child: _Hole(next(holes)))
+
+    def _canonicalize(self, enode):
+        children = tuple(map(self.find, enode.children))
+        if enode.head in (Add, Mul):
+            children = tuple(sorted(children))
+        return _ENode(enode.head, children)
+
+    def _add_enode(self, enode):
+        enode = self._canonicalize(enode)
+        try:
+            return self.find(self._hashcons[enode])
+        except KeyError:
+            class_id = len(self._parents)
+            self._parents.append(class_id)
+            self._hashcons[enode] = class_id
+            self.classes[class_id] = {enode}
+            return class_id
+
+    def add(self, obj):
+        """Add a math object and return the id of its e-class."""
+        # postorder without recursion, objects stay alive in obj and contents
+        class_ids = {}      # {id(obj): class_id}
+        contents = {}       # {id(obj): content}
+        stack = [obj]
+        while stack:
+            current = stack[-1]
+            if id(current) in class_ids:
+                stack.pop()
+                continue
+            if isinstance(current, _ClassRef):
+                class_ids[id(current)] = self.find(current.class_id)
+                stack.pop()
+                continue
+
+            try:
+                content = contents[id(current)]
+            except KeyError:
+                if type(current) in (Add, Mul):
+                    content = current.objects
+                else:
+                    content = current.get_content()
+                contents[id(current)] = content
+            missing = [child for child in content
+                       if id(child) not in class_ids]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            if type(current) in (Add, Mul):
+                head = type(current)
+            else:
+                head = self._skeleton(current)
+            children = tuple(class_ids[id(child)] for child in content)
+            class_ids[id(current)] = self._add_enode(_ENode(head, children))
+        return class_ids[id(obj)]
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        if len(self.classes[a]) < len(self.classes[b]):
+            a, b = b, a
+        self._parents[b] = a
+        self.classes[a] |= self.classes.pop(b)
+        return True
+
+    def rebuild(self):
+        # restore the congruence invariant: e-nodes whose children were
+        # merged may be equal now, so their e-classes must be merged too
+        while True:
+            new_hashcons = {}
+            merges = []
+            for enode, class_id in self._hashcons.items():
+                enode = self._canonicalize(enode)
+                class_id = self.find(class_id)
+                if new_hashcons.get(enode, class_id) != class_id:
+                    merges.append((new_hashcons[enode], class_id))
+                new_hashcons[enode] = class_id
+            self._hashcons = new_hashcons
+            if not merges:
+                break
+            for a, b in merges:
+                self.union(a, b)
+
+        self.classes = collections.defaultdict(set)
+        for enode, class_id in self._hashcons.items():
+            self.classes[self.find(class_id)].add(enode)
+        self.classes = dict(self.classes)
+
+    def build(self, enode, children):
+        """Create a math object from an e-node and objects for its children.
+
+        This does not call gentle_simplify(), so the result looks exactly like
+        the e-node.
+        """
+        if enode.head in (Add, Mul):
+            return enode.head(children)
+        return enode.head.apply_to_content(
+            lambda hole: children[hole.index])
+
+
+def _size_cost(enode, graph):
+    return 1
+
+
+def _ops_cost(enode, graph):
+    # very rough guesses of how expensive it is to evaluate things
+    if enode.head in (Add, Mul):
+        return max(len(enode.children) - 1, 0)
+    if isinstance(enode.head, Pow):
+        return 4
+    if enode.children:
+        return 10       # a function call, e.g. sin or ln
+    return 0
+
+
+_COST_MODELS = {'size': _size_cost, 'ops': _ops_cost}
+
+
+def _compute_costs(graph, cost_func):
+    # {class_id: (cost, enode)}, a fixpoint because e-graphs may have cycles
+    best = {}
+    changed = True
+    while changed:
+        changed = False
+        for class_id, enodes in graph.classes.items():
+            for enode in enodes:
+                children = [graph.find(child) for child in enode.children]
+                if not all(child in best for child in children):
+                    continue
+                cost = cost_func(enode, graph) + sum(
+                    best[child][0] for child in children)
+                if class_id not in best or cost < best[class_id][0]:
+                    best[class_id] = (cost, enode)
+                    changed = True
+    return best
+
+
+def _extract(graph, best, class_id):
+    # postorder without recursion
+    cache = {}      # {class_id: math object}
+    stack = [graph.find(class_id)]
+    while stack:
+        current = stack[-1]
+        if current in cache:
+            stack.pop()
+            continue
+        enode = best[current][1]
+        children = [graph.find(child) for child in enode.children]
+        missing = [child for child in children if child not in cache]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        cache[current] = graph.build(
+            enode, [cache[child] for child in children])
+    return cache[graph.find(class_id)]
+
+
+def _views(graph, best, class_id, depth):
+    # yield math objects for each e-node of the class, with children shown
+    # depth levels deep using the cheapest e-node of each child class, and
+    # more objects where one child is shown differently
+    def child_view(class_id, depth, enode=None):
+        class_id = graph.find(class_id)
+        leaves = [enode for enode in graph.classes[class_id]
+                  if not enode.children]
+        if leaves:
+            # constants and symbols are as simple as it gets
+            return graph.build(min(leaves, key=repr), [])
+        if depth == 0 or class_id not in best:
+            return _ClassRef(class_id)
+        if enode is None:
+            enode = best[class_id][1]
+        return graph.build(enode, [child_view(child, depth-1)
+                                   for child in enode.children])
+
+    for enode in list(graph.classes[class_id]):
+        if not enode.children:
+            continue
+        children = [child_view(child, depth-1) for child in enode.children]
+        yield graph.build(enode, children)
+
+        for index, child in enumerate(enode.children):
+            for child_enode in graph.classes[graph.find(child)]:
+                if child_enode.children and child_enode != best.get(
+                        graph.find(child), (None, None))[1]:
+                    alternative = children.copy()
+                    alternative[index] = child_view(child, depth-1,
+                                                    child_enode)
+                    yield graph.build(enode, alternative)
+
+
+# rewrite rules: functions that take a term and return a list of terms that
+# are equal to it, these don't need to check whether they apply to anything
+def _rule_gentle(term):
+    return [term.gentle_simplify()]
+
+
+def _as_power(obj):
+    if isinstance(obj, Pow):
+        return (obj.base, obj.exponent)
+    return (obj, mathify(1))
+
+
+def _rule_tan(term):
+    if isinstance(term, Tangent):
+        return [sin(term.arg) / cos(term.arg)]
+    if isinstance(term, Mul):
+        # sin(x)**n * cos(x)**(-n) = tan(x)**n
+        result = []
+        for obj in term.objects:
+            base, exponent = _as_power(obj)
+            if not isinstance(base, Sine):
+                continue
+            cos_power = Pow(Cosine(base.arg), -exponent)
+            if cos_power in term.objects:
+                rest = list(term.objects)
+                rest.remove(obj)
+                rest.remove(cos_power)
+                result.append(Mul(rest + [tan(base.arg)**exponent])
+                              .gentle_simplify())
+        return result
+    return []
+
+
+def _rule_pythagorean(term):
+    if not isinstance(term, Add):
+        return []
+
+    result = []
+    for i, obj in enumerate(term.objects):
+        coeff, square = obj.with_fraction_coeff()
+        if (isinstance(square, Pow) and square.exponent == mathify(2) and
+                isinstance(square.base, (Sine, Cosine))):
+            # a*sin(x)**2 = a - a*cos(x)**2, and the other way around
+            other = cos if isinstance(square.base, Sine) else sin
+            rest = term.objects[:i] + term.objects[i+1:]
+            result.append(Add(list(rest) + [
+                coeff, -coeff * other(square.base.arg)**2,
+            ]).gentle_simplify())
+    return result
+
+
+def _rule_double_angle(term):
+    if isinstance(term, (Sine, Cosine)):
+        coeff, half_arg = term.arg.with_fraction_coeff()
+        if coeff == mathify(2):
+            if isinstance(term, Sine):
+                return [2*sin(half_arg)*cos(half_arg)]
+            return [cos(half_arg)**2 - sin(half_arg)**2]
+
+    if isinstance(term, Mul):
+        coeff, rest = term.with_fraction_coeff()
+        factors = rest.objects if isinstance(rest, Mul) else [rest]
+        for obj in factors:
+            if isinstance(obj, Sine) and cos(obj.arg) in factors:
+                others = list(factors)
+                others.remove(obj)
+                others.remove(cos(obj.arg))
+                return [Mul(others + [coeff/2, sin(2*obj.arg)])
+                        .gentle_simplify()]
+    return []
+
+
+def _rule_logarithm(term):
+    if isinstance(term, NaturalLog):
+        if isinstance(term.numerus, Mul):
+            return [Add(ln(obj) for obj in term.numerus.objects)
+                    .gentle_simplify()]
+        if isinstance(term.numerus, Pow):
+            return [term.numerus.exponent * ln(term.numerus.base)]
+
+    if isinstance(term, Add):
+        logs = [obj for obj in term.objects if isinstance(obj, NaturalLog)]
+        if len(logs) >= 2:
+            rest = [obj for obj in term.objects
+                    if not isinstance(obj, NaturalLog)]
+            product = Mul(log.numerus for log in logs).gentle_simplify()
+            return [Add(rest + [ln(product)]).gentle_simplify()]
+
+    if (isinstance(term, Pow) and term.base == e and
+            isinstance(term.exponent, NaturalLog)):
+        return [term.exponent.numerus]
+    return []
+
+
+def _rule_distribute(term):
+    if not isinstance(term, Mul):
+        return []
+    for i, obj in enumerate(term.objects):
+        if isinstance(obj, Add):
+            rest = term.objects[:i] + term.objects[i+1:]
+            return [Add(Mul(rest + (part,)) for part in obj.objects)
+                    .gentle_simplify()]
+    return []
+
+
+def _rule_factor(term):
+    if not isinstance(term, Add) or len(term.objects) < 2:
+        return []
+
+    def factors(obj):
+        if isinstance(obj, Mul):
+            return collections.Counter(obj.objects)
+        return collections.Counter([obj])
+
+    common = functools.reduce(operator.and_, map(factors, term.objects))
+    common = [obj for obj in common.elements() if not isinstance(obj, Integer)]
+    if not common:
+        return []
+    product = Mul(common).gentle_simplify()
+    return [product * Add(obj/product for obj in term.objects)]
+
+
+_RULES = [_rule_gentle, _rule_tan, _rule_pythagorean, _rule_double_angle,
+          _rule_logarithm, _rule_distribute, _rule_factor]
+
+
+def egraph_simplify(obj, *, cost='size', node_limit=2000, iteration_limit=6,
+                    time_limit=1.0, budget=None):
+    """Simplify *obj* using equality saturation.
+
+    The object is inserted into an e-graph, a data structure that stores many
+    equivalent forms of the same thing without throwing any of them away.
+    Identities like ``sin(x)**2 + cos(x)**2 == 1``,
+    ``tan(x) == sin(x)/cos(x)``, ``ln(a*b) == ln(a) + ln(b)`` and the things
+    that :meth:`~MathObject.gentle_simplify` does are applied until nothing new
+    is found or a limit is reached, and then the cheapest form is returned.
+
+    >>> egraph_simplify(sin(x)**2*y + cos(x)**2*y)
+    y
+    >>> egraph_simplify(tan(x)*cos(x))
+    sin(x)
+
+    The *cost* can be ``'size'`` to count nodes of the resulting tree, or
+    ``'ops'`` to estimate how expensive it is to evaluate the result. The
+    *node_limit*, *iteration_limit* and *time_limit* (in seconds) arguments
+    limit how much work is done, and the best result found so far is returned
+    when any of them is exceeded. Running out of a :class:`Budget` given as
+    *budget* is handled similarly.
+    """
+    try:
+        cost_func = _COST_MODELS[cost]
+    except KeyError:
+        raise ValueError("unknown cost model " + repr(cost)) from None
+
+    deadline = time.monotonic() + time_limit
+    graph = _EGraph()
+    root = graph.add(mathify(obj))
+    best = _compute_costs(graph, cost_func)
+
+    def out_of_limits():
+        return (graph.node_count() > node_limit or
+                time.monotonic() > deadline)
+
+    def saturate():
+        nonlocal best
+        for iteration in range(iteration_limit):
+            # find everything first and then modify the e-graph, so that the
+            # rules see the same e-graph no matter which order things are in
+            matches = []
+            for class_id in list(graph.classes):
+                if out_of_limits():
+                    break
+                for term in _views(graph, best, class_id, depth=4):
+                    for rule in _RULES:
+                        for new_term in rule(term):
+                            matches.append((class_id, new_term))
+
+            changed = False
+            for class_id, new_term in matches:
+                if out_of_limits():
+                    break
+                if graph.union(class_id, graph.add(new_term)):
+                    changed = True
+
+            graph.rebuild()
+            best = _compute_costs(graph, cost_func)
+            if not changed or out_of_limits():
+                break
+
+    _budget.run_with_budget(budget, saturate, [None])
+
+    # the budget may have run out in the middle of modifying the e-graph
+    graph.rebuild()
+    best = _compute_costs(graph, cost_func)
+
+    # the extracted object was built without gentle_simplify(), and that
+    # counts towards the budget too
+    extracted = _extract(graph, best, root)
+    return _budget.run_with_budget(
+        budget, extracted.gentle_simplify, [extracted])
+
+
+def simplify(obj, method='default', *, budget=None, **options):
+    """Simplify *obj* with the given *method*.
+
+    The ``'default'`` method is the same as calling
+    :meth:`~MathObject.simplify`, and ``'egraph'`` calls
+    :func:`egraph_simplify` with the keyword arguments.
+
+    >>> simplify(x + x)
+    2*x
+    >>> simplify(sin(x)**2 + cos(x)**2, method='egraph')
+    1
+
+    If the given :class:`Budget` runs out, the simplest object found so far is
+    returned; that's *obj* itself with the default method.
+    """
+    obj = mathify(obj)
+    if method == 'default':
+        if options:
+            raise TypeError("the default method doesn't take any options")
+        return _budget.run_with_budget(budget, obj.simplify, [obj])
+    if method == 'egraph':
+        return egraph_simplify(obj, budget=budget, **options)
+    raise ValueError("unknown simplify method " + repr(method))
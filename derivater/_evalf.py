@@ -0,0 +1,296 @@
+import decimal
+import fractions
+import functools
+from decimal import Decimal
+
+from derivater._base import (
+    MathObject, mathify, Symbol, SymbolFunction, Integer, Add, Mul, Pow,
+    _content)
+from derivater._constants import NamedConstant, e, tau
+from derivater._derivative import Derivative
+from derivater._explog import NaturalLog
+from derivater._functions import _registry
+from derivater._trig import (
+    Sine, Cosine, Tangent, ArcSine, ArcCosine, ArcTangent)
+
+
+# the calculations are done with this many extra digits, and the result is
+# rounded to the precision that the user wants
+_GUARD_DIGITS = 10
+
+
+# all these functions use the precision of the current decimal context
+
+@functools.lru_cache()
+def _pi(prec):
+    # this is from the docs of the decimal module
+    with decimal.localcontext() as context:
+        context.prec = prec + 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return s
+
+
+def _reduce_angle(x):
+    # returns an angle between -pi and pi with the same sin and cos
+    with decimal.localcontext() as context:
+        # big angles need more digits, because the integer part is lost
+        context.prec += max(x.adjusted(), 0)
+        two_pi = 2 * _pi(context.prec)
+        return x - two_pi * (x / two_pi).to_integral_value()
+
+
+def _sin(x):
+    x = _reduce_angle(x)
+    with decimal.localcontext() as context:
+        context.prec += 2
+        i, lasts, s, fact, num, sign = 1, 0, x, 1, x, 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+    return +s
+
+
+def _cos(x):
+    x = _reduce_angle(x)
+    with decimal.localcontext() as context:
+        context.prec += 2
+        i, lasts, s, fact, num, sign = 0, 0, 1, 1, 1, 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+    return +s
+
+
+def _tan(x):
+    return _sin(x) / _cos(x)
+
+
+def _atan(x):
+    prec = decimal.getcontext().prec
+    if x < 0:
+        return -_atan(-x)
+    if x > 1:
+        return _pi(prec) / 2 - _atan(1 / x)
+
+    with decimal.localcontext() as context:
+        context.prec += 2
+        # atan(x) = 2*atan(x / (1 + sqrt(1 + x**2))), this makes x small so
+        # that the series converges quickly
+        for i in range(3):
+            x = x / (1 + (1 + x*x).sqrt())
+        n, lasts, s, num, sign = 1, 0, x, x, 1
+        while s != lasts:
+            lasts = s
+            n += 2
+            num *= x * x
+            sign *= -1
+            s += num / n * sign
+        s *= 8
+    return +s
+
+
+def _asin(x):
+    if abs(x) > 1:
+        raise ValueError("math domain error")
+    if abs(x) == 1:
+        return x * _pi(decimal.getcontext().prec) / 2
+    return _atan(x / (1 - x*x).sqrt())
+
+
+def _acos(x):
+    return _pi(decimal.getcontext().prec) / 2 - _asin(x)
+
+
+def _ln(x):
+    if x <= 0:
+        raise ValueError("math domain error")
+    return x.ln()
+
+
+_FUNCTIONS = {
+    Sine: _sin,
+    Cosine: _cos,
+    Tangent: _tan,
+    ArcSine: _asin,
+    ArcCosine: _acos,
+    ArcTangent: _atan,
+    NaturalLog: _ln,
+}
+
+
+def _to_decimal(value):
+    if isinstance(value, fractions.Fraction):
+        return Decimal(value.numerator) / value.denominator
+    return value
+
+
+def _pow(base, exponent):
+    if (isinstance(exponent, fractions.Fraction) and
+            exponent.denominator == 1):
+        # exact if base is a Fraction
+        return base ** exponent.numerator
+
+    base = _to_decimal(base)
+    exponent = _to_decimal(exponent)
+    if base < 0:
+        raise ValueError("cannot raise a negative number to a non-integer "
+                         "power")
+    if base == 0:
+        if exponent <= 0:
+            raise ZeroDivisionError("0 cannot be raised to a negative power")
+        return Decimal(0)
+    return base ** exponent
+
+
+def _evaluate_node(obj, values, subs, prec):
+    # values are the values of the content of obj
+    klass = type(obj)
+    if klass is Integer:
+        return fractions.Fraction(obj.python_int)
+    if klass is Add:
+        if all(isinstance(value, fractions.Fraction) for value in values):
+            return sum(values)
+        return sum(map(_to_decimal, values))
+    if klass is Mul:
+        result = fractions.Fraction(1)
+        if not all(isinstance(value, fractions.Fraction) for value in values):
+            result = Decimal(1)
+            values = map(_to_decimal, values)
+        for value in values:
+            result *= value
+        return result
+    if klass is Pow:
+        if obj.base is e:
+            return _to_decimal(values[1]).exp()
+        return _pow(*values)
+    if klass is Derivative:
+        # content is (obj.materialize(),), see _evaluate()
+        return values[0]
+    if klass is Symbol:
+        try:
+            return subs[obj.name]
+        except KeyError:
+            raise ValueError("no value for %s was given" % obj.name)
+    if obj is e:
+        return Decimal(1).exp()
+    if obj is tau:
+        return 2*_pi(prec)
+    if isinstance(obj, NamedConstant):
+        # the float value is all we know about other constants
+        return Decimal(float(obj))
+    if klass is SymbolFunction:
+        raise TypeError("cannot evaluate " + repr(obj))
+
+    if klass in _FUNCTIONS:
+        return _FUNCTIONS[klass](_to_decimal(values[0]))
+    rules = _registry.get(klass)
+    if rules is not None and rules.evaluate is not None:
+        return Decimal(rules.evaluate(float(values[0])))
+    if values:
+        raise TypeError("cannot evaluate " + repr(obj))
+    return Decimal(float(obj))
+
+
+def _evaluate(root, subs, prec):
+    results = {}    # {id(obj): (value, constant)}, objects stay alive in root
+
+    # postorder without recursion
+    stack = [root]
+    while stack:
+        obj = stack[-1]
+        if id(obj) in results:
+            stack.pop()
+            continue
+
+        try:
+            cached_prec, value = obj._cached_evalf
+        except AttributeError:
+            pass
+        else:
+            if cached_prec == prec:
+                stack.pop()
+                results[id(obj)] = (value, True)
+                continue
+
+        if type(obj) is Derivative:
+            content = (obj.materialize(),)
+        else:
+            content = _content(obj)
+        missing = [child for child in content if id(child) not in results]
+        if missing:
+            stack.extend(missing)
+            continue
+
+        stack.pop()
+        child_results = [results[id(child)] for child in content]
+        value = _evaluate_node(
+            obj, [value for value, constant in child_results], subs, prec)
+        constant = (type(obj) is not Symbol and
+                    all(constant for value, constant in child_results))
+        if constant and type(obj) is not Integer:
+            obj._cached_evalf = (prec, value)
+        results[id(obj)] = (value, constant)
+
+    return results[id(root)][0]
+
+
+def evalf(expr, subs=None, prec=50):
+    """Evaluate *expr* to *prec* significant digits.
+
+    >>> evalf(pi)
+    Decimal('3.1415926535897932384626433832795028841971693993751')
+    >>> evalf(x**2 + sin(x), {x: 2}, prec=20)
+    Decimal('4.9092974268256816954')
+
+    The result is a :class:`decimal.Decimal`, and *subs* is a dict that maps
+    :class:`Symbols <Symbol>` or their names to values. The values can be
+    Python ints, floats, :class:`fractions.Fraction` and
+    :class:`decimal.Decimal` objects, or MathObjects that contain no
+    symbols.
+
+    Rational parts of the expression are calculated exactly with
+    :class:`fractions.Fraction`, and everything else is calculated with a
+    few more digits than *prec*. :data:`e`, :data:`tau` and :data:`pi` are
+    calculated to the precision needed, but other :class:`NamedConstants
+    <NamedConstant>` are only as precise as their float values.
+
+    >>> evalf(mathify(1)/3, prec=5)
+    Decimal('0.33333')
+    >>> evalf(2*x, {'x': 0.1})
+    Decimal('0.20000000000000001110223024625156540423631668090820')
+
+    The values of parts of *expr* that contain no symbols are stored, so
+    evaluating the same expression again with different values of the
+    symbols is faster.
+    """
+    subs_by_name = {}
+    for symbol, value in (subs or {}).items():
+        name = symbol.name if isinstance(symbol, Symbol) else symbol
+        if isinstance(value, (int, float)):
+            value = fractions.Fraction(value)
+        elif isinstance(value, MathObject):
+            value = evalf(value, prec=prec)
+        elif not isinstance(value, (fractions.Fraction, Decimal)):
+            raise TypeError("cannot use %r as a value of %s" % (value, name))
+        subs_by_name[name] = value
+
+    with decimal.localcontext() as context:
+        context.prec = prec + _GUARD_DIGITS
+        result = _evaluate(mathify(expr), subs_by_name, context.prec)
+        context.prec = prec
+        return +_to_decimal(result)
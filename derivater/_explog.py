@@ -3,6 +3,7 @@ import math
 
 from derivater._base import MathObject, eq_and_hash, mathify
 from derivater._constants import e
+from derivater._functions import register_function
 
 
 def exp(exponent):
@@ -20,6 +21,8 @@ def exp(exponent):
     return e**exponent
 
 
+@register_function(lambda numerus: 1/numerus, math.log, numpy_name='log',
+                   argument='numerus')
 @eq_and_hash({'numerus': None})
 class NaturalLog(MathObject):
     """The type of many objects returned by :func:`ln`.
@@ -38,9 +41,6 @@ class NaturalLog(MathObject):
     def __repr__(self):
         return 'ln(%r)' % self.numerus
 
-    def __float__(self):
-        return math.log(float(self.numerus))
-
     def apply_to_content(self, func):
         return ln(func(self.numerus))
 
@@ -51,9 +51,6 @@ class NaturalLog(MathObject):
     def may_depend_on(self, wrt):
         return self.numerus.may_depend_on(wrt)
 
-    def derivative(self, wrt):
-        return 1/self.numerus * self.numerus.derivative(wrt)
-
 
 def ln(numerus):
     """Return the natural logarithm (base :data:`e`) of *numerus*.
@@ -0,0 +1,57 @@
+import collections
+
+from derivater._base import mathify
+
+
+FunctionRules = collections.namedtuple(
+    'FunctionRules', ['argument', 'derivative', 'evaluate', 'numpy_name'])
+
+# {class: FunctionRules}, other modules look up rules from here with
+# _registry.get(type(obj)) instead of checking each class with isinstance
+_registry = {}
+
+
+def register_function(derivative, evaluate=None, *, numpy_name=None,
+                      argument='arg'):
+    """A class decorator for MathObjects that represent a function of one
+    argument.
+
+    The argument must be stored in an attribute named *argument*. For
+    example, the :class:`Sine` class is defined roughly like this::
+
+        @register_function(lambda arg: cos(arg), math.sin, numpy_name='sin')
+        @eq_and_hash({'arg': None})
+        class Sine(MathObject):
+            ...
+
+    Here *derivative* takes the argument and returns the derivative of the
+    function at that argument, e.g. ``cos(arg)`` for sine. The decorator adds
+    a :meth:`~MathObject.derivative` method that multiplies that with the
+    derivative of the argument, so you don't need to remember the chain rule.
+    If the class has a ``derivative`` method already, it's not replaced.
+
+    If *evaluate* is given, it's called with a float and it should return a
+    float, and it's used for ``__float__`` unless the class defines
+    ``__float__`` already. *numpy_name* is the name of the corresponding NumPy
+    function, like ``'sin'`` or ``'arctan'``, or None if there's no such
+    function.
+    """
+    def decorator(klass):
+        rules = FunctionRules(argument, derivative, evaluate, numpy_name)
+        _registry[klass] = rules
+
+        def derivative_method(self, wrt):
+            arg = getattr(self, argument)
+            arg_derivative = arg.derivative(wrt)
+            if arg_derivative == mathify(0):
+                return arg_derivative
+            return rules.derivative(arg) * arg_derivative
+
+        if 'derivative' not in vars(klass):
+            klass.derivative = derivative_method
+        if evaluate is not None and '__float__' not in vars(klass):
+            klass.__float__ = (
+                lambda self: evaluate(float(getattr(self, argument))))
+        return klass
+
+    return decorator
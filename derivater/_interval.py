@@ -0,0 +1,342 @@
+import functools
+import math
+import sys
+
+from derivater._base import (
+    mathify, Symbol, SymbolFunction, Integer, Add, Mul, Pow, _content)
+from derivater._constants import NamedConstant, e
+from derivater._derivative import Derivative
+from derivater._explog import NaturalLog
+from derivater._trig import (
+    Sine, Cosine, Tangent, ArcSine, ArcCosine, ArcTangent)
+
+try:
+    from math import nextafter
+except ImportError:     # python 3.8 or older
+    import struct
+
+    def nextafter(x, y):
+        if math.isnan(x) or x == y:
+            return x
+        if x == 0:
+            return math.copysign(5e-324, y)
+        [bits] = struct.unpack('<q', struct.pack('<d', x))
+        bits += 1 if (x < y) == (x > 0) else -1
+        [result] = struct.unpack('<d', struct.pack('<q', bits))
+        return result
+
+
+_INF = float('inf')
+_EVERYTHING = (-_INF, _INF)
+
+
+# + - * / are correctly rounded, so the exact result is at most 1 ulp away,
+# but functions in math are less precise
+def _down(x, ulps=1):
+    for i in range(ulps):
+        x = nextafter(x, -_INF)
+    return x
+
+
+def _up(x, ulps=1):
+    for i in range(ulps):
+        x = nextafter(x, _INF)
+    return x
+
+
+def _outward(lo, hi, ulps=2):
+    return (_down(lo, ulps), _up(hi, ulps))
+
+
+def _number(value):
+    # the smallest interval of floats that contains the value
+    try:
+        result = float(value)
+    except OverflowError:
+        return (sys.float_info.max, _INF) if value > 0 else (
+            -_INF, -sys.float_info.max)
+    if result == value:
+        return (result, result)
+    return (_down(result), _up(result))
+
+
+def _add_floats(x, y):
+    # returns (x + y, sign of the rounding error)
+    result = x + y
+    if not math.isfinite(result):
+        return (result, 0)
+    # this is the TwoSum algorithm, and it gives the exact error
+    y_part = result - x
+    error = (x - (result - y_part)) + (y - y_part)
+    return (result, (error > 0) - (error < 0))
+
+
+def _add(a, b):
+    lo, lo_error = _add_floats(a[0], b[0])
+    hi, hi_error = _add_floats(a[1], b[1])
+    return (_down(lo) if lo_error < 0 else lo,
+            _up(hi) if hi_error > 0 else hi)
+
+
+def _mul_floats(x, y):
+    # 0*inf is 0 here, because the infinities come from things like 1/x when
+    # x gets close to 0, and the actual values are finite
+    if x == 0 or y == 0:
+        return 0.0
+    return x * y
+
+
+def _mul(a, b):
+    products = [_mul_floats(x, y) for x in a for y in b]
+    return (_down(min(products)), _up(max(products)))
+
+
+def _reciprocal(a):
+    lo, hi = a
+    if lo < 0 < hi or lo == hi == 0:
+        return _EVERYTHING
+    if lo == 0:
+        return (_down(1 / hi), _INF)
+    if hi == 0:
+        return (-_INF, _up(1 / lo))
+    return (_down(1 / hi), _up(1 / lo))
+
+
+def _float_pow(x, y):
+    try:
+        return x ** y
+    except (OverflowError, ZeroDivisionError):
+        # negative bases only come with integer exponents, and an odd
+        # exponent keeps the sign, e.g. (-1e200)**3 is about -inf
+        odd = (y == int(y) and int(y) % 2 == 1)
+        return math.copysign(_INF, x if odd else 1.0)
+
+
+def _exp_float(x):
+    try:
+        return math.exp(x)
+    except OverflowError:
+        return _INF
+
+
+def _exp(a):
+    return (max(_down(_exp_float(a[0]), 2), 0.0), _up(_exp_float(a[1]), 2))
+
+
+def _ln(a):
+    lo, hi = a
+    if lo < 0:
+        raise ValueError("ln() of an interval with negative numbers")
+    lo_result = -_INF if lo == 0 else _down(math.log(lo), 2)
+    hi_result = -_INF if hi == 0 else _up(math.log(hi), 2)
+    return (lo_result, hi_result)
+
+
+def _integer_pow(base, n):
+    lo, hi = base
+    if n == 0:
+        return (1.0, 1.0)
+    if n == 1:
+        return base
+    if n < 0:
+        return _reciprocal(_integer_pow(base, -n))
+    if n % 2 == 0 and lo < 0 < hi:
+        return (0.0, _up(_float_pow(max(-lo, hi), n), 2))
+    if n % 2 == 0 and hi <= 0:
+        lo, hi = -hi, -lo
+
+    result_lo = _down(_float_pow(lo, n), 2)
+    if lo >= 0:
+        # rounding must not make it negative, e.g. 0**2 is 0
+        result_lo = max(result_lo, 0.0)
+    return (result_lo, _up(_float_pow(hi, n), 2))
+
+
+def _pow(base, exponent, base_is_e):
+    if base_is_e:
+        return _exp(exponent)
+
+    lo, hi = exponent
+    if lo == hi and lo == int(lo):
+        return _integer_pow(base, int(lo))
+    if base[0] < 0:
+        raise ValueError("cannot raise an interval with negative numbers to "
+                         "a non-integer power")
+    if lo == hi:
+        # x**p is monotonic
+        if lo < 0:
+            base = (base[1], base[0])
+        return (max(_down(_float_pow(base[0], lo), 2), 0.0),
+                _up(_float_pow(base[1], lo), 2))
+    return _exp(_mul(exponent, _ln(base)))
+
+
+def _contains_point(a, offset, period):
+    # is offset + k*period in the interval for some integer k?
+    # the floats aren't exact, so this also returns True if it's close
+    lo, hi = a
+    k = math.ceil((lo - offset) / period)
+    point = offset + k*period
+    slack = 4 * (abs(lo) + abs(hi) + period) * 2**-52
+    return point <= hi + slack or offset + (k - 1)*period >= lo - slack
+
+
+def _periodic(a, func, max_offset, min_offset):
+    lo, hi = a
+    if not (math.isfinite(lo) and math.isfinite(hi)) or hi - lo >= 2*math.pi:
+        return (-1.0, 1.0)
+    values = [func(lo), func(hi)]
+    result_lo = _down(min(values), 2)
+    result_hi = _up(max(values), 2)
+    if _contains_point(a, max_offset, 2*math.pi):
+        result_hi = 1.0
+    if _contains_point(a, min_offset, 2*math.pi):
+        result_lo = -1.0
+    return (max(result_lo, -1.0), min(result_hi, 1.0))
+
+
+def _sin(a):
+    return _periodic(a, math.sin, math.pi/2, -math.pi/2)
+
+
+def _cos(a):
+    return _periodic(a, math.cos, 0.0, math.pi)
+
+
+def _tan(a):
+    lo, hi = a
+    if (not (math.isfinite(lo) and math.isfinite(hi)) or hi - lo >= math.pi or
+            _contains_point(a, math.pi/2, math.pi)):
+        return _EVERYTHING
+    return (_down(math.tan(lo), 2), _up(math.tan(hi), 2))
+
+
+def _check_unit_interval(a, name):
+    if a[0] < -1 or a[1] > 1:
+        raise ValueError("%s() of an interval with numbers outside [-1, 1]"
+                         % name)
+
+
+def _asin(a):
+    _check_unit_interval(a, 'asin')
+    return (_down(math.asin(a[0]), 2), _up(math.asin(a[1]), 2))
+
+
+def _acos(a):
+    _check_unit_interval(a, 'acos')
+    return (max(_down(math.acos(a[1]), 2), 0.0),
+            _up(math.acos(a[0]), 2))
+
+
+def _atan(a):
+    return (_down(math.atan(a[0]), 2), _up(math.atan(a[1]), 2))
+
+
+_FUNCTIONS = {
+    Sine: _sin,
+    Cosine: _cos,
+    Tangent: _tan,
+    ArcSine: _asin,
+    ArcCosine: _acos,
+    ArcTangent: _atan,
+    NaturalLog: _ln,
+}
+
+
+def _evaluate_node(obj, intervals, values):
+    # values are the intervals of the content of obj
+    klass = type(obj)
+    if klass is Integer:
+        return _number(obj.python_int)
+    if klass is Add:
+        return functools.reduce(_add, values, (0.0, 0.0))
+    if klass is Mul:
+        return functools.reduce(_mul, values, (1.0, 1.0))
+    if klass is Pow:
+        return _pow(values[0], values[1], obj.base is e)
+    if klass is Derivative:
+        # content is (obj.materialize(),), see evaluate_interval()
+        return values[0]
+    if klass is Symbol:
+        try:
+            return intervals[obj.name]
+        except KeyError:
+            raise ValueError("no interval for %s was given" % obj.name)
+    if isinstance(obj, NamedConstant):
+        # the float value is rounded from the actual value
+        return _outward(float(obj), float(obj), 1)
+    if klass in _FUNCTIONS:
+        return _FUNCTIONS[klass](values[0])
+    if klass is SymbolFunction or values:
+        raise TypeError("cannot evaluate %r with intervals" % obj)
+    return _outward(float(obj), float(obj))
+
+
+def _interval(value, name):
+    if isinstance(value, (tuple, list)):
+        lo, hi = value
+        lo = _number(lo)[0]
+        hi = _number(hi)[1]
+    else:
+        lo, hi = _number(value)
+    if not lo <= hi:
+        raise ValueError("invalid interval for %s: %r" % (name, value))
+    return (lo, hi)
+
+
+def evaluate_interval(expr, intervals):
+    """Return ``(lo, hi)`` floats so that *expr* is between them.
+
+    The *intervals* dict maps :class:`Symbols <Symbol>` or their names to
+    ``(lo, hi)`` tuples or numbers, and the result is guaranteed to contain
+    the value of *expr* for all values of the symbols in the intervals.
+
+    >>> evaluate_interval(x**2 - x, {x: (-1, 2)})
+    (-2.000000000000001, 5.000000000000003)
+    >>> evaluate_interval(sin(x), {'x': (1, 2)})
+    (0.8414709848078963, 1.0)
+
+    The bounds are often wider than the actual range of *expr*, as in the
+    first example, where the actual range is from ``-1/4`` to ``2``. The
+    floats are rounded so that rounding errors can only make the result
+    wider, not narrower. An infinite bound means that the expression can get
+    arbitrarily big or small, e.g. ``1/x`` near ``x = 0``.
+
+    For example, if ``evaluate_interval(expr.derivative(x), ...)`` gives an
+    interval with no negative numbers, *expr* can't decrease when *x* grows.
+
+    :exc:`ValueError` is raised if the interval of something goes outside
+    the domain of a function, like with ``ln(x)`` and ``x`` between ``-1``
+    and ``1``.
+    """
+    intervals_by_name = {}
+    for symbol, value in intervals.items():
+        name = symbol.name if isinstance(symbol, Symbol) else symbol
+        intervals_by_name[name] = _interval(value, name)
+
+    root = mathify(expr)
+    results = {}    # {id(obj): (lo, hi)}, objects stay alive in root
+
+    # postorder without recursion, and each shared part is evaluated once
+    stack = [root]
+    while stack:
+        obj = stack[-1]
+        if id(obj) in results:
+            stack.pop()
+            continue
+
+        if type(obj) is Derivative:
+            content = (obj.materialize(),)
+        else:
+            content = _content(obj)
+        missing = [child for child in content if id(child) not in results]
+        if missing:
+            stack.extend(missing)
+            continue
+
+        stack.pop()
+        results[id(obj)] = _evaluate_node(
+            obj, intervals_by_name,
+            [results[id(child)] for child in content])
+
+    return results[id(root)]
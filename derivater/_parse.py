@@ -0,0 +1,247 @@
+import re
+
+from derivater import _constants, _explog, _trig
+from derivater._base import (
+    Symbol, SymbolFunction, Integer, Add, Mul, Pow, mathify)
+
+
+_TOKEN = re.compile(r'''
+    (?P<number> \d+(?:\.\d*)? | \.\d+ )
+  | (?P<name> [A-Za-z_][A-Za-z0-9_]* )
+  | (?P<op> \*\* | [-+*/(),'] )
+''', re.VERBOSE)
+
+_SPACE = re.compile(r'\s*')
+
+
+def _half():
+    return Mul([1, Pow(2, -1)])
+
+
+def _log(numerus, base):
+    return Mul([_explog.NaturalLog(numerus),
+                Pow(_explog.NaturalLog(base), -1)])
+
+
+# the objects created by these are not gently simplified, parse() simplifies
+# everything at once in the end
+_FUNCTIONS = {
+    'sin': _trig.Sine,
+    'cos': _trig.Cosine,
+    'tan': _trig.Tangent,
+    'asin': _trig.ArcSine,
+    'acos': _trig.ArcCosine,
+    'atan': _trig.ArcTangent,
+    'sec': lambda arg: Pow(_trig.Cosine(arg), -1),
+    'csc': lambda arg: Pow(_trig.Sine(arg), -1),
+    'cot': lambda arg: Mul([_trig.Cosine(arg), Pow(_trig.Sine(arg), -1)]),
+    'asec': lambda arg: _trig.ArcSine(Pow(arg, -1)),
+    'acsc': lambda arg: _trig.ArcCosine(Pow(arg, -1)),
+    'acot': lambda arg: _trig.ArcTangent(Pow(arg, -1)),
+    'ln': _explog.NaturalLog,
+    'exp': lambda arg: Pow(_constants.e, arg),
+    'sqrt': lambda arg: Pow(arg, _half()),
+    'log': lambda arg, base=_constants.e: _log(arg, base),
+    'log2': lambda arg: _log(arg, 2),
+    'log10': lambda arg: _log(arg, 10),
+}
+
+_CONSTANTS = {'e': _constants.e, 'tau': _constants.tau, 'pi': _constants.pi}
+
+# unary minus and plus are between * and ** like in Python, so -x**2 means
+# -(x**2), and 2**-x works
+_BINARY_PRECEDENCES = {'+': 1, '-': 1, '*': 2, '/': 2, '**': 4}
+_UNARY_PRECEDENCE = 3
+
+
+class _Parser:
+
+    def __init__(self, text, symbols):
+        self.text = text
+        self.symbols = {name: mathify(value)
+                        for name, value in symbols.items()}
+        self.tokens = []    # [(kind, value, position), ...]
+        self.index = 0
+
+        position = 0
+        while True:
+            position = _SPACE.match(text, position).end()
+            if position == len(text):
+                break
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise ValueError("unexpected %r at position %d of %r"
+                                 % (text[position], position, text))
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind), match.start(kind)))
+            position = match.end()
+        self.tokens.append(('end', None, len(text)))
+
+    def error(self, message=None, position=None):
+        kind, value, token_position = self.tokens[self.index]
+        if position is None:
+            position = token_position
+        if message is None:
+            if kind == 'end':
+                message = "unexpected end"
+            else:
+                message = "unexpected %r" % value
+        return ValueError("%s at position %d of %r"
+                          % (message, position, self.text))
+
+    def next_is(self, value):
+        kind, token_value, position = self.tokens[self.index]
+        return kind == 'op' and token_value == value
+
+    def expect(self, value):
+        if not self.next_is(value):
+            raise self.error("expected %r" % value)
+        self.index += 1
+
+    # precedence climbing, but sums and products are collected into one Add
+    # or Mul instead of nesting them
+    def parse_expression(self, min_precedence=1):
+        kind, value, position = self.tokens[self.index]
+        if kind == 'op' and value in {'-', '+'}:
+            self.index += 1
+            operand = self.parse_expression(_UNARY_PRECEDENCE)
+            left = operand if value == '+' else Mul([-1, operand])
+        else:
+            left = self.parse_atom()
+
+        # (Add or Mul, list of objects), more stuff goes to the list
+        collecting = None
+        while True:
+            kind, value, position = self.tokens[self.index]
+            if kind != 'op' or value not in _BINARY_PRECEDENCES:
+                break
+            precedence = _BINARY_PRECEDENCES[value]
+            if precedence < min_precedence:
+                break
+            self.index += 1
+
+            if value == '**':
+                # right associative, and the exponent may start with a unary
+                # minus. Nothing is being collected here, because the right
+                # side of + or * took the ** already.
+                left = Pow(left, self.parse_expression(_UNARY_PRECEDENCE))
+                continue
+
+            right = self.parse_expression(precedence + 1)
+            if value == '-':
+                right = Mul([-1, right])
+            elif value == '/':
+                right = Pow(right, -1)
+
+            klass = Add if precedence == 1 else Mul
+            if collecting is not None and collecting[0] is klass:
+                collecting[1].append(right)
+            else:
+                if collecting is not None:
+                    left = collecting[0](collecting[1])
+                collecting = (klass, [left, right])
+
+        if collecting is not None:
+            return collecting[0](collecting[1])
+        return left
+
+    def parse_atom(self):
+        kind, value, position = self.tokens[self.index]
+        self.index += 1
+
+        if kind == 'number':
+            if '.' not in value:
+                return Integer(int(value))
+            whole, decimals = value.split('.')
+            return Mul([Integer(int(whole + decimals or '0')),
+                        Pow(10**len(decimals), -1)])
+
+        if kind == 'name':
+            primes = 0
+            while self.next_is("'"):
+                primes += 1
+                self.index += 1
+            if primes != 0 or self.next_is('('):
+                return self.parse_call(value, primes, position)
+            if value in self.symbols:
+                return self.symbols[value]
+            if value in _CONSTANTS:
+                return _CONSTANTS[value]
+            self.symbols[value] = Symbol(value)
+            return self.symbols[value]
+
+        if kind == 'op' and value == '(':
+            result = self.parse_expression()
+            self.expect(')')
+            return result
+
+        self.index -= 1
+        raise self.error()
+
+    def parse_call(self, name, primes, position):
+        self.expect('(')
+        args = [self.parse_expression()]
+        while self.next_is(','):
+            self.index += 1
+            args.append(self.parse_expression())
+        self.expect(')')
+
+        if len(args) != 1 and not (name == 'log' and len(args) == 2):
+            raise self.error("wrong number of arguments to %s()" % name,
+                             position)
+        if name in _FUNCTIONS and primes == 0:
+            return _FUNCTIONS[name](*args)
+        return SymbolFunction(name, args[0], derivative_count=primes)
+
+
+def parse(text, symbols=None):
+    """Convert a string to a math object.
+
+    >>> parse('a*x**2 + b*x + c')
+    c + b*x + a*x**2
+    >>> parse('(x**x).derivative(x)')
+    Traceback (most recent call last):
+      ...
+    ValueError: unexpected '.' at position 6 of '(x**x).derivative(x)'
+
+    The syntax is the same as in Python and :func:`repr`, so
+    ``parse(repr(obj)) == obj`` for the math objects that derivater creates.
+    Unlike :func:`eval`, this never runs any code.
+
+    * Integers and decimal numbers like ``1.25`` are supported. Decimal numbers
+      become fractions; ``parse('1.25')`` is ``5 / 4``.
+    * ``sin``, ``cos``, ``tan``, ``asin``, ``acos``, ``atan``, ``sec``,
+      ``csc``, ``cot``, ``asec``, ``acsc``, ``acot``, ``ln``, ``exp``,
+      ``sqrt``, ``log``, ``log2`` and ``log10`` can be called. ``log`` takes
+      an optional base as a second argument.
+    * ``e``, ``tau`` and ``pi`` are :data:`e`, :data:`tau` and :data:`pi`.
+    * Any other name becomes a :class:`Symbol`, or a :class:`SymbolFunction`
+      if it's called. Primes are derivatives, so ``f''(x)`` is
+      ``SymbolFunction('f', x, derivative_count=2)``.
+
+    >>> parse("f'(g(x))*g'(x) + ln(x)/2")
+    f'(g(x))*g'(x) + ln(x) / 2
+
+    *symbols* can be a dict of names and math objects to use instead of
+    :class:`Symbols <Symbol>`. It can also contain the names of constants.
+    The values go through :func:`mathify`, so they can be integers too.
+
+    >>> parse('k*x + 1', symbols={'k': mathify(3)})
+    3*x + 1
+
+    Invalid input raises :class:`ValueError`, and so does input that is
+    nested too deeply for Python's recursion limit.
+    """
+    parser = _Parser(text, symbols or {})
+    try:
+        result = parser.parse_expression()
+    except RecursionError:
+        raise parser.error("too deeply nested") from None
+    if parser.tokens[parser.index][0] != 'end':
+        raise parser.error()
+
+    try:
+        return result.gentle_simplify()
+    except RecursionError:
+        # gentle_simplify() recurses too
+        raise ValueError("too deeply nested: %r" % text) from None
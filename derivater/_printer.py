@@ -0,0 +1,544 @@
+"""The reprs of Add, Mul and Pow.
+
+The simple way to print these is what the __repr__ methods used to do: print
+-obj instead of obj after a minus sign, and 1/obj instead of obj**(-1) after a
+slash. But -obj and 1/obj create new objects and call gentle_simplify(), and
+the same subtrees get repred over and over again by _looks_like_negative() and
+the *_parenthesize() methods. This file prints the same thing without all that:
+
+* Subtrees are printed in postorder with a stack instead of recursion, and the
+  strings are stored in a memo dict while the outermost repr() runs. Other
+  MathObjects, like sin(x), are still printed by calling their methods, and
+  when those call repr() for Adds, Muls and Pows, the memo is used again.
+* Instead of creating -obj or 1/obj, we figure out what gentle_simplify()
+  would return. This only works for objects that gentle_simplify() has already
+  processed, which is what the operators return, so other objects are
+  detected and printed the slow way. For example, 1/(x + 1/2)**(-1) would be
+  gentle_simplified to (2*x + 1)/2, because Mul.gentle_simplify() pulls the
+  coefficient out of the Add, and denominators are sorted again after
+  inverting them, so the output is the same as with the simple way.
+
+Objects that don't exist are called "values" here. A value is a MathObject, a
+Python int for an Integer, a list of values for a Mul, a (base, exponent)
+tuple for a Pow, or an _AddValue for an Add.
+"""
+
+import fractions
+import functools
+import threading
+
+from derivater import _base
+
+
+class _State(threading.local):
+
+    def __init__(self):
+        # {id(obj): _Entry}, or None if this thread isn't printing anything
+        self.memo = None
+
+
+# each thread has its own memo, so that they can print at the same time
+_state = _State()
+
+
+class _Unsupported(Exception):
+    # raised when we can't figure out what -obj or 1/obj would be
+    pass
+
+
+class _Entry:
+    __slots__ = ['obj', 'repr', 'add', 'mul', 'pow']
+
+    def __init__(self, obj, repr_string):
+        self.obj = obj      # keeps id(obj) reserved
+        self.repr = repr_string
+        self.add = self.mul = self.pow = None
+
+
+class _AddValue:
+    # an Add that doesn't exist, terms is a sorted list of values
+    __slots__ = ['terms']
+
+    def __init__(self, terms):
+        self.terms = terms
+
+
+def _parens(string):
+    return '(' + string + ')'
+
+
+def _entry(obj):
+    memo = _state.memo
+    try:
+        return memo[id(obj)]
+    except KeyError:
+        pass
+
+    if type(obj) in _BUILTIN:
+        _print_tree(obj)
+        return memo[id(obj)]
+
+    entry = _Entry(obj, repr(obj))
+    if type(obj) is _base.Integer:
+        if obj.python_int < 0:
+            entry.add = entry.mul = entry.pow = _parens(entry.repr)
+        else:
+            entry.add = entry.mul = entry.pow = entry.repr
+    # else: the methods are called when needed, they may be overrided
+    memo[id(obj)] = entry
+    return entry
+
+
+# these return the same things as the MathObject methods
+def _repr(value):
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        return _mul_repr(value)
+    if isinstance(value, tuple):
+        return _pow_repr(*value)
+    if isinstance(value, _AddValue):
+        return _add_repr(value.terms)
+    return _entry(value).repr
+
+
+def _add_parenthesize(value):
+    if isinstance(value, int):
+        return _parens(str(value)) if value < 0 else str(value)
+    if not isinstance(value, _base.MathObject):
+        return _repr(value)
+    entry = _entry(value)
+    if entry.add is None:
+        entry.add = value.add_parenthesize()
+    return entry.add
+
+
+def _mul_parenthesize(value):
+    if isinstance(value, _AddValue):
+        return _parens(_repr(value))
+    if not isinstance(value, _base.MathObject):
+        return _add_parenthesize(value)
+    entry = _entry(value)
+    if entry.mul is None:
+        entry.mul = value.mul_parenthesize()
+    return entry.mul
+
+
+def _pow_parenthesize(value):
+    if isinstance(value, (list, tuple, _AddValue)):
+        return _parens(_repr(value))
+    if isinstance(value, int):
+        return _add_parenthesize(value)
+    entry = _entry(value)
+    if entry.pow is None:
+        entry.pow = value.pow_parenthesize()
+    return entry.pow
+
+
+def _is_mul(value):
+    return isinstance(value, (list, _base.Mul))
+
+
+def _is_add(value):
+    return isinstance(value, (_AddValue, _base.Add))
+
+
+def _factors(value):
+    return value if isinstance(value, list) else list(value.objects)
+
+
+def _terms(value):
+    return value.terms if isinstance(value, _AddValue) else value.objects
+
+
+def _pow_parts(value):
+    return value if isinstance(value, tuple) else (value.base, value.exponent)
+
+
+def _is_integer(value, python_int=None):
+    if isinstance(value, int):
+        return python_int is None or value == python_int
+    return (type(value) is _base.Integer and
+            (python_int is None or value.python_int == python_int))
+
+
+def _int(value):
+    return value if isinstance(value, int) else value.python_int
+
+
+def _sort_key(value):
+    # the _base._sort_key() that the value would have
+    if isinstance(value, int):
+        return (0, value, (), ())
+    if isinstance(value, list):
+        return _base._mul_sort_key(tuple(map(_sort_key, value)))
+    if isinstance(value, tuple):
+        return _base._pow_sort_key(*map(_sort_key, value))
+    if isinstance(value, _AddValue):
+        return (8, tuple(map(_sort_key, value.terms)), (), ())
+    return _base._sort_key(value)
+
+
+def _add_sort_key(value):
+    key = _sort_key(value)
+    return (key[0] in _base._NUMBER_RANKS, key)
+
+
+def _looks_like_negative(value):
+    if isinstance(value, int):
+        return value < 0
+    if isinstance(value, list):
+        return bool(value) and _is_integer(value[0]) and _int(value[0]) < 0
+    if isinstance(value, (tuple, _AddValue)):
+        return False
+    return _base._looks_like_negative(value)
+
+
+def _unwrap(factors):
+    if not factors:
+        return 1
+    if len(factors) == 1:
+        return factors[0]
+    return factors
+
+
+def _has_default_coeff(value):
+    return (isinstance(value, _base.MathObject) and
+            type(value).with_fraction_coeff is
+            _base.MathObject.with_fraction_coeff)
+
+
+# The rest of this is what gentle_simplify() would do to -obj and 1/obj.
+# It works with things that gentle_simplify() has already processed, so
+# e.g. the objects of a Mul are known to have different bases.
+
+def _split(value):
+    # like value.with_fraction_coeff(), but returns an int or a Fraction and
+    # a list of the factors that are left
+    if _is_integer(value):
+        return (_int(value), [])
+    if isinstance(value, list) or type(value) is _base.Mul:
+        coeff = 1
+        rest = []
+        for factor in _factors(value):
+            factor_coeff, factor_rest = _split(factor)
+            coeff *= factor_coeff
+            rest.extend(factor_rest)
+        return (coeff, rest)
+    if isinstance(value, tuple) or type(value) is _base.Pow:
+        base, exponent = _pow_parts(value)
+        if _is_integer(base) and _is_integer(exponent):
+            if _int(exponent) >= 0:
+                return (_int(base) ** _int(exponent), [])
+            if _int(base) == 0:
+                raise _Unsupported
+            return (fractions.Fraction(_int(base)) ** _int(exponent), [])
+        if _is_integer(base) or _is_add(base) or _has_default_coeff(base):
+            return (1, [value])
+        raise _Unsupported
+    if _is_add(value):
+        # gentle_simplify() has already pulled out the coefficients of Adds
+        # in Muls, and doing it again would recurse into deep objects
+        return (1, [value])
+    if _has_default_coeff(value):
+        return (1, [value])
+    raise _Unsupported
+
+
+def _split_add(value):
+    # Add.with_fraction_coeff(), e.g. 2*x + 1 from x + 1/2
+    splits = [_split(term) for term in _terms(value)]
+    if not splits:
+        raise _Unsupported
+    coeffs = [coeff for coeff, rest in splits]
+    bottom = sum(coeffs).denominator
+    top = functools.reduce(_base.gcd, [int(coeff*bottom) for coeff in coeffs])
+    if top == 0:
+        # e.g. x/2 - y/2, Add.with_fraction_coeff() returns (0, 0) for these
+        return (0, [])
+    coeff = fractions.Fraction(top, bottom)
+    if coeff == 1:
+        return (coeff, [value])
+
+    terms = [_simplified_mul(fractions.Fraction(term_coeff) / coeff, rest)
+             for term_coeff, rest in splits]
+    if any(map(_is_add, terms)):
+        terms = _flatten_terms(terms)
+    return (coeff, [_AddValue(sorted(terms, key=_add_sort_key))])
+
+
+def _flatten_terms(terms):
+    # e.g. (2*x + 1)/2 divided by 1/2 gives an Add, and Add.gentle_simplify()
+    # puts its terms into the outer Add and adds the numbers together
+    number = 0
+    result = []
+    rest_keys = set()
+    for term in terms:
+        for inner in (_terms(term) if _is_add(term) else [term]):
+            inner_coeff, rest = _split(inner)
+            if not rest:
+                number += inner_coeff
+                continue
+            rest_key = tuple(map(_sort_key, rest))
+            if rest_key in rest_keys:
+                # gentle_simplify() would combine these
+                raise _Unsupported
+            rest_keys.add(rest_key)
+            result.append(inner)
+
+    if number != 0:
+        result.append(_simplified_mul(fractions.Fraction(number), []))
+    if len(result) < 2:
+        raise _Unsupported
+    return result
+
+
+def _simplified_mul(coeff, factors):
+    # a coefficient times factors that are already simplified
+    bases = set()
+    for factor in factors:
+        if isinstance(factor, tuple) or type(factor) is _base.Pow:
+            base = _pow_parts(factor)[0]
+        else:
+            base = factor
+        if isinstance(base, int):
+            base = _base.Integer(base)
+        elif not isinstance(base, _base.MathObject):
+            base = id(base)
+        if base in bases:
+            # gentle_simplify() would combine these
+            raise _Unsupported
+        bases.add(base)
+
+    if coeff == 0:
+        return 0
+    parts = list(factors)
+    if coeff.denominator != 1:
+        parts.append((coeff.denominator, -1))
+    if coeff.numerator != 1:
+        parts.append(coeff.numerator)
+    parts.sort(key=_sort_key)
+    return _unwrap(parts)
+
+
+def _negate(value):
+    # -value
+    return _simplified_mul(*_split([-1, value]))
+
+
+def _invert(value):
+    # 1/value, where value is a Pow whose exponent looks like negative
+    if not (isinstance(value, tuple) or type(value) is _base.Pow):
+        raise _Unsupported
+    base, exponent = _pow_parts(value)
+    if isinstance(base, (list, tuple, _base.Pow, _base.Mul)):
+        raise _Unsupported
+    if isinstance(base, _base.Integer) and (
+            type(base) is not _base.Integer or base.python_int in {0, 1}):
+        raise _Unsupported
+
+    exponent = _negate(exponent)
+    if _is_integer(exponent, 0):
+        raise _Unsupported
+    if _is_integer(exponent, 1):
+        power = base
+    elif _is_integer(base) and _is_integer(exponent) and (
+            _int(exponent) >= 0 or _int(base) == -1):
+        power = _int(base) ** _int(exponent)
+    else:
+        power = (base, exponent)
+    # 1*power, which pulls out the coefficient of an Add base
+    if _is_add(power):
+        return _simplified_mul(*_split_add(power))
+    return _simplified_mul(*_split(power))
+
+
+def _is_denominator(value):
+    if isinstance(value, tuple):
+        return _looks_like_negative(value[1])
+    return (isinstance(value, _base.Pow) and
+            _looks_like_negative(value.exponent))
+
+
+def _mul_repr(factors):
+    if _looks_like_negative(factors):
+        return '-' + _mul_parenthesize(_negate(factors))
+
+    # a/b is represented as a*b**(-1)
+    top = []
+    bottom = []
+    for factor in factors:
+        if _is_denominator(factor):
+            bottom.append(_invert(factor))
+        else:
+            top.append(factor)
+
+    if not bottom:
+        return '*'.join(map(_mul_parenthesize, top)) or '1'
+
+    top_string = _mul_repr(top)
+    if len(bottom) == 1:
+        bottom_string = (_pow_parenthesize(bottom[0])
+                         if _is_mul(bottom[0])
+                         else _mul_parenthesize(bottom[0]))
+    else:
+        # Mul(bottom) would sort the inverted things again
+        bottom_string = _parens(_mul_repr(sorted(bottom, key=_sort_key)))
+    return top_string + ' / ' + bottom_string
+
+
+def _pow_repr(base, exponent):
+    if exponent == -1 or (isinstance(exponent, _base.Integer) and
+                          exponent.python_int == -1):
+        bottom_string = (_pow_parenthesize(base) if _is_mul(base)
+                         else _mul_parenthesize(base))
+        return '1 / ' + bottom_string
+    return _pow_parenthesize(base) + '**' + _pow_parenthesize(exponent)
+
+
+def _add_repr(objects):
+    if not objects:
+        return '0'
+
+    result = [_add_parenthesize(objects[0])]
+    for obj in objects[1:]:
+        if _looks_like_negative(obj):
+            result.append(' - ')
+            negated = _negate(obj)
+            # x - (y + z) must not be shown as x - y + z
+            if _is_add(negated):
+                result.append(_mul_parenthesize(negated))
+            else:
+                result.append(_add_parenthesize(negated))
+        else:
+            result.append(' + ')
+            result.append(_add_parenthesize(obj))
+    return ''.join(result)
+
+
+# the old __repr__ methods, these work with anything
+def _building_repr(obj):
+    if isinstance(obj, _base.Add):
+        if not obj.objects:
+            return '0'
+        result = [obj.objects[0].add_parenthesize()]
+        for sub in obj.objects[1:]:
+            if _base._looks_like_negative(sub):
+                result.append(' - ')
+                negated = -sub
+                if isinstance(negated, _base.Add):
+                    result.append(negated.mul_parenthesize())
+                else:
+                    result.append(negated.add_parenthesize())
+            else:
+                result.append(' + ')
+                result.append(sub.add_parenthesize())
+        return ''.join(result)
+
+    if isinstance(obj, _base.Mul):
+        if _base._looks_like_negative(obj):
+            return '-' + (-obj).mul_parenthesize()
+
+        top = []
+        bottom = []
+        for sub in obj.objects:
+            if (isinstance(sub, _base.Pow) and
+                    _base._looks_like_negative(sub.exponent)):
+                # 1/sub is the same thing with inverted exponent
+                bottom.append(1/sub)
+            else:
+                top.append(sub)
+
+        if not bottom:
+            return '*'.join(sub.mul_parenthesize() for sub in top) or '1'
+
+        # the top uses mul_parenthesize() instead of repr() because otherwise
+        # repr((x + y)/z) == 'x + y / z'
+        top_string = repr(_base.Mul(top))
+
+        # Mul([Pow(x/y, -2)]) must be represented as 1 / (x**2 / y**2)
+        # changing a tiny detail in this breaks some detail in that...
+        if len(bottom) == 1:
+            bottom_string = (bottom[0].pow_parenthesize()
+                             if isinstance(bottom[0], _base.Mul)
+                             else bottom[0].mul_parenthesize())
+        else:
+            bottom_string = _base.Mul(bottom).pow_parenthesize()
+        return top_string + ' / ' + bottom_string
+
+    assert isinstance(obj, _base.Pow)
+    if obj.exponent == _base.mathify(-1):
+        bottom_string = (obj.base.pow_parenthesize()
+                         if isinstance(obj.base, _base.Mul)
+                         else obj.base.mul_parenthesize())
+        return '1 / ' + bottom_string
+    return (obj.base.pow_parenthesize() + '**' +
+            obj.exponent.pow_parenthesize())
+
+
+def _fast_repr(obj):
+    klass = type(obj)
+    try:
+        if klass is _base.Add:
+            return _add_repr(obj.objects)
+        if klass is _base.Mul:
+            return _mul_repr(list(obj.objects))
+        if klass is _base.Pow:
+            return _pow_repr(obj.base, obj.exponent)
+    except _Unsupported:
+        pass
+    return _building_repr(obj)
+
+
+def _children(obj):
+    if type(obj) is _base.Pow:
+        return [obj.base, obj.exponent]
+    return obj.objects
+
+
+def _print_tree(root):
+    # postorder without recursion, only Adds, Muls and Pows are put to the
+    # stack because other objects print their content with repr()
+    memo = _state.memo
+    stack = [root]
+    while stack:
+        obj = stack[-1]
+        if id(obj) in memo:
+            stack.pop()
+            continue
+
+        missing = [child for child in _children(obj)
+                   if type(child) in _BUILTIN and id(child) not in memo]
+        if missing:
+            stack.extend(missing)
+            continue
+
+        stack.pop()
+        entry = _Entry(obj, _fast_repr(obj))
+        if type(obj) is _base.Add:
+            entry.add = entry.repr
+            entry.mul = entry.pow = _parens(entry.repr)
+        else:
+            entry.add = entry.mul = entry.repr
+            entry.pow = _parens(entry.repr)
+        memo[id(obj)] = entry
+
+    return memo[id(root)].repr
+
+
+_BUILTIN = {_base.Add, _base.Mul, _base.Pow}
+
+
+def print_object(obj):
+    """Return repr(obj) for an Add, a Mul or a Pow."""
+    if type(obj) not in _BUILTIN:
+        # a subclass, must call its methods
+        return _building_repr(obj)
+    if _state.memo is not None:
+        return _print_tree(obj)
+
+    _state.memo = {}
+    try:
+        return _print_tree(obj)
+    finally:
+        _state.memo = None
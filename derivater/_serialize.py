@@ -0,0 +1,331 @@
+from derivater import _constants, _explog, _trig
+from derivater._base import Symbol, SymbolFunction, Integer, Add, Mul, Pow
+from derivater._derivative import Derivative
+from derivater._functions import _registry
+
+
+# the format is:
+#
+#   _MAGIC
+#   varint number of nodes
+#   the nodes in postorder, each node is an opcode byte and then stuff that
+#       depends on the opcode, with children as varint indexes of earlier
+#       nodes
+#   varint number of roots
+#   varint indexes of the roots
+#
+# varints are unsigned LEB128, and integers are zigzag encoded before that
+_MAGIC = b'derivater\x01'
+
+# don't change existing numbers, that would break old data
+ADD = 1
+MUL = 2
+POW = 3
+INTEGER = 4
+SYMBOL = 5
+KNOWN_CONSTANT = 6      # index of _KNOWN_CONSTANTS
+NEW_CONSTANT = 7        # name and float, for NamedConstants made by users
+SYMBOL_FUNCTION = 8
+NATURAL_LOG = 9
+SINE = 10
+COSINE = 11
+TANGENT = 12
+ARC_SINE = 13
+ARC_COSINE = 14
+ARC_TANGENT = 15
+REGISTERED_FUNCTION = 16    # other register_function() classes, by name
+DERIVATIVE = 17
+
+# NamedConstants compare by identity, so these must be the same objects after
+# loading, don't reorder
+_KNOWN_CONSTANTS = [_constants.e, _constants.tau]
+
+# classes that contain just one object in an attribute
+_ONE_CHILD = {
+    _explog.NaturalLog: (NATURAL_LOG, 'numerus'),
+    _trig.Sine: (SINE, 'arg'),
+    _trig.Cosine: (COSINE, 'arg'),
+    _trig.Tangent: (TANGENT, 'arg'),
+    _trig.ArcSine: (ARC_SINE, 'arg'),
+    _trig.ArcCosine: (ARC_COSINE, 'arg'),
+    _trig.ArcTangent: (ARC_TANGENT, 'arg'),
+}
+_ONE_CHILD_OPCODES = {opcode: klass
+                      for klass, (opcode, attribute) in _ONE_CHILD.items()}
+
+
+def _function_name(klass):
+    return '%s.%s' % (klass.__module__, klass.__qualname__)
+
+
+def _write_varint(output, value):
+    while value >= 0x80:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _write_string(output, string):
+    encoded = string.encode('utf-8')
+    _write_varint(output, len(encoded))
+    output += encoded
+
+
+def _zigzag(value):
+    return 2*value if value >= 0 else -2*value - 1
+
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _children(obj):
+    klass = type(obj)
+    if klass is Add or klass is Mul:
+        return obj.objects
+    if klass is Pow:
+        return [obj.base, obj.exponent]
+    if klass is SymbolFunction:
+        return [obj.arg]
+    if klass in _ONE_CHILD:
+        opcode, attribute = _ONE_CHILD[klass]
+        return [getattr(obj, attribute)]
+    if klass is Derivative:
+        return [obj.expr, obj.wrt, obj.at]
+    if klass in _registry:
+        return [getattr(obj, _registry[klass].argument)]
+    return []
+
+
+def _node_key(obj, child_indexes):
+    # returns (opcode, payload, child indexes), a hashable tuple
+    klass = type(obj)
+    if klass is Add:
+        return (ADD, None, child_indexes)
+    if klass is Mul:
+        return (MUL, None, child_indexes)
+    if klass is Pow:
+        return (POW, None, child_indexes)
+    if klass is Integer:
+        return (INTEGER, obj.python_int, ())
+    if klass is Symbol:
+        return (SYMBOL, obj.name, ())
+    if klass is SymbolFunction:
+        return (SYMBOL_FUNCTION, (obj.name, obj.derivative_count),
+                child_indexes)
+    if klass in _ONE_CHILD:
+        return (_ONE_CHILD[klass][0], None, child_indexes)
+    if klass is Derivative:
+        return (DERIVATIVE, obj.n, child_indexes)
+    if klass in _registry:
+        return (REGISTERED_FUNCTION, _function_name(klass), child_indexes)
+    if klass is _constants.NamedConstant:
+        for index, constant in enumerate(_KNOWN_CONSTANTS):
+            if obj is constant:
+                return (KNOWN_CONSTANT, index, ())
+        # compared by identity, like NamedConstants are
+        return (NEW_CONSTANT, obj, ())
+    raise TypeError("cannot serialize %r, it's a %s object"
+                    % (obj, klass.__name__))
+
+
+def _write_node(output, key):
+    opcode, payload, child_indexes = key
+    output.append(opcode)
+    if opcode == INTEGER:
+        _write_varint(output, _zigzag(payload))
+    elif opcode == SYMBOL:
+        _write_string(output, payload)
+    elif opcode == KNOWN_CONSTANT:
+        _write_varint(output, payload)
+    elif opcode == NEW_CONSTANT:
+        _write_string(output, str(payload))
+        _write_string(output, float(payload).hex())
+    elif opcode == SYMBOL_FUNCTION:
+        name, derivative_count = payload
+        _write_string(output, name)
+        _write_varint(output, derivative_count)
+    elif opcode == REGISTERED_FUNCTION:
+        _write_string(output, payload)
+    elif opcode == DERIVATIVE:
+        _write_varint(output, payload)
+
+    if opcode == ADD or opcode == MUL:
+        _write_varint(output, len(child_indexes))
+    for index in child_indexes:
+        _write_varint(output, index)
+
+
+def _dump_many(objects):
+    """Like dumps(), but for a list of objects.
+
+    Subtrees that are shared between the objects are written only once.
+    """
+    indexes = {}        # {id(obj): index}, objects stay alive in objects
+    node_indexes = {}   # {node key: index}, for equal but not same objects
+    node_count = 0
+    output = bytearray(_MAGIC)
+    nodes = bytearray()
+
+    # postorder without recursion
+    for root in objects:
+        stack = [root]
+        while stack:
+            obj = stack[-1]
+            if id(obj) in indexes:
+                stack.pop()
+                continue
+
+            children = _children(obj)
+            missing = [child for child in children
+                       if id(child) not in indexes]
+            if missing:
+                stack.extend(reversed(missing))
+                continue
+
+            stack.pop()
+            key = _node_key(obj, tuple(indexes[id(child)]
+                                       for child in children))
+            if key not in node_indexes:
+                node_indexes[key] = node_count
+                node_count += 1
+                _write_node(nodes, key)
+            indexes[id(obj)] = node_indexes[key]
+
+    _write_varint(output, node_count)
+    output += nodes
+    _write_varint(output, len(objects))
+    for root in objects:
+        _write_varint(output, indexes[id(root)])
+    return bytes(output)
+
+
+class _Reader:
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def byte(self):
+        if self.position >= len(self.data):
+            raise ValueError("unexpected end of data")
+        self.position += 1
+        return self.data[self.position - 1]
+
+    def varint(self):
+        result = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string(self):
+        length = self.varint()
+        start = self.position
+        self.position += length
+        if self.position > len(self.data):
+            raise ValueError("unexpected end of data")
+        return bytes(self.data[start:self.position]).decode('utf-8')
+
+
+def _load_many(data):
+    """The opposite of _dump_many(), returns a list."""
+    if bytes(data[:len(_MAGIC)]) != _MAGIC:
+        raise ValueError("the data was not created with derivater.dumps()")
+
+    reader = _Reader(data)
+    reader.position = len(_MAGIC)
+    nodes = []
+    functions = {_function_name(klass): klass for klass in _registry}
+
+    def child():
+        index = reader.varint()
+        if index >= len(nodes):
+            raise ValueError("invalid child index %d" % index)
+        return nodes[index]
+
+    for i in range(reader.varint()):
+        opcode = reader.byte()
+        if opcode == ADD:
+            nodes.append(Add([child() for i in range(reader.varint())]))
+        elif opcode == MUL:
+            nodes.append(Mul([child() for i in range(reader.varint())]))
+        elif opcode == POW:
+            base = child()
+            nodes.append(Pow(base, child()))
+        elif opcode == INTEGER:
+            nodes.append(Integer(_unzigzag(reader.varint())))
+        elif opcode == SYMBOL:
+            nodes.append(Symbol(reader.string()))
+        elif opcode == KNOWN_CONSTANT:
+            index = reader.varint()
+            if index >= len(_KNOWN_CONSTANTS):
+                raise ValueError("unknown constant %d" % index)
+            nodes.append(_KNOWN_CONSTANTS[index])
+        elif opcode == NEW_CONSTANT:
+            name = reader.string()
+            nodes.append(_constants.NamedConstant(
+                name, float.fromhex(reader.string())))
+        elif opcode == SYMBOL_FUNCTION:
+            name = reader.string()
+            derivative_count = reader.varint()
+            nodes.append(SymbolFunction(name, child(),
+                                        derivative_count=derivative_count))
+        elif opcode in _ONE_CHILD_OPCODES:
+            nodes.append(_ONE_CHILD_OPCODES[opcode](child()))
+        elif opcode == REGISTERED_FUNCTION:
+            name = reader.string()
+            if name not in functions:
+                raise ValueError("unknown function %s, is it registered with "
+                                 "register_function()?" % name)
+            nodes.append(functions[name](child()))
+        elif opcode == DERIVATIVE:
+            n = reader.varint()
+            expr = child()
+            wrt = child()
+            if not isinstance(wrt, Symbol):
+                raise ValueError("invalid Derivative")
+            nodes.append(Derivative(expr, wrt, n, at=child()))
+        else:
+            raise ValueError("unknown opcode %d" % opcode)
+
+    roots = [child() for i in range(reader.varint())]
+    if reader.position != len(data):
+        raise ValueError("unexpected data after the end")
+    return roots
+
+
+def dumps(obj):
+    """Convert a math object to :class:`bytes`.
+
+    >>> data = dumps((x**x).derivative(x))
+    >>> loads(data)
+    x**x*(ln(x) + 1)
+
+    Each different subtree is written only once, and nothing is recursive, so
+    this works with huge and deep objects. The classes that come with
+    derivater are supported, and so are classes decorated with
+    :func:`register_function`. Those are saved by their module and class
+    name. When loading, the class must be registered already, and it's called
+    with the argument. :class:`TypeError` is raised for other classes.
+    :data:`e` and :data:`tau` are loaded as the same objects, but other
+    :class:`NamedConstants <NamedConstant>` become new objects that are equal
+    to each other if they were the same object before dumping.
+    """
+    return _dump_many([obj])
+
+
+def loads(data):
+    """Convert :class:`bytes` from :func:`dumps` back to a math object.
+
+    The result is exactly what was dumped. :meth:`~MathObject.gentle_simplify`
+    is not called, so ``loads(dumps(Add([x, x])))`` is ``Add([x, x])``.
+    Invalid data raises :class:`ValueError`.
+    """
+    roots = _load_many(data)
+    if len(roots) != 1:
+        raise ValueError("expected 1 object, got %d" % len(roots))
+    return roots[0]
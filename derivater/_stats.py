@@ -0,0 +1,250 @@
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+import derivater
+from derivater import _base
+
+
+# these methods are replaced with counting and timing wrappers while stats
+# are collected, so that they cost nothing extra otherwise
+_METHODS = ['gentle_simplify', 'derivative', 'with_fraction_coeff',
+            'replace', 'apply_recursively']
+
+_originals = []         # [(owner, name, original), ...] for restoring
+_lock = threading.Lock()    # for _originals and _collecting
+_collecting = 0         # number of collect_stats() blocks in all threads
+
+
+class _State(threading.local):
+
+    def __init__(self):
+        self.active = []    # Stats objects of this thread, innermost last
+        self.running = []   # [(id(obj), method_name), ...] of wrapped calls
+        self.depths = collections.Counter()  # {(class, method): depth}
+
+
+# the wrappers are installed for all threads, but they count only what
+# happens in threads that are collecting stats
+_state = _State()
+
+
+class Stats:
+    """Counters and timers collected by :func:`collect_stats`.
+
+    .. attribute:: calls
+
+        A :class:`collections.Counter` with ``(class_name, method_name)``
+        tuples as keys. For example, ``stats.calls['Mul', 'derivative']`` is
+        the number of times that :meth:`Mul.derivative` was called.
+        :func:`pythonify` calls are counted with the class name of the
+        argument and ``'pythonify'`` as the method name.
+
+    .. attribute:: times
+
+        Like :attr:`calls`, but the values are cumulative times in seconds,
+        including the time spent in other calls made by the method. Recursive
+        calls are counted only once.
+
+    .. attribute:: allocations
+
+        A :class:`collections.Counter` of created math objects by class name.
+
+    .. attribute:: peak_size
+
+        The number of nodes in the biggest tree returned by
+        ``derivative()`` or ``gentle_simplify()``. ``x*y + 1`` has 5 nodes, the
+        Add, the Mul, ``x``, ``y`` and ``1``.
+    """
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.times = collections.Counter()
+        self.allocations = collections.Counter()
+        self.peak_size = 0
+        self._sizes = {}    # see tree_size()
+
+    def report(self, limit=20):
+        """Return a human-readable table of the slowest things as a string."""
+        lines = ['%-40s %10s %12s' % ('method', 'calls', 'seconds')]
+        for key, seconds in self.times.most_common(limit):
+            lines.append('%-40s %10d %12.6f' % (
+                '.'.join(key), self.calls[key], seconds))
+        lines.append('')
+        lines.append('%-40s %10s' % ('class', 'created'))
+        for class_name, count in self.allocations.most_common(limit):
+            lines.append('%-40s %10d' % (class_name, count))
+        lines.append('')
+        lines.append('peak tree size: %d nodes' % self.peak_size)
+        return '\n'.join(lines)
+
+
+def _content(obj):
+    # get_content() creates new objects for some classes, don't count those
+    if isinstance(obj, (_base.Add, _base.Mul)):
+        return obj.objects
+    if isinstance(obj, _base.Pow):
+        return [obj.base, obj.exponent]
+    return obj.get_content()
+
+
+def tree_size(obj, cache):
+    """Return the number of nodes in a tree.
+
+    The cache should be a dict, initially empty, that is reused between calls.
+    It's {id(obj): (obj, size)}, where obj is there to keep the id unique.
+    """
+    # no recursion, trees can be deep
+    stack = [obj]
+    while stack:
+        current = stack[-1]
+        if id(current) in cache:
+            stack.pop()
+            continue
+        content = _content(current)
+        missing = [child for child in content if id(child) not in cache]
+        if missing:
+            stack.extend(missing)
+        else:
+            stack.pop()
+            size = 1 + sum(cache[id(child)][1] for child in content)
+            cache[id(current)] = (current, size)
+    return cache[id(obj)][1]
+
+
+def _timed(key, func, *args, **kwargs):
+    _state.depths[key] += 1
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _state.depths[key] -= 1
+        for stats in _state.active:
+            stats.calls[key] += 1
+            if _state.depths[key] == 0:
+                stats.times[key] += elapsed
+
+
+def _wrap_method(name, original):
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        running = _state.running
+        call = (id(self), name)
+        if not _state.active or (running and running[-1] == call):
+            # another thread is collecting stats, or a super().method()
+            # call, e.g. Add.replace() calls MathObject.replace(), which
+            # isn't really a separate call
+            return original(self, *args, **kwargs)
+
+        key = (type(self).__name__, name)
+        running.append(call)
+        try:
+            result = _timed(key, original, self, *args, **kwargs)
+        finally:
+            running.pop()
+
+        if name in {'derivative', 'gentle_simplify'}:
+            for stats in _state.active:
+                stats.peak_size = max(stats.peak_size,
+                                      tree_size(result, stats._sizes))
+        return result
+
+    return wrapper
+
+
+def _wrap_init(original):
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        for stats in _state.active:
+            stats.allocations[type(self).__name__] += 1
+        original(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _wrap_pythonify(original):
+    @functools.wraps(original)
+    def wrapper(obj):
+        if not _state.active:
+            return original(obj)
+        return _timed((type(obj).__name__, 'pythonify'), original, obj)
+
+    return wrapper
+
+
+def _all_subclasses(klass):
+    result = [klass]
+    for subclass in klass.__subclasses__():
+        result.extend(_all_subclasses(subclass))
+    return result
+
+
+def _patch(owner, name, wrapped):
+    _originals.append((owner, name, getattr(owner, name)))
+    setattr(owner, name, wrapped)
+
+
+def _install():
+    for klass in _all_subclasses(_base.MathObject):
+        for name in _METHODS:
+            if name in vars(klass):
+                _patch(klass, name, _wrap_method(name, vars(klass)[name]))
+        if '__init__' in vars(klass):
+            _patch(klass, '__init__', _wrap_init(vars(klass)['__init__']))
+
+    wrapped_pythonify = _wrap_pythonify(_base.pythonify)
+    _patch(_base, 'pythonify', wrapped_pythonify)
+    _patch(derivater, 'pythonify', wrapped_pythonify)
+
+
+def _uninstall():
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+
+
+@contextlib.contextmanager
+def collect_stats():
+    """A context manager that collects :class:`Stats` about what derivater
+    does.
+
+    >>> with collect_stats() as stats:
+    ...     (x*y).derivative(x)
+    ...
+    y
+    >>> stats.calls['Mul', 'derivative']
+    1
+    >>> stats.allocations['Mul'] > 0
+    True
+    >>> print(stats.report())       # doctest: +SKIP
+    method                                        calls      seconds
+    Mul.derivative                                    1     0.000187
+    Mul.gentle_simplify                               3     0.000106
+    ...
+
+    Methods of classes are replaced with wrappers that count the calls while
+    the ``with`` statement runs, so the stats are collected for subclasses
+    that exist when it starts. Only what happens in the thread that runs the
+    ``with`` statement is counted. Other threads call the wrappers too, so
+    they get a little slower while any thread collects stats, but nothing is
+    counted and there's no slowdown when no thread is collecting stats.
+    """
+    global _collecting
+    stats = Stats()
+    with _lock:
+        if _collecting == 0:
+            _install()
+        _collecting += 1
+    _state.active.append(stats)
+    try:
+        yield stats
+    finally:
+        _state.active.remove(stats)
+        stats._sizes.clear()
+        with _lock:
+            _collecting -= 1
+            if _collecting == 0:
+                _uninstall()
@@ -0,0 +1,131 @@
+import collections
+import contextlib
+import json
+import threading
+import time
+
+
+class _State(threading.local):
+
+    def __init__(self):
+        # Trace objects of this thread, innermost last, checked with
+        # "if state.active:" in hot code
+        self.active = []
+
+
+state = _State()
+
+TraceEntry = collections.namedtuple(
+    'TraceEntry', ['rule', 'input_digest', 'output_digest', 'size_delta',
+                   'seconds'])
+
+
+class Trace:
+    """Rewrite steps recorded by :func:`trace_rewrites`.
+
+    .. attribute:: entries
+
+        A list of :class:`TraceEntry` namedtuples with these attributes:
+
+        * ``rule`` is a string like ``'Mul.combine-powers'`` or
+          ``'trig.pythagorean'``.
+        * ``input_digest`` and ``output_digest`` are the
+          :meth:`~MathObject.digest` values of the objects before and after
+          the rewrite as hex strings. Unlike ``hash()`` values, they are the
+          same in every process, so traces from different runs can be
+          compared.
+        * ``size_delta`` is the number of nodes in the output tree minus the
+          number of nodes in the input tree.
+        * ``seconds`` is the time that the rewrite took.
+
+        Only rewrites that changed something are recorded.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._sizes = {}
+
+    def histogram(self):
+        """Return a :class:`collections.Counter` of rule names.
+
+        Adding the counters of many traces together with ``+`` is a good way
+        to find rules that run way more often than they should.
+        """
+        return collections.Counter(entry.rule for entry in self.entries)
+
+    def write_jsonl(self, file):
+        """Write the entries to a file object as JSON, one line per entry."""
+        for entry in self.entries:
+            file.write(json.dumps(entry._asdict()) + '\n')
+
+
+class _Steps:
+    # gentle_simplify() methods use this like this:
+    #
+    #   steps = _trace.state.active and _trace._Steps('Add', self)
+    #   ...
+    #   if steps:
+    #       steps('flatten', Add(flat))
+    #
+    # every call compares the given object to the previous object
+
+    def __init__(self, prefix, obj):
+        self._prefix = prefix + '.'
+        self._current = obj
+        self._start = time.perf_counter()
+
+    def __call__(self, rule, new_obj):
+        seconds = time.perf_counter() - self._start
+        if (type(new_obj) is not type(self._current) or
+                new_obj != self._current):
+            record(self._prefix + rule, self._current, new_obj, seconds)
+        self._current = new_obj
+        self._start = time.perf_counter()
+
+
+def record(rule, before, after, seconds):
+    # _stats imports _base, and _base imports this file
+    from derivater._stats import tree_size
+
+    for trace in state.active:
+        size_delta = (tree_size(after, trace._sizes) -
+                      tree_size(before, trace._sizes))
+        trace.entries.append(TraceEntry(
+            rule, before.digest().hex(), after.digest().hex(), size_delta,
+            seconds))
+
+
+@contextlib.contextmanager
+def trace_rewrites():
+    """A context manager that records what :meth:`Add.gentle_simplify`,
+    :meth:`Mul.gentle_simplify`, :meth:`Pow.gentle_simplify` and
+    :func:`trig_simplify` do.
+
+    >>> with trace_rewrites() as trace:
+    ...     Pow(Pow(x, 2), 3).gentle_simplify()
+    ...
+    x**6
+    >>> [entry.rule for entry in trace.entries]
+    ['Mul.extract-coefficient', 'Mul.unwrap', 'Pow.power-of-power']
+    >>> trace.entries[-1].size_delta
+    -2
+
+    Here ``Mul([2, 3]).gentle_simplify()`` was called for the ``2*3``. Note
+    that almost everything does many small rewrites.
+
+    >>> with trace_rewrites() as trace:
+    ...     trig_simplify(sin(x)**2 + cos(x)**2)
+    ...
+    1
+    >>> trace.histogram()['trig.pythagorean']
+    1
+
+    Use :meth:`Trace.write_jsonl` to save the trace to a file.
+    """
+    trace = Trace()
+    state.active.append(trace)
+    try:
+        yield trace
+    finally:
+        state.active.remove(trace)
+        trace._sizes.clear()
@@ -1,7 +1,9 @@
 import functools
 import math
 
+from derivater import _budget, _trace
 from derivater._base import MathObject, eq_and_hash, mathify, sqrt
+from derivater._functions import register_function
 
 
 def trig_func_class(repr_name):
@@ -21,15 +23,10 @@ def trig_func_class(repr_name):
     return result
 
 
+@register_function(lambda arg: cos(arg), math.sin, numpy_name='sin')
 @trig_func_class('sin')
 class Sine(MathObject):
 
-    def __float__(self):
-        return math.sin(float(self.arg))
-
-    def derivative(self, wrt):
-        return cos(self.arg) * self.arg.derivative(wrt)
-
     def _reduce_angle_2(self):
         return 2*sin(self.arg/2)*cos(self.arg/2)
 
@@ -37,15 +34,10 @@ class Sine(MathObject):
         return 3*sin(self.arg/3) - 4*sin(self.arg/3)**3
 
 
+@register_function(lambda arg: -sin(arg), math.cos, numpy_name='cos')
 @trig_func_class('cos')
 class Cosine(MathObject):
 
-    def __float__(self):
-        return math.cos(float(self.arg))
-
-    def derivative(self, wrt):
-        return -sin(self.arg) * self.arg.derivative(wrt)
-
     def _reduce_angle_2(self):
         return cos(self.arg/2)**2 - sin(self.arg/2)**2
 
@@ -53,51 +45,36 @@ class Cosine(MathObject):
         return 4*cos(self.arg/3)**3 - 3*cos(self.arg/3)
 
 
+# tan(x)**2 + 1 instead of 1/cos(x)**2, because it's only in terms of tan
+@register_function(lambda arg: tan(arg)**2 + 1, math.tan, numpy_name='tan')
 @trig_func_class('tan')
 class Tangent(MathObject):
 
-    def __float__(self):
-        return math.tan(float(self.arg))
-
     def derivative(self, wrt):
-        # (sin(x) / cos(x)).derivative(x) returns (sin(x))**2/(cos(x))**2 + 1
-        # i want to replace sin(x) / cos(x) with tan(x), but Mul.rewrite()
-        # doesn't handle that too well yet :(
-        # cos(x) = sin(x) / (sin(x) / cos(x)) = sin(x) / tan(x)
-        return ((sin(self.arg) / cos(self.arg))
-                .derivative(wrt)
-                .replace(cos(self.arg), sin(self.arg)/tan(self.arg))
-                .gentle_simplify())
+        # f'(x) + f'(x)*tan(f(x))**2 looks nicer than f'(x)*(tan(f(x))**2 + 1)
+        arg_derivative = self.arg.derivative(wrt)
+        return arg_derivative + arg_derivative * self**2
 
 
+@register_function(lambda arg: 1/sqrt(1 - arg**2), math.asin,
+                   numpy_name='arcsin')
 @trig_func_class('asin')
 class ArcSine(MathObject):
-
-    def __float__(self):
-        return math.asin(float(self.arg))
-
-    def derivative(self, wrt):
-        return 1/sqrt(1 - self.arg**2) * self.arg.derivative(wrt)
+    pass
 
 
+@register_function(lambda arg: -1/sqrt(1 - arg**2), math.acos,
+                   numpy_name='arccos')
 @trig_func_class('acos')
 class ArcCosine(MathObject):
-
-    def __float__(self):
-        return math.acos(float(self.arg))
-
-    def derivative(self, wrt):
-        return -1/sqrt(1 - self.arg**2) * self.arg.derivative(wrt)
+    pass
 
 
+@register_function(lambda arg: 1/(1 + arg**2), math.atan,
+                   numpy_name='arctan')
 @trig_func_class('atan')
 class ArcTangent(MathObject):
-
-    def __float__(self):
-        return math.atan(float(self.arg))
-
-    def derivative(self, wrt):
-        return 1/(1 + self.arg**2) * self.arg.derivative(wrt)
+    pass
 
 
 def sin(x): return Sine(x).gentle_simplify()            # noqa
@@ -121,8 +98,45 @@ def _reduce_angles(ratio, big_trig_arg, obj):
     return obj
 
 
-def trig_simplify(obj):
+def trig_simplify(obj, *, budget=None):
+    """Simplify trig functions in *obj*.
+
+    >>> trig_simplify(sin(x)**2 + cos(x)**2)
+    1
+
+    If a :class:`Budget` is given, the simplification stops when the budget
+    runs out, and the simplest object found so far is returned.
+    """
+    obj = mathify(obj)
+    if budget is None:
+        return _trig_simplify(obj, None)
+    best_so_far = [obj]
+    return _budget.run_with_budget(
+        budget, functools.partial(_trig_simplify, obj, best_so_far),
+        best_so_far)
+
+
+def _trig_simplify(obj, best_so_far):
+    # best_so_far is None when there's no budget, then the sizes don't matter
+    # _stats imports derivater, and derivater imports this file
+    from derivater._stats import tree_size
+
     trig_args = set()
+    steps = _trace.state.active and _trace._Steps('trig', obj)
+    sizes = {}
+
+    def step(rule, new_obj):
+        if _budget.state.active:
+            _budget.charge(steps=1)
+        if steps:
+            steps(rule, new_obj)
+        # a step can make things bigger, e.g. when tan(x) becomes
+        # sin(x)/cos(x), so the best is the smallest result so far
+        if best_so_far is not None and (
+                tree_size(new_obj, sizes) <=
+                tree_size(best_so_far[-1], sizes)):
+            best_so_far.append(new_obj)
+        return new_obj
 
     def to_sincos(sub_object):
         # TODO: do something with inverse trig functions
@@ -132,7 +146,8 @@ def trig_simplify(obj):
             return sin(sub_object.arg) / cos(sub_object.arg)
         return sub_object
 
-    obj = obj.simplify().apply_recursively(to_sincos).simplify()
+    obj = step('to-sincos',
+               obj.simplify().apply_recursively(to_sincos).simplify())
 
     # which angles should be reduced?
     for smaller in trig_args:
@@ -140,19 +155,24 @@ def trig_simplify(obj):
             ratio = (bigger / smaller).simplify()
             if ratio in {mathify(2), mathify(3)}:
                 callback = functools.partial(_reduce_angles, ratio, bigger)
-                obj = obj.apply_recursively(callback).simplify()
+                obj = step('reduce-angle-%s' % ratio,
+                           obj.apply_recursively(callback).simplify())
 
     while True:
         old_obj = obj
         for arg in trig_args:
-            obj = obj.replace(tan(arg), sin(arg) / cos(arg)).simplify()
+            obj = step('tan-to-sincos', obj.replace(
+                tan(arg), sin(arg) / cos(arg)).simplify())
 
             # TODO: do something with inverse_trig_args
 
             # Pythagorean identity
-            obj = obj.replace(sin(arg)**2 + cos(arg)**2, 1).simplify()
-            obj = obj.replace(1 - sin(arg)**2, cos(arg)**2).simplify()
-            obj = obj.replace(1 - cos(arg)**2, sin(arg)**2).simplify()
+            obj = step('pythagorean', obj.replace(
+                sin(arg)**2 + cos(arg)**2, 1).simplify())
+            obj = step('one-minus-sin-squared', obj.replace(
+                1 - sin(arg)**2, cos(arg)**2).simplify())
+            obj = step('one-minus-cos-squared', obj.replace(
+                1 - cos(arg)**2, sin(arg)**2).simplify())
 
         if obj == old_obj:
             # nothing simplifies anymore, we're done
@@ -160,4 +180,6 @@ def trig_simplify(obj):
 
     for arg in trig_args:
         obj = obj.replace(sin(arg) / cos(arg), tan(arg))
+        if steps:
+            steps('sincos-to-tan', obj)
     return obj
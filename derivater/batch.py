@@ -0,0 +1,62 @@
+"""Take many derivatives at once with multiple processes.
+
+Import this module like ``import derivater.batch``, it's not imported
+automatically with :mod:`derivater`.
+"""
+
+import concurrent.futures
+import itertools
+import os
+
+from derivater._serialize import dumps, loads, _dump_many, _load_many
+
+
+def _derivative_chunk(data, wrt_data):
+    # this runs in the worker processes
+    wrt = loads(wrt_data)
+    return _dump_many([expr.derivative(wrt) for expr in _load_many(data)])
+
+
+def _chunks(items, chunksize):
+    for start in range(0, len(items), chunksize):
+        yield items[start:start + chunksize]
+
+
+def derivative_many(exprs, wrt, *, workers=None, chunksize=100,
+                    executor=None):
+    """Return a list of the derivatives of *exprs* with respect to *wrt*.
+
+    >>> derivative_many([x**2, sin(x), x*y], x, workers=2)
+    [2*x, cos(x), y]
+
+    The *exprs* are sent to a :class:`concurrent.futures.ProcessPoolExecutor`
+    in chunks of *chunksize* expressions, encoded with :func:`.dumps`, so
+    :data:`e` and :data:`tau` in the results are the usual objects. The
+    results are in the same order as *exprs*.
+
+    *workers* is the number of processes, and it defaults to
+    :func:`os.cpu_count`. If it's 1, the derivatives are taken in the current
+    process without starting any processes. You can also pass an existing
+    :class:`concurrent.futures.Executor` as *executor* to avoid starting
+    new processes every time; then *workers* is ignored.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be positive")
+    exprs = list(exprs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor is None and (workers <= 1 or len(exprs) <= chunksize):
+        # starting processes would take longer than this
+        return [expr.derivative(wrt) for expr in exprs]
+
+    chunk_data = map(_dump_many, _chunks(exprs, chunksize))
+    wrt_data = itertools.repeat(dumps(wrt))
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(
+                _derivative_chunk, chunk_data, wrt_data))
+    else:
+        results = list(executor.map(_derivative_chunk, chunk_data, wrt_data))
+
+    return [derivative for data in results
+            for derivative in _load_many(data)]
@@ -0,0 +1,196 @@
+"""A persistent cache for slow things.
+
+Import this module like ``import derivater.cache``, it's not imported
+automatically with :mod:`derivater`.
+"""
+
+import hashlib
+import sqlite3
+import time
+
+import derivater
+from derivater._serialize import dumps, loads
+
+
+# The total size of the values is kept in the metadata table by these
+# triggers, so that eviction doesn't need to look at every row. REPLACE
+# doesn't run delete triggers unless recursive_triggers is on, so _store()
+# deletes the old row explicitly.
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS results (
+        key BLOB PRIMARY KEY,
+        value BLOB NOT NULL,
+        last_used REAL NOT NULL
+    )''',
+    '''CREATE INDEX IF NOT EXISTS results_last_used
+    ON results (last_used)''',
+    '''CREATE TABLE IF NOT EXISTS metadata (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )''',
+    '''INSERT OR IGNORE INTO metadata
+    SELECT 'total_bytes', COALESCE(SUM(LENGTH(value)), 0) FROM results''',
+    '''CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results
+    BEGIN
+        UPDATE metadata SET value = value + LENGTH(NEW.value)
+        WHERE name = 'total_bytes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results
+    BEGIN
+        UPDATE metadata SET value = value - LENGTH(OLD.value)
+        WHERE name = 'total_bytes';
+    END''',
+]
+
+
+class DiskCache:
+    """Stores results of derivatives and simplifications in an SQLite file.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite')
+    >>> with DiskCache(path) as cache:
+    ...     cache.derivative(x**x, x)
+    ...
+    x**x*(ln(x) + 1)
+    >>> with DiskCache(path) as cache:
+    ...     cache.derivative(x**x, x)   # the result comes from the file
+    ...     cache.hits
+    ...
+    x**x*(ln(x) + 1)
+    1
+
+    The keys are computed from the :meth:`~MathObject.digest` of the
+    expression, the name of the operation and its arguments, and
+    ``derivater.__version__``, so upgrading derivater doesn't give results
+    computed with an old version. The values are :func:`.dumps` data of the
+    results.
+
+    *max_bytes* is the maximum total size of the stored results. When there
+    would be more, the results that have been used least recently are
+    deleted. To avoid a write to the file on every hit, the times when
+    results were used are remembered in memory and written to the file in
+    batches: when a result is stored, when *touch_batch* hits have
+    accumulated, and when the cache is closed.
+
+    The file uses SQLite's WAL mode, so many processes can read it while
+    one of them writes. Don't use the same DiskCache object from several
+    threads.
+
+    .. attribute:: hits
+                   misses
+
+        The number of times a result was found or not found in the file.
+    """
+
+    def __init__(self, path, *, max_bytes=64*1024*1024, touch_batch=100):
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}      # {key: last_used} not written to file yet
+        self._touch_count = 0
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.close()
+
+    def close(self):
+        """Write pending usage times and close the SQLite connection."""
+        with self._connection:
+            self._flush_touched()
+        self._connection.close()
+
+    def clear(self):
+        """Delete everything from the cache file."""
+        self._touched.clear()
+        self._touch_count = 0
+        with self._connection:
+            self._connection.execute('DELETE FROM results')
+
+    def _key(self, operation, expr):
+        hasher = hashlib.md5()
+        hasher.update(derivater.__version__.encode('utf-8') + b'\0')
+        hasher.update(operation.encode('utf-8') + b'\0')
+        hasher.update(expr.digest())
+        return hasher.digest()
+
+    def _lookup(self, key):
+        row = self._connection.execute(
+            'SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touched[key] = time.time()
+        self._touch_count += 1
+        if self._touch_count >= self.touch_batch:
+            with self._connection:
+                self._flush_touched()
+        return loads(row[0])
+
+    def _flush_touched(self):
+        self._connection.executemany(
+            'UPDATE results SET last_used = ? WHERE key = ?',
+            [(last_used, key) for key, last_used in self._touched.items()])
+        self._touched.clear()
+        self._touch_count = 0
+
+    def _store(self, key, result):
+        value = dumps(result)
+        with self._connection:
+            self._flush_touched()
+            self._connection.execute(
+                'DELETE FROM results WHERE key = ?', (key,))
+            self._connection.execute(
+                'INSERT INTO results VALUES (?, ?, ?)',
+                (key, value, time.time()))
+            self._evict()
+
+    def _evict(self):
+        [total] = self._connection.execute(
+            "SELECT value FROM metadata WHERE name = 'total_bytes'"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        doomed = []
+        rows = self._connection.execute(
+            'SELECT key, LENGTH(value) FROM results ORDER BY last_used')
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._connection.executemany(
+            'DELETE FROM results WHERE key = ?', doomed)
+
+    def _cached(self, operation, expr, compute):
+        key = self._key(operation, expr)
+        result = self._lookup(key)
+        if result is None:
+            result = compute()
+            self._store(key, result)
+        return result
+
+    def derivative(self, expr, wrt):
+        """Like ``expr.derivative(wrt)``."""
+        return self._cached('derivative ' + repr(wrt), expr,
+                            lambda: expr.derivative(wrt))
+
+    def simplify(self, expr, method='default'):
+        """Like :func:`derivater.simplify`."""
+        return self._cached('simplify ' + method, expr,
+                            lambda: derivater.simplify(expr, method))
+
+    def trig_simplify(self, expr):
+        """Like :func:`derivater.trig_simplify`."""
+        return self._cached('trig_simplify', expr,
+                            lambda: derivater.trig_simplify(expr))
@@ -0,0 +1,294 @@
+"""Find minimums of math objects.
+
+Import this module like ``import derivater.optimize``, it's not imported
+automatically with :mod:`derivater`.
+"""
+
+import collections
+import functools
+import math
+
+from derivater._base import Symbol, mathify
+from derivater._compile import compile_function, _find_symbols
+
+
+OptimizeResult = collections.namedtuple(
+    'OptimizeResult', ['point', 'value', 'converged', 'iterations'])
+
+METHODS = ['gradient-descent', 'lbfgs', 'newton']
+
+# the line search accepts a step t along a direction p when
+#
+#   f(x + t*p) <= f(x) + _ARMIJO*t*(gradient dot p)       (decreases enough)
+#   gradient(x + t*p) dot p >= _CURVATURE*(gradient dot p)   (not too short)
+#
+# these are the weak Wolfe conditions, and the second one makes sure that
+# lbfgs gets useful information about second derivatives
+_ARMIJO = 1e-4
+_CURVATURE = 0.9
+_MAX_LINE_SEARCH_STEPS = 60
+_MAX_DAMPING_STEPS = 100
+_INF = float('inf')
+_LBFGS_MEMORY = 10
+
+
+# same expression and symbols --> same compiled function, so nothing is
+# differentiated or compiled again when minimize() is called many times
+@functools.lru_cache(maxsize=128)
+def _compile_objective(expr, symbols, others, hessian):
+    # everything is compiled into one function, so the value, the gradient
+    # and the hessian share their common parts
+    gradient = [expr.derivative(symbol) for symbol in symbols]
+    exprs = [expr] + gradient
+    if hessian:
+        for i, partial in enumerate(gradient):
+            exprs.extend(partial.derivative(symbol)
+                         for symbol in symbols[i:])
+    return compile_function(exprs, symbols + others)
+
+
+def _unpack(results, n, hessian):
+    # returns (value, gradient, hessian or None)
+    value = results[0]
+    gradient = list(results[1:n+1])
+    if not hessian:
+        return (value, gradient, None)
+
+    matrix = [[0.0]*n for i in range(n)]
+    upper = iter(results[n+1:])
+    for i in range(n):
+        for j in range(i, n):
+            matrix[i][j] = matrix[j][i] = next(upper)
+    return (value, gradient, matrix)
+
+
+def _dot(a, b):
+    return sum(x*y for x, y in zip(a, b))
+
+
+def _cholesky_solve(matrix, vector):
+    # solves matrix*result = vector, returns None if the matrix is not
+    # positive definite
+    n = len(vector)
+    lower = [[0.0]*n for i in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            total = matrix[i][j] - _dot(lower[i][:j], lower[j][:j])
+            if i == j:
+                if not total > 0:
+                    return None
+                lower[i][i] = math.sqrt(total)
+            else:
+                lower[i][j] = total / lower[j][j]
+
+    temp = [0.0]*n
+    for i in range(n):
+        temp[i] = (vector[i] - _dot(lower[i][:i], temp[:i])) / lower[i][i]
+    result = [0.0]*n
+    for i in reversed(range(n)):
+        total = sum(lower[j][i] * result[j] for j in range(i + 1, n))
+        result[i] = (temp[i] - total) / lower[i][i]
+    return result
+
+
+def _newton_direction(gradient, hessian):
+    # if the hessian isn't positive definite, something is added to its
+    # diagonal until it is, so that the direction goes downhill
+    #
+    # adding more than n*scale always works for finite hessians, but nan or
+    # inf never goes away, and then this goes straight downhill instead
+    n = len(gradient)
+    entries = [value for row in hessian for value in row]
+    if not all(map(math.isfinite, entries)):
+        return [-g for g in gradient]
+    scale = max(map(abs, entries)) or 1.0
+    damping = 0.0
+    for attempt in range(_MAX_DAMPING_STEPS):
+        damped = [[hessian[i][j] + (damping if i == j else 0.0)
+                   for j in range(n)] for i in range(n)]
+        direction = _cholesky_solve(damped, [-g for g in gradient])
+        if direction is not None:
+            return direction
+        damping = max(2*damping, 1e-8*scale)
+    return [-g for g in gradient]
+
+
+def _lbfgs_direction(gradient, history):
+    # the two-loop recursion, history is a list of (s, y, 1/(y dot s))
+    q = list(gradient)
+    alphas = []
+    for s, y, rho in reversed(history):
+        alpha = rho * _dot(s, q)
+        alphas.append(alpha)
+        q = [qi - alpha*yi for qi, yi in zip(q, y)]
+    if history:
+        s, y, rho = history[-1]
+        gamma = _dot(s, y) / _dot(y, y)
+        q = [gamma*qi for qi in q]
+    for (s, y, rho), alpha in zip(history, reversed(alphas)):
+        beta = rho * _dot(y, q)
+        q = [qi + (alpha - beta)*si for qi, si in zip(q, s)]
+    return [-qi for qi in q]
+
+
+def _evaluate(func, point, other_values, n, hessian):
+    try:
+        results = func(*(point + other_values))
+    except (ArithmeticError, ValueError):
+        # e.g. ln() of a negative number, the line search tries a shorter
+        # step when the value is inf
+        return (_INF, None, None)
+    value, gradient, matrix = _unpack(results, n, hessian)
+    if math.isnan(value) or not all(map(math.isfinite, gradient)):
+        return (_INF, None, None)
+    return (value, gradient, matrix)
+
+
+def _line_search(func, point, direction, value, slope, t, other_values,
+                 n, hessian):
+    # returns (point, value, gradient, hessian, t), or None if nothing
+    # decreases the value
+    lo = 0.0
+    hi = _INF
+    best = None
+    for i in range(_MAX_LINE_SEARCH_STEPS):
+        new_point = [p + t*d for p, d in zip(point, direction)]
+        new_value, new_gradient, new_hessian = _evaluate(
+            func, new_point, other_values, n, hessian)
+        if new_value > value + _ARMIJO*t*slope:
+            hi = t
+        else:
+            best = (new_point, new_value, new_gradient, new_hessian, t)
+            if _dot(new_gradient, direction) >= _CURVATURE*slope:
+                break
+            lo = t
+        t = 2*lo if hi == _INF else (lo + hi)/2
+    return best
+
+
+def minimize(expr, symbols, x0, values=None, *, method='lbfgs', tol=1e-8,
+             max_iterations=200):
+    """Find values of *symbols* that make *expr* as small as possible.
+
+    >>> import derivater.optimize
+    >>> result = derivater.optimize.minimize(
+    ...     (x - 1)**2 + 2*(y + x)**2, [x, y], [0, 0])
+    >>> [round(value, 6) for value in result.point]
+    [1.0, -1.0]
+    >>> result.converged
+    True
+
+    This starts at the point *x0*, which is a list of numbers, one for each
+    symbol in *symbols*. Symbols in *expr* that aren't in *symbols* are
+    parameters, and *values* must be a dict that maps them (or their names)
+    to numbers. If *values* changes every time, e.g. when fitting a model to
+    different data, the parameters are still compiled only once.
+
+    The *method* can be:
+
+    * ``'gradient-descent'``: take steps in the direction where *expr*
+      decreases the fastest. This is simple but slow.
+    * ``'lbfgs'``: use the limited-memory BFGS method, which estimates second
+      derivatives from the gradients. This is usually the best choice.
+    * ``'newton'``: use Newton's method with the second derivatives of
+      *expr*. This takes the fewest steps, but each step needs all the second
+      derivatives.
+
+    All methods use a line search, so every step decreases the value. *expr*,
+    its gradient and, for ``'newton'``, its second derivatives are
+    differentiated once and compiled into one function with
+    :func:`.compile_function`, so the parts they have in common are
+    calculated only once. The compiled functions are cached, so calling this
+    again with the same *expr* doesn't differentiate or compile anything.
+
+    The iterations stop when each partial derivative is at most *tol*, and
+    the result is an ``OptimizeResult`` namedtuple with these attributes:
+
+    * ``point``: a list of floats, the values of *symbols*.
+    * ``value``: the value of *expr* at ``point``.
+    * ``converged``: True if the partial derivatives got small enough, False
+      if the iterations ran out or the line search got stuck. It's also
+      False if *expr* or its gradient can't be calculated at *x0*, and then
+      ``value`` is infinity.
+    * ``iterations``: the number of steps taken.
+    """
+    if method not in METHODS:
+        raise ValueError("unknown method %r, should be one of: %s"
+                         % (method, ', '.join(METHODS)))
+    if max_iterations < 1:
+        raise ValueError("max_iterations must be positive")
+    symbols = tuple(symbols)
+    for symbol in symbols:
+        if not isinstance(symbol, Symbol):
+            raise TypeError("expected a Symbol, got %r" % (symbol,))
+    point = [float(value) for value in x0]
+    if len(point) != len(symbols):
+        raise ValueError("x0 should have %d numbers, not %d"
+                         % (len(symbols), len(point)))
+    expr = mathify(expr)
+
+    values_by_name = {}
+    for symbol, value in (values or {}).items():
+        name = symbol.name if isinstance(symbol, Symbol) else symbol
+        values_by_name[name] = value
+    others = tuple(sorted(_find_symbols(expr) - set(symbols),
+                          key=(lambda s: s.name)))
+    missing = [symbol.name for symbol in others
+               if symbol.name not in values_by_name]
+    if missing:
+        raise ValueError("no value for %s was given" % ', '.join(missing))
+    other_values = [values_by_name[symbol.name] for symbol in others]
+
+    n = len(symbols)
+    use_hessian = (method == 'newton')
+    func = _compile_objective(expr, symbols, others, use_hessian)
+    value, gradient, hessian = _evaluate(
+        func, point, other_values, n, use_hessian)
+    if gradient is None:
+        # x0 is outside the domain, e.g. ln(x) with x = -1
+        return OptimizeResult(point, value, False, 0)
+
+    history = []    # for lbfgs
+    step_size = 1.0     # for gradient descent
+    for iteration in range(max_iterations):
+        if max(map(abs, gradient), default=0) <= tol:
+            return OptimizeResult(point, value, True, iteration)
+
+        if method == 'newton':
+            direction = _newton_direction(gradient, hessian)
+        elif method == 'lbfgs':
+            direction = _lbfgs_direction(gradient, history)
+        else:
+            direction = [-g for g in gradient]
+        slope = _dot(gradient, direction)
+        if not slope < 0:
+            # not downhill, e.g. because of rounding errors
+            direction = [-g for g in gradient]
+            slope = _dot(gradient, direction)
+            history.clear()
+
+        found = _line_search(
+            func, point, direction, value, slope,
+            step_size if method == 'gradient-descent' else 1.0,
+            other_values, n, use_hessian)
+        if found is None:
+            # no step decreases the value
+            return OptimizeResult(point, value, False, iteration)
+        new_point, new_value, new_gradient, new_hessian, t = found
+
+        if method == 'lbfgs':
+            s = [new - old for new, old in zip(new_point, point)]
+            y = [new - old for new, old in zip(new_gradient, gradient)]
+            curvature = _dot(s, y)
+            if curvature > 1e-12 * math.sqrt(_dot(s, s) * _dot(y, y)):
+                history.append((s, y, 1/curvature))
+                del history[:-_LBFGS_MEMORY]
+        step_size = 2*t
+
+        point = new_point
+        value = new_value
+        gradient = new_gradient
+        hessian = new_hessian
+
+    converged = max(map(abs, gradient), default=0) <= tol
+    return OptimizeResult(point, value, converged, max_iterations)
@@ -0,0 +1,534 @@
+"""Store lots of math objects in a few arrays.
+
+Import this module like ``import derivater.pool``, it's not imported
+automatically with :mod:`derivater`.
+"""
+
+import array
+import functools
+import math
+import mmap
+import operator
+import struct
+import sys
+
+from derivater._base import (Symbol, SymbolFunction, Integer, Add, Mul, Pow,
+                             mathify)
+from derivater._constants import NamedConstant
+from derivater._serialize import (
+    ADD, MUL, POW, INTEGER, SYMBOL, KNOWN_CONSTANT, NEW_CONSTANT,
+    SYMBOL_FUNCTION, NATURAL_LOG, SINE, COSINE, TANGENT, ARC_SINE,
+    ARC_COSINE, ARC_TANGENT, _KNOWN_CONSTANTS, _ONE_CHILD_OPCODES,
+    _children, _node_key, _write_varint, _write_string, _zigzag, _unzigzag,
+    _Reader)
+
+
+# the file is the header, then the arrays in this order, each starting at a
+# multiple of 8 bytes, and then the literals
+_MAGIC = b'derivater pool\x01\x00'
+_HEADER = struct.Struct('<16s8sQQQQ')
+_ARRAYS = [
+    # (attribute, typecode)
+    ('_opcodes', 'B'),
+    ('_payloads', 'i'),     # indexes of self._literals, 0 if not used
+    ('_starts', 'I'),       # children of node i are _children[starts[i]:...]
+    ('_children', 'I'),
+    ('_roots', 'I'),
+]
+
+_FLOAT_FUNCTIONS = {
+    NATURAL_LOG: math.log,
+    SINE: math.sin,
+    COSINE: math.cos,
+    TANGENT: math.tan,
+    ARC_SINE: math.asin,
+    ARC_COSINE: math.acos,
+    ARC_TANGENT: math.atan,
+}
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _write_literal(output, opcode, value):
+    output.append(opcode)
+    if opcode == INTEGER:
+        _write_varint(output, _zigzag(value))
+    elif opcode == SYMBOL:
+        _write_string(output, value)
+    elif opcode == KNOWN_CONSTANT:
+        _write_varint(output, value)
+    elif opcode == NEW_CONSTANT:
+        name, float_value = value
+        _write_string(output, name)
+        _write_string(output, float_value.hex())
+    else:
+        assert opcode == SYMBOL_FUNCTION
+        name, derivative_count = value
+        _write_string(output, name)
+        _write_varint(output, derivative_count)
+
+
+def _read_literal(reader):
+    opcode = reader.byte()
+    if opcode == INTEGER:
+        return (opcode, _unzigzag(reader.varint()))
+    if opcode == SYMBOL:
+        return (opcode, reader.string())
+    if opcode == KNOWN_CONSTANT:
+        return (opcode, reader.varint())
+    if opcode == NEW_CONSTANT:
+        name = reader.string()
+        return (opcode, (name, float.fromhex(reader.string())))
+    if opcode == SYMBOL_FUNCTION:
+        name = reader.string()
+        return (opcode, (name, reader.varint()))
+    raise ValueError("unknown literal opcode %d" % opcode)
+
+
+class NodePool:
+    """A list-like object of math objects, stored in :mod:`array` arrays.
+
+    >>> pool = NodePool([x**2 + sin(x), 2*x])
+    >>> len(pool)
+    2
+    >>> pool[0]
+    x**2 + sin(x)
+    >>> pool.add(sin(x) + x**2)     # returns an index
+    2
+    >>> pool.evaluate(2, {'x': 0.5})        # doctest: +ELLIPSIS
+    0.729...
+    >>> pool[pool.derivative(2, x)]
+    2*x + cos(x)
+
+    Each Add, Mul, Pow, Symbol or other node is stored in a few numbers
+    instead of a Python object:
+
+    * an opcode, the same numbers that :func:`.dumps` uses
+    * an index of a literal table that contains the integers, names of
+      symbols and other things that aren't nodes
+    * the indexes of the child nodes, in one big array for all nodes, and
+      where the children of each node start in that array
+
+    Equal nodes are stored only once, even if they are in different objects,
+    so adding similar objects is cheap. :meth:`evaluate` and
+    :meth:`derivative` work with the arrays without creating math objects.
+    Indexing creates a new math object without calling
+    :meth:`~MathObject.gentle_simplify`, so call that if needed.
+
+    Only the classes that come with derivater are supported, like with
+    :func:`.dumps`. :class:`NamedConstants <NamedConstant>` with the same
+    name and value become the same constant in the pool, except :data:`e`
+    and :data:`tau` which always stay the usual objects.
+
+    While adding things, a dict is used for finding equal nodes. Pools
+    loaded with :meth:`load` don't have it until something is added to them.
+    """
+
+    def __init__(self, objects=()):
+        for attribute, typecode in _ARRAYS:
+            setattr(self, attribute, array.array(typecode))
+        self._starts.append(0)
+        self._literals = []             # [(opcode, value)]
+        self._constants = {}            # {literal index: NamedConstant}
+        self._literal_indexes = None    # {(opcode, value): index}
+        self._node_indexes = None       # {node key: node index}
+        self._mmap = None
+        for obj in objects:
+            self.add(obj)
+
+    def __len__(self):
+        return len(self._roots)
+
+    @property
+    def node_count(self):
+        """The number of different nodes in the pool."""
+        return len(self._opcodes)
+
+    def _make_writable(self):
+        if self._mmap is not None:
+            for attribute, typecode in _ARRAYS:
+                new_array = array.array(typecode)
+                new_array.frombytes(getattr(self, attribute).cast('B'))
+                setattr(self, attribute, new_array)
+            self._mmap = None
+
+        if self._literal_indexes is None:
+            self._literal_indexes = {
+                literal: index for index, literal in enumerate(self._literals)}
+        if self._node_indexes is None:
+            self._node_indexes = {
+                self._key(node): node for node in range(self.node_count)}
+
+    def _child_nodes(self, node):
+        return self._children[self._starts[node]:self._starts[node + 1]]
+
+    def _key(self, node):
+        return (self._opcodes[node], self._payloads[node],
+                tuple(self._child_nodes(node)))
+
+    def _literal(self, opcode, value):
+        try:
+            return self._literal_indexes[(opcode, value)]
+        except KeyError:
+            self._literals.append((opcode, value))
+            self._literal_indexes[(opcode, value)] = len(self._literals) - 1
+            return len(self._literals) - 1
+
+    def _node(self, opcode, children=(), literal=None):
+        # returns the index of a new or existing node
+        if opcode == ADD or opcode == MUL:
+            # their order doesn't matter, and this finds more equal nodes
+            children = sorted(children)
+        payload = 0 if literal is None else self._literal(opcode, literal)
+        key = (opcode, payload, tuple(children))
+        try:
+            return self._node_indexes[key]
+        except KeyError:
+            pass
+
+        self._opcodes.append(opcode)
+        self._payloads.append(payload)
+        self._children.extend(children)
+        self._starts.append(len(self._children))
+        self._node_indexes[key] = self.node_count - 1
+        return self.node_count - 1
+
+    def add(self, obj):
+        """Add a math object to the end of the pool and return its index."""
+        self._make_writable()
+        root = mathify(obj)
+        nodes = {}      # {id(obj): node index}, objects stay alive in root
+
+        # postorder without recursion
+        stack = [root]
+        while stack:
+            obj = stack[-1]
+            if id(obj) in nodes:
+                stack.pop()
+                continue
+
+            children = _children(obj)
+            missing = [child for child in children if id(child) not in nodes]
+            if missing:
+                stack.extend(reversed(missing))
+                continue
+
+            stack.pop()
+            opcode, literal, child_nodes = _node_key(
+                obj, [nodes[id(child)] for child in children])
+            if opcode == NEW_CONSTANT:
+                constant = literal
+                literal = (str(constant), float(constant))
+            node = self._node(opcode, child_nodes, literal)
+            if opcode == NEW_CONSTANT:
+                # pool[index] gives back the same constant object
+                self._constants.setdefault(self._payloads[node], constant)
+            nodes[id(obj)] = node
+
+        self._roots.append(nodes[id(root)])
+        return len(self._roots) - 1
+
+    def _reachable(self, root):
+        # returns the nodes of an object in postorder, because children are
+        # always added before their parents
+        found = {root}
+        stack = [root]
+        while stack:
+            for child in self._child_nodes(stack.pop()):
+                if child not in found:
+                    found.add(child)
+                    stack.append(child)
+        return sorted(found)
+
+    def _literal_value(self, node):
+        return self._literals[self._payloads[node]][1]
+
+    def __getitem__(self, index):
+        objects = {}    # {node index: math object}
+        for node in self._reachable(self._roots[index]):
+            opcode = self._opcodes[node]
+            children = [objects[child] for child in self._child_nodes(node)]
+            if opcode == ADD:
+                obj = Add(children)
+            elif opcode == MUL:
+                obj = Mul(children)
+            elif opcode == POW:
+                obj = Pow(*children)
+            elif opcode == INTEGER:
+                obj = Integer(self._literal_value(node))
+            elif opcode == SYMBOL:
+                obj = Symbol(self._literal_value(node))
+            elif opcode == KNOWN_CONSTANT:
+                obj = _KNOWN_CONSTANTS[self._literal_value(node)]
+            elif opcode == NEW_CONSTANT:
+                payload = self._payloads[node]
+                if payload not in self._constants:
+                    self._constants[payload] = NamedConstant(
+                        *self._literal_value(node))
+                obj = self._constants[payload]
+            elif opcode == SYMBOL_FUNCTION:
+                name, derivative_count = self._literal_value(node)
+                obj = SymbolFunction(name, children[0],
+                                     derivative_count=derivative_count)
+            else:
+                obj = _ONE_CHILD_OPCODES[opcode](children[0])
+            objects[node] = obj
+        return objects[self._roots[index]]
+
+    def evaluate(self, index, values=None):
+        """Return the value of the object at *index* as a float.
+
+        *values* is a dict with :class:`Symbols <Symbol>` or their names as
+        keys, and it must contain a value for every Symbol in the object.
+        This is like ``float(pool[index].replace(...))``, but faster and
+        without creating any math objects.
+        """
+        values = {str(name): float(value)
+                  for name, value in (values or {}).items()}
+        results = {}    # {node index: float}
+        for node in self._reachable(self._roots[index]):
+            opcode = self._opcodes[node]
+            args = [results[child] for child in self._child_nodes(node)]
+            if opcode == ADD:
+                result = sum(args)
+            elif opcode == MUL:
+                result = functools.reduce(operator.mul, args, 1.0)
+            elif opcode == POW:
+                [base_node, exponent_node] = self._child_nodes(node)
+                if (self._opcodes[base_node] == KNOWN_CONSTANT and
+                        self._literal_value(base_node) == 0):
+                    # e**x, more precision like Pow.__float__
+                    result = math.exp(args[1])
+                else:
+                    result = math.pow(*args)
+            elif opcode == INTEGER:
+                result = float(self._literal_value(node))
+            elif opcode == SYMBOL:
+                name = self._literal_value(node)
+                if name not in values:
+                    raise ValueError("no value for %s was given" % name)
+                result = values[name]
+            elif opcode == KNOWN_CONSTANT:
+                result = float(_KNOWN_CONSTANTS[self._literal_value(node)])
+            elif opcode == NEW_CONSTANT:
+                result = self._literal_value(node)[1]
+            elif opcode == SYMBOL_FUNCTION:
+                name, derivative_count = self._literal_value(node)
+                raise TypeError("cannot evaluate %s%s()"
+                                % (name, "'" * derivative_count))
+            else:
+                result = _FLOAT_FUNCTIONS[opcode](args[0])
+            results[node] = result
+        return results[self._roots[index]]
+
+    # helpers for derivative(), these do the simplest simplifications
+    def _integer(self, python_int):
+        return self._node(INTEGER, literal=python_int)
+
+    def _is_integer(self, node, python_int):
+        return (self._opcodes[node] == INTEGER and
+                self._literal_value(node) == python_int)
+
+    def _add(self, terms):
+        terms = [term for term in terms if not self._is_integer(term, 0)]
+        if not terms:
+            return self._integer(0)
+        if len(terms) == 1:
+            return terms[0]
+        return self._node(ADD, terms)
+
+    def _mul(self, factors):
+        if any(self._is_integer(factor, 0) for factor in factors):
+            return self._integer(0)
+        factors = [factor for factor in factors
+                   if not self._is_integer(factor, 1)]
+        if not factors:
+            return self._integer(1)
+        if len(factors) == 1:
+            return factors[0]
+        return self._node(MUL, factors)
+
+    def _pow(self, base, exponent):
+        if self._is_integer(exponent, 0):
+            return self._integer(1)
+        if self._is_integer(exponent, 1):
+            return base
+        return self._node(POW, [base, exponent])
+
+    def _ln(self, node):
+        if self._is_integer(node, 1):
+            return self._integer(0)
+        if (self._opcodes[node] == KNOWN_CONSTANT and
+                self._literal_value(node) == 0):    # e
+            return self._integer(1)
+        return self._node(NATURAL_LOG, [node])
+
+    def _derivative_node(self, node, wrt_name, derivatives):
+        # the derivatives of the children must be in derivatives already
+        opcode = self._opcodes[node]
+        children = list(self._child_nodes(node))
+        child_derivatives = [derivatives[child] for child in children]
+        zero = self._integer(0)
+        if all(derivative == zero for derivative in child_derivatives):
+            if opcode == SYMBOL and self._literal_value(node) == wrt_name:
+                return self._integer(1)
+            return zero
+
+        if opcode == ADD:
+            return self._add(child_derivatives)
+        if opcode == MUL:
+            # d/dx (f(x)g(x)h(x)) = f'(x)g(x)h(x) + f(x)g'(x)h(x) + ...
+            return self._add([
+                self._mul(children[:i] + [derivative] + children[i+1:])
+                for i, derivative in enumerate(child_derivatives)])
+        if opcode == SYMBOL_FUNCTION:
+            name, derivative_count = self._literal_value(node)
+            return self._mul([
+                self._node(SYMBOL_FUNCTION, children,
+                           (name, derivative_count + 1)),
+                child_derivatives[0]])
+
+        if opcode == POW:
+            [base, exponent] = children
+            [base_derivative, exponent_derivative] = child_derivatives
+            if exponent_derivative == zero:
+                # d/dx f(x)**c = c*f(x)**(c-1) * f'(x)
+                if self._opcodes[exponent] == INTEGER:
+                    new_exponent = self._integer(
+                        self._literal_value(exponent) - 1)
+                else:
+                    new_exponent = self._add([exponent, self._integer(-1)])
+                return self._mul([exponent, self._pow(base, new_exponent),
+                                  base_derivative])
+            if base_derivative == zero:
+                # d/dx a**f(x) = a**f(x) ln(a) * f'(x)
+                return self._mul([node, self._ln(base), exponent_derivative])
+            # d/dx f(x)**g(x) = f(x)**g(x) * (g'(x) ln(f(x)) + g(x)f'(x)/f(x))
+            return self._mul([node, self._add([
+                self._mul([exponent_derivative, self._ln(base)]),
+                self._mul([exponent, base_derivative,
+                           self._pow(base, self._integer(-1))]),
+            ])])
+
+        [arg] = children
+        [arg_derivative] = child_derivatives
+        if opcode == NATURAL_LOG:
+            inner = self._pow(arg, self._integer(-1))
+        elif opcode == SINE:
+            inner = self._node(COSINE, [arg])
+        elif opcode == COSINE:
+            inner = self._mul([self._integer(-1), self._node(SINE, [arg])])
+        elif opcode == TANGENT:
+            # 1 + tan(x)**2
+            inner = self._add([self._integer(1),
+                               self._pow(node, self._integer(2))])
+        elif opcode == ARC_TANGENT:
+            inner = self._pow(
+                self._add([self._integer(1),
+                           self._pow(arg, self._integer(2))]),
+                self._integer(-1))
+        else:
+            # 1/sqrt(1 - x**2), negated for acos
+            minus_half = self._mul([
+                self._integer(-1),
+                self._pow(self._integer(2), self._integer(-1))])
+            inner = self._pow(self._add([
+                self._integer(1),
+                self._mul([self._integer(-1),
+                           self._pow(arg, self._integer(2))]),
+            ]), minus_half)
+            if opcode == ARC_COSINE:
+                inner = self._mul([self._integer(-1), inner])
+        return self._mul([inner, arg_derivative])
+
+    def derivative(self, index, wrt):
+        """Add the derivative of the object at *index* and return its index.
+
+        This is like ``pool.add(pool[index].derivative(wrt))``, but no math
+        objects are created and nothing is simplified, except that zeros
+        and ones are left out. Subtrees that appear many times are
+        differentiated only once.
+        """
+        self._make_writable()
+        root = self._roots[index]
+        derivatives = {}    # {node index: node index of derivative}
+        for node in self._reachable(root):
+            derivatives[node] = self._derivative_node(
+                node, wrt.name, derivatives)
+        self._roots.append(derivatives[root])
+        return len(self._roots) - 1
+
+    def save(self, path):
+        """Write the pool to a file that :meth:`load` can read."""
+        literals = bytearray()
+        for opcode, value in self._literals:
+            _write_literal(literals, opcode, value)
+
+        with open(path, 'wb') as file:
+            file.write(_HEADER.pack(
+                _MAGIC, sys.byteorder.encode('ascii'), self.node_count,
+                len(self._children), len(self._roots), len(self._literals)))
+            for attribute, typecode in _ARRAYS:
+                file.write(b'\0' * (_align(file.tell()) - file.tell()))
+                file.write(getattr(self, attribute))
+            file.write(b'\0' * (_align(file.tell()) - file.tell()))
+            file.write(literals)
+
+    @classmethod
+    def load(cls, path, *, memory_map=True):
+        """Read a pool from a file created with :meth:`save`.
+
+        If *memory_map* is True, the arrays are not read to memory; instead,
+        the file is :mod:`memory mapped <mmap>`, so the operating system
+        reads the parts that are needed and pools bigger than the available
+        memory work too. Adding something to the pool copies the arrays to
+        memory first. Invalid files raise :class:`ValueError`.
+        """
+        with open(path, 'rb') as file:
+            if memory_map:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = file.read()
+
+        if len(data) < _HEADER.size:
+            raise ValueError("the file was not created with NodePool.save()")
+        (magic, byteorder, node_count, child_count, root_count,
+         literal_count) = _HEADER.unpack(data[:_HEADER.size])
+        if magic != _MAGIC:
+            raise ValueError("the file was not created with NodePool.save()")
+        if byteorder.rstrip(b'\0') != sys.byteorder.encode('ascii'):
+            raise ValueError("the file was created on a computer with a "
+                             "different byte order")
+
+        pool = cls()
+        view = memoryview(data)
+        offset = _HEADER.size
+        lengths = [node_count, node_count, node_count + 1, child_count,
+                   root_count]
+        for (attribute, typecode), length in zip(_ARRAYS, lengths):
+            offset = _align(offset)
+            size = length * array.array(typecode).itemsize
+            if offset + size > len(data):
+                raise ValueError("unexpected end of data")
+            if memory_map:
+                setattr(pool, attribute,
+                        view[offset:offset + size].cast(typecode))
+            else:
+                getattr(pool, attribute).frombytes(view[offset:offset + size])
+            offset += size
+        if not memory_map:
+            # __init__ put the first start there already
+            del pool._starts[0]
+        if pool._starts[-1] != child_count:
+            raise ValueError("invalid child offsets")
+
+        reader = _Reader(bytes(view[_align(offset):]))
+        pool._literals = [_read_literal(reader)
+                          for i in range(literal_count)]
+        if reader.position != len(reader.data):
+            raise ValueError("unexpected data after the end")
+        if memory_map:
+            pool._mmap = data
+        return pool
@@ -0,0 +1,314 @@
+"""A small HTTP server for derivatives, simplifications and evaluations.
+
+Import this module like ``import derivater.server``, it's not imported
+automatically with :mod:`derivater`. Run it like this::
+
+    python3 -m derivater.server --port 8000
+
+Then POST JSON to it:
+
+.. code-block:: none
+
+    $ curl -d '{"expr": "x**x", "wrt": "x"}' localhost:8000/derivative
+    {"result": "x**x*(ln(x) + 1)"}
+    $ curl -d '{"expr": "x + x"}' localhost:8000/simplify
+    {"result": "2*x"}
+    $ curl -d '{"expr": "x*y", "values": {"x": 2, "y": 3.5}}' \\
+    >   localhost:8000/evaluate
+    {"result": 7.0}
+
+The expressions are parsed with :func:`derivater.parse`. ``/simplify`` also
+takes an optional ``"method"`` for :func:`derivater.simplify`. Errors give a
+status other than 200 and ``{"error": "message"}``. A computation that takes
+more than ``--time-limit`` seconds gives status 503.
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+
+import derivater
+
+
+# these run in the worker processes
+def _derivative(text, wrt):
+    return repr(derivater.parse(text).derivative(derivater.Symbol(wrt)))
+
+
+def _simplify(text, method):
+    return repr(derivater.simplify(derivater.parse(text), method))
+
+
+def _evaluate(text, values):
+    # values is a tuple of (name, number) pairs, because it must be hashable
+    # NamedConstants have float values, so float() works with them
+    symbols = {name: derivater.NamedConstant(name, float(value))
+               for name, value in values}
+    return float(derivater.parse(text, symbols=symbols))
+
+
+def _run(time_limit, func, *args):
+    try:
+        with derivater.Budget(time=time_limit):
+            return func(*args)
+    except derivater.BudgetExceeded as e:
+        # BudgetExceeded can't be pickled back to the server process
+        raise TimeoutError(str(e)) from None
+
+
+def _job(path, request):
+    # returns (function, args) for the process pool
+    if not isinstance(request, dict) or not isinstance(
+            request.get('expr'), str):
+        raise ValueError('the request must be a JSON object with "expr"')
+
+    if path == '/derivative':
+        if not isinstance(request.get('wrt'), str):
+            raise ValueError('"wrt" must be the name of a variable')
+        return (_derivative, (request['expr'], request['wrt']))
+    if path == '/simplify':
+        method = request.get('method', 'default')
+        if not isinstance(method, str):
+            raise ValueError('"method" must be a string')
+        return (_simplify, (request['expr'], method))
+    if path == '/evaluate':
+        values = request.get('values', {})
+        # bool is a subclass of int, but true and false aren't numbers
+        if not (isinstance(values, dict) and all(
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                for value in values.values())):
+            raise ValueError('"values" must be an object with numbers')
+        return (_evaluate, (request['expr'], tuple(sorted(values.items()))))
+    raise LookupError("unknown path " + path)
+
+
+class _HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_STATUS_TEXTS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class Server:
+    """Serves HTTP on *host* and *port*.
+
+    The symbolic work is done in a
+    :class:`concurrent.futures.ProcessPoolExecutor` with *workers* processes,
+    so that the event loop doesn't get blocked. If a request comes in while
+    an identical request is still being computed, it waits for the same
+    result instead of computing it again. Results are also stored in an LRU
+    cache of *cache_size* results that all clients share. Each computation
+    runs with a :class:`derivater.Budget` of *time_limit* seconds, so that
+    a huge request can't keep a worker busy forever; None means no limit.
+
+    >>> async def main():
+    ...     server = Server(port=0, workers=1)
+    ...     await server.start()
+    ...     reader, writer = await asyncio.open_connection(
+    ...         '127.0.0.1', server.port)
+    ...     body = b'{"expr": "x**x", "wrt": "x"}'
+    ...     writer.write(b'POST /derivative HTTP/1.1\\r\\n'
+    ...                  b'Content-Length: %d\\r\\n\\r\\n%s' % (len(body), body))
+    ...     response = await reader.read()
+    ...     writer.close()
+    ...     await server.close()
+    ...     return response.split(b'\\r\\n\\r\\n')[1]
+    ...
+    >>> asyncio.run(main())
+    b'{"result": "x**x*(ln(x) + 1)"}'
+
+    Port 0 means any free port, and :attr:`port` is the port that was chosen.
+
+    .. attribute:: computed
+                   coalesced
+                   cache_hits
+
+        Numbers of requests that were computed, that waited for an identical
+        request to finish and that were found in the cache.
+    """
+
+    max_body_size = 1024*1024
+
+    def __init__(self, host='127.0.0.1', port=8000, *, workers=None,
+                 cache_size=1024, time_limit=10):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.cache_size = cache_size
+        self.time_limit = time_limit
+        self.computed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._cache = collections.OrderedDict()     # {key: result}
+        self._in_flight = {}                        # {key: future}
+        self._executor = None
+        self._server = None
+
+    async def start(self):
+        """Start the process pool and listening."""
+        # forked processes would get copies of the client sockets, and the
+        # connections wouldn't close until the processes exit
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        else:
+            context = multiprocessing.get_context('spawn')
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=context)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and shut down the process pool."""
+        self._server.close()
+        await self._server.wait_closed()
+        self._executor.shutdown()
+
+    async def serve_forever(self):
+        """Start the server if it's not running, and then run it forever."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def compute(self, path, request):
+        """Return the result for a request without any HTTP stuff.
+
+        *path* is e.g. ``'/derivative'``, and *request* is a dict.
+        """
+        func, args = _job(path, request)
+        key = (path, args)
+        if key in self._cache:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        if key in self._in_flight:
+            self.coalesced += 1
+            # shield because the first request must not get cancelled if
+            # this one gets cancelled
+            return await asyncio.shield(self._in_flight[key])
+
+        self.computed += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, _run, self.time_limit, func, *args)
+        self._in_flight[key] = future
+        # not in a finally clause, because the job keeps running even if
+        # this request gets cancelled, and others can still wait for it
+        future.add_done_callback(lambda future: self._finish(key, future))
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        del self._in_flight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._cache[key] = future.result()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _read_line(self, reader):
+        try:
+            line = await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            # readline() turns LimitOverrunError into ValueError
+            raise _HTTPError(400, "a line of the request is too long")
+        return line.decode('latin-1')
+
+    async def _read_request(self, reader):
+        request_line = await self._read_line(reader)
+        try:
+            method, path, version = request_line.split()
+        except ValueError:
+            raise _HTTPError(400, "invalid request line")
+
+        content_length = 0
+        while True:
+            line = (await self._read_line(reader)).strip()
+            if not line:
+                break
+            name, colon, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    raise _HTTPError(400, "invalid Content-Length")
+
+        if method != 'POST':
+            raise _HTTPError(405, "use POST")
+        if content_length < 0:
+            raise _HTTPError(400, "invalid Content-Length")
+        if content_length > self.max_body_size:
+            raise _HTTPError(413, "the request is too big")
+        try:
+            body = await reader.readexactly(content_length)
+        except asyncio.IncompleteReadError:
+            raise _HTTPError(400, "the request is shorter than Content-Length")
+        try:
+            return (path, json.loads(body.decode('utf-8')))
+        except ValueError:
+            raise _HTTPError(400, "the request is not valid JSON")
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                path, request = await self._read_request(reader)
+                try:
+                    response = {'result': await self.compute(path, request)}
+                except LookupError as e:
+                    raise _HTTPError(404, str(e))
+                except TimeoutError as e:
+                    raise _HTTPError(503, str(e))
+                except (ValueError, TypeError) as e:
+                    raise _HTTPError(400, str(e))
+                except Exception as e:
+                    raise _HTTPError(500, '%s: %s' % (type(e).__name__, e))
+                status = 200
+            except _HTTPError as e:
+                status = e.status
+                response = {'error': str(e)}
+
+            body = json.dumps(response).encode('utf-8')
+            writer.write(
+                b'HTTP/1.1 %d %s\r\n' % (
+                    status, _STATUS_TEXTS[status].encode('ascii')) +
+                b'Content-Type: application/json\r\n' +
+                b'Content-Length: %d\r\n' % len(body) +
+                b'Connection: close\r\n\r\n' + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m derivater.server',
+        description="Serve derivater over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument(
+        '--time-limit', type=float, default=10,
+        help="seconds that one computation may take (default: %(default)s)")
+    args = parser.parse_args()
+
+    server = Server(args.host, args.port, workers=args.workers,
+                    cache_size=args.cache_size, time_limit=args.time_limit)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Find zeros of math objects with Newton's method.
+
+Import this module like ``import derivater.solve``, it's not imported
+automatically with :mod:`derivater`.
+"""
+
+import collections
+import functools
+import numbers
+
+from derivater._base import Symbol, mathify
+from derivater._compile import compile_function, _find_symbols
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+NewtonResult = collections.namedtuple(
+    'NewtonResult', ['roots', 'converged', 'iterations'])
+
+
+# same expression and symbols --> same compiled function, so the symbolic
+# stuff is done only once even if newton() is called many times
+@functools.lru_cache(maxsize=128)
+def _compile_newton(expr, x, others, use_numpy):
+    # the value and the derivative share a lot, so they're compiled together
+    return compile_function(
+        [expr, expr.derivative(x)], (x,) + others, numpy=use_numpy)
+
+
+def _python_newton(func, starts, other_values, tol, max_iterations):
+    roots = []
+    converged = []
+    iterations = []
+    for start, values in zip(starts, other_values):
+        value = float(start)
+        done = False
+        for iteration in range(1, max_iterations + 1):
+            try:
+                residual, slope = func(value, *values)
+                step = residual / slope
+            except (ArithmeticError, ValueError):
+                # e.g. ZeroDivisionError, or ln() of a negative number
+                break
+            value -= step
+            if abs(step) <= tol * (1 + abs(value)):
+                done = True
+                break
+        roots.append(value)
+        converged.append(done)
+        iterations.append(iteration)
+    return NewtonResult(roots, converged, iterations)
+
+
+def _numpy_newton(func, starts, other_values, tol, max_iterations):
+    roots = numpy.array(starts, dtype=float)
+    shape = roots.shape
+    roots = roots.ravel()
+    other_values = [numpy.broadcast_to(value, shape).ravel()
+                    for value in other_values]
+    converged = numpy.zeros(roots.shape, dtype=bool)
+    iterations = numpy.zeros(roots.shape, dtype=int)
+    active = numpy.arange(roots.size)
+
+    for iteration in range(1, max_iterations + 1):
+        if active.size == 0:
+            break
+        value = roots[active]
+        with numpy.errstate(all='ignore'):
+            residual, slope = func(
+                value, *[values[active] for values in other_values])
+            # residual and slope can be floats, e.g. slope of 2*x
+            step = numpy.divide(residual, slope)
+            new_value = value - step
+            done = numpy.abs(step) <= tol * (1 + numpy.abs(new_value))
+        failed = ~numpy.isfinite(new_value)
+
+        # failed points keep their last finite value
+        roots[active] = numpy.where(failed, value, new_value)
+        iterations[active] = iteration
+        converged[active[done]] = True
+        active = active[~(done | failed)]
+
+    return NewtonResult(roots.reshape(shape), converged.reshape(shape),
+                        iterations.reshape(shape))
+
+
+def newton(expr, x, x0, values=None, *, tol=1e-12, max_iterations=50):
+    """Find values of *x* that make *expr* zero.
+
+    >>> import derivater.solve
+    >>> result = derivater.solve.newton(x**2 - 2, x, [1, -1, 10])
+    >>> result.roots
+    [1.4142135623730951, -1.4142135623730951, 1.4142135623730951]
+    >>> result.converged
+    [True, True, True]
+
+    Newton's method starts at each number in *x0*, and moves closer to a zero
+    of *expr* until the step is smaller than ``tol * (1 + abs(x))``. The
+    derivative of *expr* is calculated once, and *expr* and its derivative are
+    compiled together with :func:`.compile_function`. The compiled functions
+    are cached, so calling this again with the same *expr* is fast.
+
+    If *expr* contains other symbols than *x*, *values* must be a dict that
+    maps them (or their names) to numbers. If *x0* is a list, the values can
+    also be lists with a value for each number in *x0*, and with NumPy, they
+    can be arrays of any shape that NumPy can broadcast to the shape of *x0*.
+
+    The result is a ``NewtonResult`` namedtuple with these attributes:
+
+    * ``roots``: the values of *x* where the iterations stopped.
+    * ``converged``: True for each root that was found, and False if the
+      iterations ran out or something failed, e.g. the derivative was zero.
+    * ``iterations``: the number of iterations for each root.
+
+    If NumPy is installed and *x0* is a NumPy array, the attributes are NumPy
+    arrays of the same shape, and the calculations are done with arrays. Each
+    iteration calculates only the points that haven't converged yet. Without
+    NumPy, the points are calculated one by one. If *x0* is a number, the
+    attributes are a float, a bool and an int.
+    """
+    if not isinstance(x, Symbol):
+        raise TypeError("expected a Symbol, got %r" % (x,))
+    if max_iterations < 1:
+        raise ValueError("max_iterations must be positive")
+    expr = mathify(expr)
+
+    values_by_name = {}
+    for symbol, value in (values or {}).items():
+        name = symbol.name if isinstance(symbol, Symbol) else symbol
+        values_by_name[name] = value
+    others = tuple(sorted(_find_symbols(expr) - {x}, key=(lambda s: s.name)))
+    missing = [symbol.name for symbol in others
+               if symbol.name not in values_by_name]
+    if missing:
+        raise ValueError("no value for %s was given" % ', '.join(missing))
+    other_values = [values_by_name[symbol.name] for symbol in others]
+
+    if numpy is not None and isinstance(x0, numpy.ndarray):
+        func = _compile_newton(expr, x, others, True)
+        return _numpy_newton(func, x0, other_values, tol, max_iterations)
+
+    func = _compile_newton(expr, x, others, False)
+    if isinstance(x0, numbers.Real):
+        result = _python_newton(func, [x0], [other_values], tol,
+                                max_iterations)
+        return NewtonResult(*(items[0] for items in result))
+
+    x0 = list(x0)
+    other_values = [
+        [value[index] if isinstance(value, (list, tuple)) else value
+         for value in other_values]
+        for index in range(len(x0))]
+    return _python_newton(func, x0, other_values, tol, max_iterations)
@@ -1,9 +1,12 @@
 import functools
+import random
+import threading
 
 import pytest
 
 from derivater import (eq_and_hash, MathObject, Symbol, SymbolFunction,
-                       Add, Mul, Pow, mathify, ln)
+                       Add, Mul, Pow, mathify, ln, sin, collect_stats)
+from derivater import _printer
 from derivater.__main__ import x, y, z, a, b, f, g, f_, g_, half
 
 h = functools.partial(SymbolFunction, 'h')
@@ -12,17 +15,32 @@ h_ = functools.partial(h, derivative_count=1)
 
 def test_minus():
     assert isinstance(-x, Mul)
-    assert (-x).objects == [mathify(-1), x]
+    assert (-x).objects == (mathify(-1), x)
     assert -(-x) == x
 
     assert isinstance(x-y, Add)
-    assert (x-y).objects == [x, -y]
+    assert (x-y).objects == (x, -y)
 
 
 def equal(a, b):
     return a == b and hash(a) == hash(b)
 
 
+def test_canonical_order():
+    assert Add([y, x, 1]).objects == (x, y, mathify(1))
+    assert Mul([y, x, 2]).objects == (mathify(2), x, y)
+    assert equal(Add([x, y]), Add([y, x]))
+    assert repr(Add([x, y])) == repr(Add([y, x])) == 'x + y'
+
+    # x**2 and 2*x are sorted next to x
+    assert Add([y, x**2, 2*x, x]).objects == (x, 2*x, x**2, y)
+    assert repr(y + x**2 + 2*x + 3) == '2*x + x**2 + y + 3'
+
+    # the number of times something is added matters
+    assert Add([x, x, y]) != Add([x, y, y])
+    assert Add([x, x]) != Add([x])
+
+
 def test_eq_and_hash_usage():
     assert equal(x+y+z, z+y+x)
     assert equal(x-y-z, -z-y+x)
@@ -35,6 +53,7 @@ def test_add_repr():
     assert repr(x+y) == 'x + y'
     assert repr(x-y) == 'x - y'
     assert repr(-x-y) == '-x - y'
+    assert repr(x - (y - 1)) == 'x - (y - 1)'
 
     assert repr(Add([])) == '0'
     assert repr(Add([-x])) == '-x'
@@ -45,7 +64,7 @@ def test_mul_repr():
     assert repr(-x) == '-x'
     assert repr(2*x) == '2*x'
     assert repr(-2*x) == '-2*x'
-    assert repr((x + y)*z) == '(x + y)*z'
+    assert repr((x + y)*z) == 'z*(x + y)'
     assert repr((x + y)/z) == '(x + y) / z'
     assert repr(Mul([1/x, 1/y])) == '1 / (x*y)'
 
@@ -54,6 +73,29 @@ def test_mul_repr():
     assert repr(Mul([1/x])) == repr(1/x) == '1 / x'
     assert repr(Mul([Pow(x/y, -2)])) == '1 / (x**2 / y**2)'
 
+    # 1/(x + 1/2) is gentle_simplified to (2*x + 1)/2, and the denominators
+    # are sorted again after inverting them
+    assert repr(half / (x + half)) == '1 / (2*(2*x + 1) / 2)'
+    assert repr(y / (2*x + 4) / z) == 'y / (z*2*(x + 2))'
+    assert (repr(y / ((2*x + 1)/2 - 2*y/(x + 2))) ==
+            'y / ((2*x - 4*y / (x + 2) + 1) / 2)')
+
+
+def test_repr_threads():
+    exprs = [(x + y + i)**i / (z - i) for i in range(2, 50)]
+    expected = list(map(repr, exprs))
+    results = []
+
+    def print_all():
+        results.append(list(map(repr, exprs)))
+
+    threads = [threading.Thread(target=print_all) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [expected]*4
+
 
 class Toot(MathObject):
 
@@ -88,6 +130,58 @@ def test_pow_repr():
     assert repr(thing2) == '1 / (2*T)'
 
 
+def test_repr_creates_nothing():
+    thing = -(x + 2*y)**(-3*z) / (3*sin(x)**2) - x/(x + y) + (x*y)**-half
+    with collect_stats() as stats:
+        string = repr(thing)
+    assert string == ('1 / (x**(1 / 2)*y**(1 / 2)) - x / (x + y) - '
+                      '1 / (3*(sin(x))**2*(x + 2*y)**(3*z))')
+    assert not stats.allocations
+
+
+def _random_expr(rng, depth):
+    if depth == 0:
+        return rng.choice([x, y, mathify(2), mathify(-3), half, x/3, sin(y)])
+    left = _random_expr(rng, depth - 1)
+    right = _random_expr(rng, depth - 1)
+    operation = rng.choice('+-*/^')
+    if operation == '+':
+        return left + right
+    if operation == '-':
+        return left - right
+    if operation == '*':
+        return left * right
+    if operation == '/':
+        return left if right == 0 else left / right
+    return left ** rng.choice([2, -1, -3, half, -half, y, -y])
+
+
+def test_repr_same_as_building(monkeypatch):
+    rng = random.Random(123)
+    # denominators whose coefficients come out of nested Adds or add up to 0
+    exprs = [y / ((2*x + 1)/2 - 2*y/(x + 2)), y / (x/2 - z/2)]
+    while len(exprs) < 302:
+        try:
+            exprs.append(_random_expr(rng, rng.randint(1, 3)))
+        except ZeroDivisionError:
+            pass
+
+    with collect_stats() as stats:
+        strings = list(map(repr, exprs))
+    assert not stats.allocations
+
+    # the old way to print: -obj and 1/obj everywhere
+    monkeypatch.setattr(_printer, 'print_object', _printer._building_repr)
+    assert strings == list(map(repr, exprs))
+
+
+def test_deep_repr():
+    deep = x
+    for i in range(3000):   # more than sys.getrecursionlimit()
+        deep = Add([Mul([-2, deep]), y])
+    assert repr(deep).startswith('y - 2*(y - 2*(y - 2*(')
+
+
 @eq_and_hash({'gentle': None})
 class Thing(MathObject):
 
@@ -99,13 +193,14 @@ class Thing(MathObject):
 
 
 def test_automagic_gentle_simplify():
-    assert (Thing() + x).objects[0].gentle
-    assert (Thing() * x).objects[0].gentle
+    # Things are sorted after Symbols
+    assert (Thing() + x).objects[-1].gentle
+    assert (Thing() * x).objects[-1].gentle
     assert (Thing() ** x).base.gentle
     assert (x ** Thing()).exponent.gentle
 
-    assert not Add([Thing(), x]).objects[0].gentle
-    assert not Mul([Thing(), x]).objects[0].gentle
+    assert not Add([Thing(), x]).objects[-1].gentle
+    assert not Mul([Thing(), x]).objects[-1].gentle
     assert not Pow(Thing(), x).base.gentle
     assert not Pow(x, Thing()).exponent.gentle
 
@@ -120,6 +215,10 @@ def test_with_fraction_coeff():
         mathify(2)/15, 5*x+6*y)
     assert Add([]).with_fraction_coeff() == (mathify(1), Add([]))
 
+    assert Pow(3, half).with_fraction_coeff() == (mathify(1), Pow(3, half))
+    assert (3*Pow(3, half)).with_fraction_coeff() == (
+        mathify(3), Pow(3, half))
+
 
 def test_add_gentle_simplify():
     assert Add([x, y, Thing()]).gentle_simplify() == Add([x, y, Thing(True)])
@@ -134,7 +233,7 @@ def test_add_gentle_simplify():
     assert Add([2*x, -2*x]).gentle_simplify() == mathify(0)
     assert Add([]).gentle_simplify() == mathify(0)
 
-    assert Add([2, x, half]).gentle_simplify().objects == [x, half*5]
+    assert Add([2, x, half]).gentle_simplify().objects == (x, half*5)
     assert Add([3*x, half*x]).gentle_simplify() == half*7*x
 
     # these were broken in old derivater versions
@@ -199,20 +298,20 @@ def test_pow_gentle_simplify():
 
 
 def test_add_partial_replaces():
-    # this checks .objects to make sure the order is correct
-    assert Add([x, y, z]).replace(Add([x, y]), a).objects == [a, z]
-    assert Add([x, y, z]).replace(Add([y, x]), a).objects == [a, z]
-    assert Add([x, y, z]).replace(Add([y, z]), a).objects == [x, a]
-    assert Add([x, y, z]).replace(Add([z, y]), a).objects == [x, a]
-    assert Add([x, y, z]).replace(Add([x, z]), a).objects == [y, a]
-    assert Add([x, y, z]).replace(Add([z, x]), a).objects == [a, y]
-
-    assert Mul([x, y, z]).replace(Mul([x, y]), a).objects == [a, z]
-    assert Mul([x, y, z]).replace(Mul([y, x]), a).objects == [a, z]
-    assert Mul([x, y, z]).replace(Mul([y, z]), a).objects == [x, a]
-    assert Mul([x, y, z]).replace(Mul([z, y]), a).objects == [x, a]
-    assert Mul([x, y, z]).replace(Mul([x, z]), a).objects == [y, a]
-    assert Mul([x, y, z]).replace(Mul([z, x]), a).objects == [a, y]
+    # the objects are sorted, no matter where the replacing happened
+    assert Add([x, y, z]).replace(Add([x, y]), a).objects == (a, z)
+    assert Add([x, y, z]).replace(Add([y, x]), a).objects == (a, z)
+    assert Add([x, y, z]).replace(Add([y, z]), a).objects == (a, x)
+    assert Add([x, y, z]).replace(Add([z, y]), a).objects == (a, x)
+    assert Add([x, y, z]).replace(Add([x, z]), a).objects == (a, y)
+    assert Add([x, y, z]).replace(Add([z, x]), a).objects == (a, y)
+
+    assert Mul([x, y, z]).replace(Mul([x, y]), a).objects == (a, z)
+    assert Mul([x, y, z]).replace(Mul([y, x]), a).objects == (a, z)
+    assert Mul([x, y, z]).replace(Mul([y, z]), a).objects == (a, x)
+    assert Mul([x, y, z]).replace(Mul([z, y]), a).objects == (a, x)
+    assert Mul([x, y, z]).replace(Mul([x, z]), a).objects == (a, y)
+    assert Mul([x, y, z]).replace(Mul([z, x]), a).objects == (a, y)
 
     for klass, name, instead in [(Add, 'Add', 'zeros'), (Mul, 'Mul', 'ones')]:
         with pytest.raises(ValueError,
@@ -223,8 +322,8 @@ def test_add_partial_replaces():
             klass([x, y]).replace(klass([]), z)
 
     # make sure that gentle_simplify() is not called
-    assert not Add([x, y, z]).replace(x+y, Thing()).objects[0].gentle
-    assert not Mul([x, y, z]).replace(x*y, Thing()).objects[0].gentle
+    assert not Add([x, y, z]).replace(x+y, Thing()).objects[-1].gentle
+    assert not Mul([x, y, z]).replace(x*y, Thing()).objects[-1].gentle
 
     # even -x which is Mul([-1, x]) doesn't turn into Integer(-1), instead it
     # turns into Mul([-1, 1]) which looks a lot like Integer(-1) ...  (lol)
@@ -240,3 +339,12 @@ def test_derivatives():
         f(x)**g(x) * (g_(x)*ln(f(x)) + g(x)*f_(x)/f(x)))
     assert (f(x)**a).derivative(x) == a*f(x)**(a-1)*f_(x)
     assert (a**f(x)).derivative(x) == a**f(x)*ln(a)*f_(x)
+    assert (f(x)**half).derivative(x) == half*f(x)**(-half)*f_(x)
+    assert (f(x)**-3).derivative(x) == -3*f(x)**-4*f_(x)
+    assert (f(y)**g(x)).derivative(x) == f(y)**g(x)*ln(f(y))*g_(x)
+    assert (f(y)**g(y)).derivative(x) == mathify(0)
+    assert (f(y)**3).derivative(x) == mathify(0)
+
+    assert Pow(Pow(x, 2), 3).derivative(x) == 6*x**5
+    assert (x**x**x).derivative(x) == x**x**x * (
+        x**(x - 1) + x**x*ln(x)*(ln(x) + 1))
@@ -0,0 +1,25 @@
+import concurrent.futures
+
+from derivater import e, tau, sin, ln
+from derivater.batch import derivative_many
+from derivater.__main__ import x, y, f
+
+
+def test_derivative_many():
+    exprs = [x**n * sin(y*x) + ln(n*x) for n in range(1, 30)]
+    exprs.append(f(e**x))
+    expected = [expr.derivative(x) for expr in exprs]
+
+    assert derivative_many(exprs, x, workers=1) == expected
+    assert derivative_many(exprs, x, workers=3, chunksize=4) == expected
+    assert derivative_many([], x, workers=3) == []
+
+    # e must be the usual e after coming from another process
+    results = derivative_many([e**x + tau, e**x], x, workers=2, chunksize=1)
+    assert results[0].base is e
+
+
+def test_executor():
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        assert derivative_many([x**2]*5, x, executor=executor,
+                               chunksize=2) == [2*x]*5
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+import derivater._stats
+from derivater import (Budget, BudgetExceeded, simplify, trig_simplify,
+                       sin, cos, tan, mathify, Add)
+from derivater.__main__ import x, y
+
+
+def test_limits():
+    for kwargs, message in [
+            ({'steps': 10}, "more than 10 rewrite steps"),
+            ({'nodes': 10}, "more than 10 nodes created"),
+            ({'time': 0}, "more than 0 seconds elapsed")]:
+        budget = Budget(**kwargs)
+        with pytest.raises(BudgetExceeded, match='^%s$' % message) as error:
+            with budget:
+                (x**x**x).derivative(x)
+        assert error.value.budget is budget
+
+    with Budget(steps=1000, nodes=1000, time=60) as budget:
+        assert (x*y).derivative(x) == y
+    assert 0 < budget.steps_used < 1000
+    assert 0 < budget.nodes_used < 1000
+    assert repr(budget) == 'Budget(time=60, nodes=1000, steps=1000)'
+
+
+def test_nesting():
+    outer = Budget(steps=1000)
+    with outer:
+        with Budget(steps=1000) as inner:
+            (x**3).derivative(x)
+        assert outer.steps_used == inner.steps_used > 0
+
+    with pytest.raises(BudgetExceeded) as error:
+        with Budget(steps=10) as outer:
+            with Budget(steps=1000):
+                (x**x**x).derivative(x)
+    assert error.value.budget is outer
+
+
+def test_best_so_far():
+    thing = sin(x)**2 + cos(x)**2 + tan(x)
+    assert trig_simplify(thing, budget=Budget(steps=0)) == thing
+    assert trig_simplify(thing, budget=Budget(steps=1000)) == tan(x) + 1
+    with pytest.raises(BudgetExceeded):
+        trig_simplify(thing, budget=Budget(steps=0, raise_error=True))
+
+    assert simplify(Add([x, x]), budget=Budget(steps=1000)) == 2*x
+    assert simplify(Add([x, x]), budget=Budget(steps=0)) == Add([x, x])
+    assert simplify(thing - tan(x), method='egraph',
+                    budget=Budget(steps=0)) == thing - tan(x)
+    assert simplify(thing - tan(x), method='egraph',
+                    budget=Budget(steps=100000)) == mathify(1)
+
+    # an outer budget running out is not handled by an inner function
+    with pytest.raises(BudgetExceeded):
+        with Budget(steps=0):
+            trig_simplify(thing, budget=Budget(steps=1000))
+
+
+def test_best_so_far_is_smallest():
+    # the first step converts tan(x) to sin(x)/cos(x), which is bigger
+    thing = tan(x) + sin(x)**2 + cos(x)**2
+    results = {trig_simplify(thing, budget=Budget(steps=steps))
+               for steps in range(0, 1000, 20)}
+    assert results == {thing, sin(x)/cos(x) + 1, tan(x) + 1}
+
+
+def test_no_sizes_without_budget(monkeypatch):
+    def tree_size(*args):
+        raise AssertionError("sizes are needed only with a budget")
+
+    monkeypatch.setattr(derivater._stats, 'tree_size', tree_size)
+    assert trig_simplify(tan(x) + sin(x)**2 + cos(x)**2) == tan(x) + 1
+
+
+def test_threads():
+    # a budget in one thread must not stop what another thread is doing
+    started = threading.Event()
+    finished = threading.Event()
+    errors = []
+
+    def other_thread():
+        started.wait()
+        try:
+            for i in range(20):
+                (x**x**x).derivative(x)
+        except BudgetExceeded as e:
+            errors.append(e)
+        finished.set()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    with pytest.raises(BudgetExceeded):
+        with Budget(steps=0) as budget:
+            started.set()
+            finished.wait()
+            (x**x).derivative(x)
+    thread.join()
+    assert not errors
@@ -0,0 +1,104 @@
+import multiprocessing
+
+from derivater import sin, cos, e, mathify
+from derivater.cache import DiskCache
+from derivater.__main__ import x, y
+
+
+def test_hits_and_misses(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with DiskCache(path) as cache:
+        assert cache.derivative(e**(x*y), x) == y*e**(x*y)
+        assert cache.derivative(e**(x*y), y) == x*e**(x*y)
+        assert cache.trig_simplify(sin(x)**2 + cos(x)**2) == mathify(1)
+        assert (cache.hits, cache.misses) == (0, 3)
+
+    with DiskCache(path) as cache:
+        result = cache.derivative(e**(x*y), x)
+        assert result == y*e**(x*y)     # NamedConstants compare by identity
+        assert cache.trig_simplify(sin(x)**2 + cos(x)**2) == mathify(1)
+        assert cache.simplify(x + x) == 2*x
+        assert (cache.hits, cache.misses) == (2, 1)
+
+        cache.clear()
+        cache.derivative(e**(x*y), x)
+        assert cache.misses == 2
+
+
+def test_eviction(tmp_path):
+    with DiskCache(str(tmp_path / 'cache.sqlite'), max_bytes=200) as cache:
+        for n in range(20):
+            cache.derivative(x**n, x)
+        [[total]] = cache._connection.execute(
+            'SELECT SUM(LENGTH(value)) FROM results')
+        assert total <= 200
+
+        # the most recently used ones are still there
+        cache.derivative(x**19, x)
+        assert cache.hits == 1
+        cache.derivative(x**0, x)
+        assert cache.hits == 1
+
+
+def _total_bytes(cache):
+    [[tracked]] = cache._connection.execute(
+        "SELECT value FROM metadata WHERE name = 'total_bytes'")
+    [[actual]] = cache._connection.execute(
+        'SELECT COALESCE(SUM(LENGTH(value)), 0) FROM results')
+    assert tracked == actual
+    return tracked
+
+
+def test_total_bytes(tmp_path):
+    with DiskCache(str(tmp_path / 'cache.sqlite'), max_bytes=300) as cache:
+        for n in range(20):
+            cache.derivative(x**n, x)
+            assert 0 < _total_bytes(cache) <= 300
+
+        key = cache._key('derivative ' + repr(x), x**19)
+        cache._store(key, mathify(123))     # replaces existing row
+        _total_bytes(cache)
+
+        cache.clear()
+        assert _total_bytes(cache) == 0
+
+
+def test_batched_touches(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with DiskCache(path) as cache:
+        cache.derivative(sin(x), x)
+        with cache._connection:
+            cache._connection.execute('UPDATE results SET last_used = 0')
+
+    with DiskCache(path, touch_batch=3) as cache:
+        cache.derivative(sin(x), x)
+        cache.derivative(sin(x), x)
+        assert cache._connection.execute(
+            'SELECT last_used FROM results').fetchall() == [(0,)]
+        cache.derivative(sin(x), x)
+        [[last_used]] = cache._connection.execute(
+            'SELECT last_used FROM results')
+        assert last_used > 0
+        assert cache.hits == 3
+
+
+def _fill(path, start):
+    with DiskCache(path) as cache:
+        for n in range(start, start + 20):
+            cache.derivative(sin(n*x), x)
+
+
+def test_many_processes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    processes = [multiprocessing.Process(target=_fill, args=(path, start))
+                 for start in [0, 10, 20]]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    with DiskCache(path) as cache:
+        for n in range(40):
+            assert cache.derivative(sin(n*x), x) == n*cos(n*x)
+        assert cache.misses == 0
@@ -0,0 +1,42 @@
+import io
+import subprocess
+import sys
+
+from derivater._cli import main
+
+
+def run(args, input_text):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = main(args, io.StringIO(input_text), stdout, stderr)
+    return (status, stdout.getvalue(), stderr.getvalue())
+
+
+def test_diff_and_simplify():
+    assert run(['diff', '--wrt', 'x'], 'x**x\nsin(x)*y\n\n') == (
+        0, 'x**x*(ln(x) + 1)\ny*cos(x)\n\n', '')
+    assert run(['simplify'], 'x + x\n') == (0, '2*x\n', '')
+    assert run(['trig_simplify'], 'sin(x)**2 + cos(x)**2\n') == (0, '1\n', '')
+
+
+def test_errors():
+    status, output, errors = run(['diff', '--wrt', 'x'], 'x**2\n(x\nx\n')
+    assert status == 1
+    assert output == '2*x\n\n1\n'
+    assert errors == ("line 2: ValueError: expected ')' at position 2 "
+                      "of '(x'\n")
+
+
+def test_workers():
+    lines = ''.join('%d*x**2 + sin(x)\n' % n for n in range(1, 50))
+    expected = ''.join('%d*x + cos(x)\n' % (2*n) for n in range(1, 50))
+    assert run(['diff', '--wrt', 'x', '--workers', '3', '--chunksize', '4'],
+               lines) == (0, expected, '')
+
+
+def test_python_m(tmp_path):
+    path = tmp_path / 'input.txt'
+    path.write_text('x*y\n')
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'derivater', 'diff', '--wrt', 'y', str(path)])
+    assert output.decode('ascii').splitlines() == ['x']
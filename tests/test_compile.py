@@ -0,0 +1,160 @@
+import fractions
+import math
+import random
+
+import pytest
+
+from derivater import (NamedConstant, mathify, compile_function, specialize,
+                       evalf, e, pi, sqrt, ln, sin, cos, tan, asin, acos,
+                       atan)
+from derivater.__main__ import a, b, f, x, y
+
+
+def test_random_points():
+    rng = random.Random(123)
+    k = NamedConstant('k', 0.5)
+    for expr in [x**2 - x, sin(x)*cos(y), tan(x/3), atan(x*y) + e**x,
+                 asin(x/4) - acos(y/4), sqrt(x**2 + 1)*ln(y**2 + 1),
+                 y**x - k*y**(-3) + pi, (y**y).derivative(y), 1/x + x**(-2)]:
+        func = compile_function(expr, [x, y])
+        for i in range(20):
+            xval = rng.uniform(0.1, 3)
+            yval = rng.uniform(0.1, 3)
+            expected = float(evalf(expr, {x: xval, y: yval}))
+            assert func(xval, yval) == pytest.approx(expected, rel=1e-12)
+
+
+def test_sharing_and_multiple_results():
+    func = compile_function([sin(x**2), cos(x**2)], [x])
+    assert func.source.count('x * x') == 1
+    assert func(1.5) == (math.sin(1.5**2), math.cos(1.5**2))
+
+    func = compile_function([x + y], [x, y])
+    assert func(1, 2) == (3,)
+    assert compile_function((), [])() == ()
+
+
+def test_constants_folded():
+    func = compile_function(x + sqrt(2)*pi, [x])
+    assert '_math' not in func.source
+    assert func(1) == pytest.approx(1 + math.sqrt(2)*math.pi)
+
+
+def test_negative_bases():
+    assert compile_function(x**3, [x])(-2) == -8
+    assert compile_function(1/x, [x])(-4) == -0.25
+    with pytest.raises(ValueError):
+        compile_function(x**pi, [x])(-1)
+    # odd exponent that doesn't fit in 20 significant digits
+    assert compile_function(x**(10**21 + 1), [x])(-1) == -1
+
+
+def test_polynomials():
+    rng = random.Random(456)
+    for expr in [3*x**4 - 2*x**3 + x**2 - 7*x + 1, a*x**2 + b*x + y,
+                 x**5 + x**3 + x, a*x**2*y + b*x*y**2 + x*y,
+                 (x**3 - 2*y*x**2 + x*y**2).derivative(x),
+                 x**6 + sin(x**6) + 1/x**2, (x + y)**3, x**20 - x**-7]:
+        func = compile_function(expr, [x, y, a, b])
+        for i in range(20):
+            values = [rng.uniform(-3, 3) for i in range(4)]
+            expected = float(evalf(expr, dict(zip([x, y, a, b], values))))
+            assert func(*values) == pytest.approx(expected, rel=1e-12)
+
+
+def test_horner_and_power_chains():
+    func = compile_function(3*x**4 - 2*x**3 + x**2 - 7*x + 1, [x])
+    assert func.source.count('*') == 4
+    assert func(2) == 3*16 - 2*8 + 4 - 14 + 1
+
+    # powers of the same base are calculated once and reused
+    func = compile_function([x**2 + y, x**3*y, x**4], [x, y])
+    assert '**' not in func.source
+    assert func.source.count('*') == 4
+    assert func(2, 3) == (7, 24, 16)
+
+    # this would be a long chain of multiplications
+    assert 'x ** 23' in compile_function(x**23, [x]).source
+
+
+def test_stable_forms():
+    tiny = 1e-12
+    for expr, expected, name in [
+            (e**x - 1, math.expm1(tiny), 'expm1'),
+            (ln(1 + x), math.log1p(tiny), 'log1p'),
+            (e**x - 1 + x, math.expm1(tiny) + tiny, 'expm1')]:
+        func = compile_function(expr, [x])
+        assert name in func.source
+        assert func(tiny) == pytest.approx(expected, rel=1e-15)
+
+    # would overflow with x**2 + y**2
+    func = compile_function(sqrt(x**2 + y**2), [x, y])
+    assert func(3e200, 4e200) == pytest.approx(5e200)
+    func = compile_function(1/sqrt(x**2 + y**2 + 3), [x, y])
+    assert 'hypot' in func.source
+    assert func(1, 2) == pytest.approx(1/math.sqrt(8))
+
+    # not the right shapes
+    for expr in [e**x - 2, ln(2 + x), sqrt(x**2 - y**2), sqrt(x**2 + y)]:
+        source = compile_function(expr, [x, y]).source
+        assert not any(name in source
+                       for name in ['expm1', 'log1p', 'hypot'])
+
+
+def test_errors():
+    with pytest.raises(TypeError):
+        compile_function(f(x), [x])
+    with pytest.raises(TypeError):
+        compile_function(x, ['x'])
+    with pytest.raises(ValueError):
+        compile_function(x + y, [x])
+
+
+def test_deep_nesting():
+    expr = x
+    for i in range(200):
+        expr = sin(expr)
+    func = compile_function(expr, [x])
+
+    value = 0.5
+    for i in range(200):
+        value = math.sin(value)
+    assert func(0.5) == pytest.approx(value)
+
+
+def test_specialize():
+    expr = a*x**2 + b*x
+    reduced, func = specialize(expr, {a: 2, b: fractions.Fraction(1, 3)})
+    assert reduced == 2*x**2 + x/3
+    assert func(3) == 19
+
+    reduced, func = specialize(expr + y, {b: 1, y: mathify(1)/2})
+    assert reduced == a*x**2 + x + mathify(1)/2
+    assert func(2, 3) == 2*3**2 + 3.5      # a comes first alphabetically
+    reduced, func = specialize(expr, {b: 1}, symbols=[x, a])
+    assert func(3, 2) == 21
+
+    reduced, func = specialize(expr, {a: 0.1, b: 0})
+    assert isinstance(reduced.objects[0], NamedConstant)
+    assert func(3) == pytest.approx(0.9)
+
+    with pytest.raises(TypeError):
+        specialize(expr, {'a': 1})
+
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    expr = sin(x)*e**y + x**(mathify(1)/3)
+    func = compile_function(expr, [x, y], numpy=True)
+    xs = numpy.linspace(0.1, 2, 10)
+    ys = numpy.linspace(-1, 1, 10)
+    expected = [float(evalf(expr, {x: float(xv), y: float(yv)}))
+                for xv, yv in zip(xs, ys)]
+    assert func(xs, ys) == pytest.approx(expected)
+
+    func = compile_function(
+        [e**x - 1, ln(1 + x), sqrt(x**2 + y**2 + 4)], [x, y], numpy=True)
+    for result, expected in zip(func(xs, ys), [
+            numpy.expm1(xs), numpy.log1p(xs),
+            numpy.sqrt(xs**2 + ys**2 + 4)]):
+        assert result == pytest.approx(expected)
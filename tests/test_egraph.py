@@ -0,0 +1,65 @@
+import pytest
+
+from derivater import (simplify, egraph_simplify, mathify, sin, cos, tan, ln,
+                       e)
+from derivater._egraph import _EGraph, _compute_costs, _size_cost, _extract
+from derivater._trig import Sine
+from derivater.__main__ import x, y
+
+
+def test_identities():
+    assert egraph_simplify(sin(x)**2 + cos(x)**2) == mathify(1)
+    assert egraph_simplify(1 - sin(x)**2) == cos(x)**2
+    assert egraph_simplify(sin(x)**2*y + cos(x)**2*y) == y
+    assert egraph_simplify(tan(x)*cos(x)) == sin(x)
+    assert egraph_simplify(sin(x)/cos(x)) == tan(x)
+    assert egraph_simplify(2*sin(x)*cos(x)) == sin(2*x)
+    assert egraph_simplify(ln(x*y) - ln(x)) == ln(y)
+    assert egraph_simplify(e**ln(x)) == x
+
+    # already as simple as it gets
+    assert egraph_simplify(x + y) == x + y
+    assert egraph_simplify(x) == x
+    assert egraph_simplify(2) == mathify(2)
+
+
+def test_cost_models():
+    thing = (sin(x)/cos(x)).derivative(x)
+    assert egraph_simplify(thing, cost='size') == tan(x)**2 + 1
+    assert egraph_simplify(thing, cost='ops') == tan(x)**2 + 1
+    with pytest.raises(ValueError, match="^unknown cost model 'lol'$"):
+        egraph_simplify(x, cost='lol')
+
+
+def test_limits():
+    # no iterations means that no rules are applied
+    thing = sin(x)**2 + cos(x)**2
+    assert egraph_simplify(thing, iteration_limit=0) == thing
+    assert egraph_simplify(thing, node_limit=0) == thing
+    assert egraph_simplify(thing, time_limit=0) == thing
+
+
+def test_simplify_function():
+    assert simplify(x + x) == 2*x
+    assert simplify(sin(x)**2 + cos(x)**2, method='egraph') == mathify(1)
+    assert simplify(tan(x)*cos(x), method='egraph',
+                    cost='ops', iteration_limit=5) == sin(x)
+    with pytest.raises(ValueError, match="^unknown simplify method 'lol'$"):
+        simplify(x, method='lol')
+    with pytest.raises(TypeError):
+        simplify(x, cost='ops')
+
+
+def test_deep_nesting():
+    # Sine() doesn't simplify, and sin() would recurse
+    obj = x
+    for i in range(5000):
+        obj = Sine(obj)
+    graph = _EGraph()
+    root = graph.add(obj)
+    best = _compute_costs(graph, _size_cost)
+    result = _extract(graph, best, root)
+    for i in range(5000):
+        assert type(result) is Sine
+        result = result.arg
+    assert result == x
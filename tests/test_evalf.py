@@ -0,0 +1,77 @@
+import fractions
+import math
+from decimal import Decimal
+
+import pytest
+
+from derivater import (NamedConstant, mathify, evalf, e, pi, tau,
+                       sqrt, ln, sin, cos, tan, asin, acos, atan)
+from derivater.__main__ import f, x, y
+
+
+# from https://oeis.org/A000796 and https://oeis.org/A001113
+PI_100 = ('3.14159265358979323846264338327950288419716939937510'
+          '58209749445923078164062862089986280348253421170679')
+E_100 = ('2.71828182845904523536028747135266249775724709369995'
+         '95749669676277240766303535475945713821785251664274')
+
+
+def test_constants():
+    assert str(evalf(pi, prec=110)).startswith(PI_100)
+    assert str(evalf(e, prec=110)).startswith(E_100)
+    assert evalf(tau, prec=20) == Decimal('6.2831853071795864769')
+    assert evalf(pi, prec=5) == Decimal('3.1416')
+    assert evalf(NamedConstant('k', 0.5)) == Decimal('0.5')
+
+
+def test_exact():
+    assert evalf(mathify(1)/3, prec=10) == Decimal('0.3333333333')
+    assert evalf(x/3 + y, {x: 1, 'y': fractions.Fraction(2, 3)}) == 1
+    assert evalf(x**2, {x: 0.5}) == Decimal('0.25')
+    assert evalf(sqrt(x), {x: 4}) == 2
+    assert evalf(x**-2, {x: -2}) == Decimal('0.25')
+    assert evalf(x, {x: Decimal('1.5')}) == Decimal('1.5')
+    assert evalf(x*y, {x: 2, y: pi}) == evalf(tau)
+
+
+def test_functions():
+    for value in [-7.0, -0.5, 0.3, 1.0, 2.5, 1e6]:
+        for func, math_func in [(sin, math.sin), (cos, math.cos),
+                                (tan, math.tan), (atan, math.atan)]:
+            assert float(evalf(func(x), {x: value})) == pytest.approx(
+                math_func(value), rel=1e-15, abs=1e-15)
+    for value in [-1, -0.5, 0, 0.3, 1]:
+        for func, math_func in [(asin, math.asin), (acos, math.acos)]:
+            assert float(evalf(func(x), {x: value})) == pytest.approx(
+                math_func(value), rel=1e-15, abs=1e-15)
+    assert float(evalf(ln(x) + x**x + e**x, {x: 2.5})) == pytest.approx(
+        math.log(2.5) + 2.5**2.5 + math.exp(2.5))
+
+    assert evalf(cos(pi/3)) == Decimal('0.5')
+    assert abs(evalf(sin(pi))) < Decimal('1e-50')
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='^no value for y was given$'):
+        evalf(x + y, {x: 1})
+    with pytest.raises(TypeError, match=r"^cannot evaluate f\(x\)$"):
+        evalf(f(x), {x: 1})
+    with pytest.raises(TypeError):
+        evalf(x, {x: 'lol'})
+    with pytest.raises(ValueError):
+        evalf(ln(x), {x: -1})
+    with pytest.raises(ValueError):
+        evalf(asin(x), {x: 2})
+    with pytest.raises(ValueError):
+        evalf(sqrt(x), {x: -1})
+    with pytest.raises(ZeroDivisionError):
+        evalf(1/x, {x: 0})
+
+
+def test_constant_parts_are_cached():
+    constant = ln(pi + 2)
+    expr = x*constant
+    assert evalf(expr, {x: 1}, prec=20) == evalf(constant, prec=20)
+    assert constant._cached_evalf[0] == 30
+    assert not hasattr(expr, '_cached_evalf')
+    assert evalf(expr, {x: 2}, prec=20) == 2*evalf(constant, prec=20)
@@ -0,0 +1,35 @@
+import math
+
+from derivater import (MathObject, eq_and_hash, mathify, register_function,
+                       Sine, NaturalLog, ln, sin, cos)
+from derivater._functions import _registry
+from derivater.__main__ import f, f_, x, y
+
+
+@register_function(lambda numerus: 1/(numerus*ln(2)), math.log2,
+                   numpy_name='log2', argument='numerus')
+@eq_and_hash({'numerus': None})
+class Base2Log(MathObject):
+
+    def __init__(self, numerus):
+        self.numerus = mathify(numerus)
+
+    def __repr__(self):
+        return 'log2(%r)' % self.numerus
+
+    def apply_to_content(self, func):
+        return Base2Log(func(self.numerus))
+
+
+def test_registry():
+    assert _registry[Sine].numpy_name == 'sin'
+    assert _registry[NaturalLog].argument == 'numerus'
+    assert _registry[Base2Log].evaluate is math.log2
+
+
+def test_custom_function():
+    assert Base2Log(x).derivative(x) == 1/(x*ln(2))
+    assert Base2Log(f(x)).derivative(x) == f_(x)/(f(x)*ln(2))
+    assert Base2Log(sin(x)).derivative(x) == cos(x)/(sin(x)*ln(2))
+    assert Base2Log(y).derivative(x) == mathify(0)
+    assert float(Base2Log(8)) == 3.0
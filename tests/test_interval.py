@@ -0,0 +1,76 @@
+import math
+import random
+
+import pytest
+
+from derivater import (NamedConstant, mathify, evaluate_interval, evalf, e,
+                       pi, sqrt, ln, sin, cos, tan, asin, acos, atan)
+from derivater.__main__ import f, x, y
+
+
+def contains(interval, value):
+    return interval[0] <= value <= interval[1]
+
+
+def test_simple_stuff():
+    assert evaluate_interval(mathify(3), {}) == (3.0, 3.0)
+    assert evaluate_interval(x + y, {x: (1, 2), 'y': 3}) == (4.0, 5.0)
+    lo, hi = evaluate_interval(x*y, {x: (-1, 2), y: (-3, 1)})
+    assert lo <= -6 and hi >= 3
+    assert (lo, hi) == pytest.approx((-6, 3))
+    assert evaluate_interval(x**2, {x: (-1, 2)})[0] == 0
+    assert evaluate_interval(1/x, {x: (0, 1)})[1] == math.inf
+    assert evaluate_interval(1/x, {x: (-1, 1)}) == (-math.inf, math.inf)
+    assert evaluate_interval(sin(x), {x: (0, 10)}) == (-1, 1)
+    assert evaluate_interval(tan(x), {x: (1, 2)}) == (-math.inf, math.inf)
+
+    # 1/3 is not a float, so the interval must have 2 different floats
+    lo, hi = evaluate_interval(mathify(1)/3, {})
+    assert lo < hi
+    assert lo == pytest.approx(1/3) and hi == pytest.approx(1/3)
+    assert contains(evaluate_interval(pi, {}), math.pi)
+    assert contains(evaluate_interval(mathify(10)**400, {}), math.inf)
+
+
+def test_overflow_with_negative_base():
+    for expr, interval in [(x**3, (-1e200, -1e150)),
+                           (x**1001, (-10, -5))]:
+        lo, hi = evaluate_interval(expr, {x: interval})
+        assert lo == -math.inf and -math.inf < hi < -1e300
+
+    lo, hi = evaluate_interval(x**1000, {x: (-10, -5)})
+    assert 1e300 < lo < math.inf and hi == math.inf
+    assert evaluate_interval(x**3, {x: (-1e200, 1e200)}) == (
+        -math.inf, math.inf)
+
+
+def test_random_points():
+    rng = random.Random(123)
+    k = NamedConstant('k', 0.5)
+    for expr in [x**2 - x, sin(x)*cos(y), tan(x/3), atan(x*y) + e**x,
+                 asin(x/4) - acos(y/4), sqrt(x**2 + 1)*ln(y**2 + 1),
+                 y**x - k*y**(-3), (y**y).derivative(y)]:
+        for i in range(50):
+            x_interval = sorted([rng.uniform(-3, 3), rng.uniform(-3, 3)])
+            y_interval = sorted([rng.uniform(0.1, 3), rng.uniform(0.1, 3)])
+            result = evaluate_interval(
+                expr, {x: tuple(x_interval), y: tuple(y_interval)})
+            for j in range(20):
+                values = {x: rng.uniform(*x_interval),
+                          y: rng.uniform(*y_interval)}
+                assert contains(result, evalf(expr, values, prec=30))
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='^no interval for y was given$'):
+        evaluate_interval(x + y, {x: 1})
+    with pytest.raises(ValueError):
+        evaluate_interval(x, {x: (2, 1)})
+    with pytest.raises(ValueError):
+        evaluate_interval(ln(x), {x: (-1, 1)})
+    with pytest.raises(ValueError):
+        evaluate_interval(asin(x), {x: (0, 2)})
+    with pytest.raises(ValueError):
+        evaluate_interval(x**(mathify(1)/2), {x: (-1, 1)})
+    with pytest.raises(TypeError):
+        evaluate_interval(f(x), {x: 1})
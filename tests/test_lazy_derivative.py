@@ -0,0 +1,131 @@
+import math
+import random
+
+import pytest
+
+from derivater import (Derivative, SymbolFunction, mathify, compile_function,
+                       evalf, evaluate_interval, e, sqrt, ln, sin, cos, tan,
+                       asin, acos, atan, register_function, MathObject,
+                       eq_and_hash)
+from derivater.__main__ import a, f, x, y
+
+
+def test_materialize():
+    d = Derivative(x**3*a, x)
+    assert d.materialize() == 3*a*x**2
+    assert repr(d) == '3*a*x**2'
+    assert d.simplify() == 3*a*x**2
+    assert Derivative(x**3, x, 2, at=y).materialize() == 6*y
+    assert Derivative(Derivative(x**2*y, y), x).materialize() == 2*x
+    assert d != 3*a*x**2
+    assert d == Derivative(x**3*a, x)
+    assert d.digest() != Derivative(x**3*a, x, 2).digest()
+    assert d.digest() != Derivative(x**3*a, a).digest()
+
+
+def test_gentle_simplify():
+    assert Derivative(f(x), x, 2).gentle_simplify() == SymbolFunction(
+        'f', x, derivative_count=2)
+    assert Derivative(f(x), x, at=3).gentle_simplify() == SymbolFunction(
+        'f', 3, derivative_count=1)
+    assert Derivative(Derivative(f(x), x), x).gentle_simplify() == \
+        SymbolFunction('f', x, derivative_count=2)
+    assert Derivative(sin(y), x) + 0 == mathify(0)
+    assert Derivative(x, x) + 0 == mathify(1)
+    assert Derivative(x, x, 2) + 0 == mathify(0)
+    assert Derivative(x**2, x, 0, at=5) + 0 == mathify(25)
+
+    nested = Derivative(Derivative(sin(x), x), x, 2).gentle_simplify()
+    assert isinstance(nested, Derivative)
+    assert nested.n == 3
+
+
+def test_derivative_and_replace():
+    d = Derivative(x**3*a, x)
+    assert d.derivative(x) == Derivative(x**3*a, x, 2)
+    assert d.derivative(a) == 3*x**2
+    assert d.may_depend_on(x)
+    assert not Derivative(x**2, x, at=2).may_depend_on(x)
+
+    # replacing something else than x keeps it lazy
+    assert d.replace(a, 3) == Derivative(x**3*3, x)
+    # the derivative must be taken before replacing x
+    assert d.replace(x, 2).gentle_simplify() == 12*a
+
+
+def test_float():
+    d = Derivative(x**3 + sin(x), x, 2, at=2)
+    assert float(d) == pytest.approx(12 - math.sin(2))
+    assert float(Derivative(x**5, x, 5, at=3)) == 120
+    assert float(Derivative(ln(x), x, 3, at=2)) == pytest.approx(2/8)
+    assert float(Derivative(mathify(7), x, at=2)) == 0
+    with pytest.raises(TypeError):
+        float(Derivative(x**2, x))
+    with pytest.raises(TypeError):
+        float(Derivative(x*y, x, at=1))
+    with pytest.raises(TypeError):
+        float(Derivative(f(x), x, 2, at=1) + Derivative(f(x)*x, x, at=1))
+
+
+def test_evalf_and_interval():
+    d = Derivative(e**(2*x), x, 3, at=mathify(1)/2)
+    assert evalf(d, prec=30) == evalf(8*e, prec=30)
+    lo, hi = evaluate_interval(Derivative(x**2, x), {x: (1, 2)})
+    assert lo <= 2 and hi >= 4
+
+
+def test_forward_mode_random_points():
+    rng = random.Random(123)
+    for expr in [x**3 + sin(x), tan(x)*e**x, ln(x**2 + 1)/x,
+                 sqrt(x)*atan(x*y), asin(x/4) + acos(x/5), x**x, y**(x/2),
+                 cos(x)**(-2), (1 + x)**(mathify(1)/3), 1/(x + y)]:
+        for n in range(3):
+            d = Derivative(expr, x, n)
+            func = compile_function(d, [x, y])
+            materialized = d.materialize()
+            for i in range(3):
+                xval = rng.uniform(0.2, 2)
+                yval = rng.uniform(0.2, 2)
+                expected = float(evalf(materialized, {x: xval, y: yval}))
+                assert func(xval, yval) == pytest.approx(expected, rel=1e-9)
+
+
+def test_compile():
+    d = Derivative(x**2*y, x)
+    func = compile_function([d, d*y], [x, y])
+    assert func(3, 2) == (12, 24)
+    assert func.source.count('_derivative_') == 1
+
+    # at is compiled too, and constant derivatives are folded
+    func = compile_function(Derivative(sin(x), x, at=y**2) + x, [x, y])
+    assert func(1, 2) == pytest.approx(1 + math.cos(4))
+    func = compile_function(x + Derivative(x**3, x, at=2), [x])
+    assert '_derivative_' not in func.source
+    assert func(1) == 13
+
+    with pytest.raises(ValueError):
+        compile_function(Derivative(x*y, x), [x])
+
+
+def test_registered_function():
+    @register_function(lambda arg: 1/(1 + arg**2), math.atan)
+    @eq_and_hash({'arg': None})
+    class MyAtan(MathObject):
+        def __init__(self, arg):
+            self.arg = mathify(arg)
+
+        def apply_to_content(self, func):
+            return MyAtan(func(self.arg))
+
+    func = compile_function(Derivative(MyAtan(x**2), x, 3), [x])
+    expected = float(evalf(Derivative(atan(x**2), x, 3), {x: 0.7}))
+    assert func(0.7) == pytest.approx(expected)
+
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    d = Derivative(sin(x)*e**(x*y) + sqrt(x), x, 2)
+    func = compile_function(d, [x, y], numpy=True)
+    xs = numpy.linspace(0.1, 2, 10)
+    expected = [float(evalf(d, {x: float(xv), y: 0.5})) for xv in xs]
+    assert func(xs, 0.5) == pytest.approx(expected)
@@ -1,11 +1,14 @@
 import fractions
 import functools
 import operator
+import os
+import subprocess
+import sys
 
 import pytest
 
-from derivater import (MathObject, Add, Mul, Pow, Integer,
-                       mathify, pythonify, ln)
+from derivater import (MathObject, Add, Mul, Pow, Integer, NamedConstant,
+                       Sine, mathify, pythonify, ln, sin, e)
 from derivater.__main__ import x, y, half
 
 
@@ -130,3 +133,27 @@ def test_integers():
     with pytest.raises(TypeError,
                        match=r"cannot create a new Integer of an Integer$"):
         Integer(Integer(2))
+
+
+def test_digest():
+    things = [x, y, mathify(2), mathify(-2), x + y, x*y, x**y, y**x, ln(x),
+              sin(x), e, NamedConstant('e', 1.0), Add([x, x]), Add([x])]
+    digests = [thing.digest() for thing in things]
+    assert len(set(digests)) == len(things)
+    assert (x + 2*y).digest() == Add([2*y, x]).digest()
+
+    deep = x
+    for i in range(3000):   # more than sys.getrecursionlimit()
+        deep = Sine(Add([deep, 1]))
+    assert len(deep.digest()) == 16
+
+
+def test_digest_in_another_process():
+    code = ('from derivater.__main__ import *; '
+            'print((x**x*sin(y) + e).digest().hex())')
+    results = set()
+    for seed in ['1', '2']:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        results.add(subprocess.check_output(
+            [sys.executable, '-c', code], env=env).decode('ascii').strip())
+    assert results == {(x**x*sin(y) + e).digest().hex()}
@@ -0,0 +1,97 @@
+import math
+
+import pytest
+
+import derivater.optimize
+from derivater import e, ln, sin
+from derivater.__main__ import a, b, x, y, z
+from derivater.optimize import minimize
+
+
+ROSENBROCK = (1 - x)**2 + 100*(y - x**2)**2
+
+
+@pytest.mark.parametrize('method', ['lbfgs', 'newton'])
+def test_rosenbrock(method):
+    result = minimize(ROSENBROCK, [x, y], [-1.2, 1], method=method)
+    assert result.converged
+    assert result.point == pytest.approx([1, 1])
+    assert result.value == pytest.approx(0, abs=1e-12)
+    assert result.iterations < 100
+
+
+def test_gradient_descent():
+    result = minimize((x - 1)**2 + (y - 2)**2 + x*y/2, [x, y], [0, 0],
+                      method='gradient-descent')
+    assert result.converged
+    # the gradient is 2*(x - 1) + y/2 and 2*(y - 2) + x/2
+    assert result.point == pytest.approx([8/15, 28/15])
+
+    result = minimize(ROSENBROCK, [x, y], [-1.2, 1],
+                      method='gradient-descent', max_iterations=10)
+    assert not result.converged
+    assert result.iterations == 10
+    assert result.value < 24.2
+
+
+def test_parameters():
+    # fitting a line a*t + b to the points (0, 1), (1, 3), (2, 5)
+    error = sum((a*t + b - value)**2 for t, value in [(0, 1), (1, 3), (2, 5)])
+    result = minimize(error, [a, b], [0, 0])
+    assert result.point == pytest.approx([2, 1])
+
+    expr = (x - a)**2 + e**(x*b)
+    derivater.optimize._compile_objective.cache_clear()
+    for value in range(1, 4):
+        result = minimize(expr, [x], [0], {'a': value, b: 1})
+        assert result.converged
+        assert 2*(result.point[0] - value) + math.exp(result.point[0]) == \
+            pytest.approx(0, abs=1e-7)
+    assert derivater.optimize._compile_objective.cache_info().misses == 1
+
+
+def test_domain_errors():
+    # the line search must not step to x <= 0
+    result = minimize(x - 2*ln(x), [x], [10])
+    assert result.converged
+    assert result.point == pytest.approx([2])
+
+    # starting outside the domain
+    for method in derivater.optimize.METHODS:
+        result = minimize(ln(x), [x], [-1], method=method)
+        assert result == ([-1.0], math.inf, False, 0)
+
+    # no minimum, the value decreases forever
+    result = minimize(x + sin(y), [x, y], [0, 0], max_iterations=5)
+    assert not result.converged
+
+
+def test_newton_not_convex():
+    # the hessian is not positive definite at the start point
+    result = minimize(x**4 - 2*x**2 + y**2 + z**2, [x, y, z], [0.1, 1, -1],
+                      method='newton')
+    assert result.converged
+    assert result.point == pytest.approx([1, 0, 0], abs=1e-8)
+
+
+def test_newton_bad_hessian():
+    for bad in [math.nan, math.inf]:
+        hessian = [[1.0, bad], [bad, 1.0]]
+        assert derivater.optimize._newton_direction([1.0, -2.0], hessian) \
+            == [-1.0, 2.0]
+
+    # off-diagonal entries much bigger than the diagonal need lots of damping
+    direction = derivater.optimize._newton_direction(
+        [1.0, 1.0], [[0.0, 1e30], [1e30, 0.0]])
+    assert direction[0] < 0 and direction[1] < 0
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        minimize(x**2, [x], [1], method='lol')
+    with pytest.raises(ValueError):
+        minimize(x**2, [x], [1, 2])
+    with pytest.raises(ValueError):
+        minimize(x**2 + a, [x], [1])
+    with pytest.raises(TypeError):
+        minimize(x**2, ['x'], [1])
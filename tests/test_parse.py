@@ -0,0 +1,84 @@
+import pytest
+
+from derivater import (parse, Symbol, SymbolFunction, Mul, Pow, mathify,
+                       sin, cos, tan, asin, acot, ln, log, exp, sqrt, pi)
+from derivater.__main__ import x, y, a, b, c, f, g, f_, half
+
+
+def test_basic_stuff():
+    assert parse('x') == x
+    assert parse('  123 ') == mathify(123)
+    assert parse('a*x**2 + b*x + c') == a*x**2 + b*x + c
+    assert parse('x - y - 1') == x - y - 1
+    assert parse('x / y / 2') == x / y / 2
+    assert parse('1.25') == mathify(5) / 4
+    assert parse('.5*x') == half*x
+
+
+def test_precedence():
+    assert parse('-x**2') == -(x**2)
+    assert parse('2**-x') == 2**(-x)
+    assert parse('x**y**2') == x**(y**2)
+    assert parse('(x**y)**2') == (x**y)**2
+    assert parse('x - (y - 1)') == x - (y - 1)
+    assert parse('x*(y + 1)') == x*(y + 1)
+    assert parse('--x') == x
+
+
+def test_functions_and_constants():
+    assert parse('sin(x) + cos(2*x)') == sin(x) + cos(2*x)
+    assert parse('tan(asin(x))*acot(x)') == tan(asin(x))*acot(x)
+    assert parse('ln(e)') == mathify(1)
+    assert parse('log(x, 2)') == log(x, 2)
+    assert parse('exp(x) + sqrt(x)') == exp(x) + sqrt(x)
+    assert parse('2*pi') == 2*pi
+    assert parse("f''(x) + g(f'(x))") == (
+        SymbolFunction('f', x, derivative_count=2) + g(f_(x)))
+
+
+def test_symbols_argument():
+    k = Symbol('k')
+    assert parse('k*x', symbols={'k': 2}) == 2*x
+    assert parse('k', symbols={'k': 2}) == mathify(2)
+    with pytest.raises(TypeError):
+        parse('k', symbols={'k': 2.5})
+    assert parse('k*x', symbols={'k': k}) == k*x
+    assert parse('e', symbols={'e': Symbol('e')}) == Symbol('e')
+
+
+def test_round_trip():
+    things = [
+        (x**x).derivative(x),
+        ln(f(x)).derivative(x),
+        f(g(x)).derivative(x),
+        -(x + 2*y)**(-3*x) / (3*sin(x)**2) - x/(x + y) + (x*y)**-half,
+        Mul([Pow(x/y, -2)]).gentle_simplify(),
+        tan(x).derivative(x),
+        x - (y - 1),
+    ]
+    for thing in things:
+        assert parse(repr(thing)) == thing
+
+
+def test_errors():
+    for text, message in [
+            ('', "unexpected end at position 0 of ''"),
+            ('x +', "unexpected end at position 3 of 'x +'"),
+            ('(x', "expected ')' at position 2 of '(x'"),
+            ('x y', "unexpected 'y' at position 2 of 'x y'"),
+            ('x $ y', "unexpected '$' at position 2 of 'x $ y'"),
+            ('sin(x, y)', "wrong number of arguments to sin() at position 0 "
+                          "of 'sin(x, y)'"),
+            ('__import__("os")', "unexpected '\"' at position 11 of "
+                                 "'__import__(\"os\")'")]:
+        with pytest.raises(ValueError) as error:
+            parse(text)
+        assert str(error.value) == message
+
+    for depth in [2000, 10**5]:
+        with pytest.raises(ValueError, match="too deeply nested"):
+            parse('(' * depth + 'x' + ')' * depth)
+        with pytest.raises(ValueError, match="too deeply nested"):
+            parse('sin(' * depth + 'x' + ')' * depth)
+    with pytest.raises(ValueError, match="too deeply nested"):
+        parse('-' * 10**5 + 'x')
@@ -0,0 +1,91 @@
+import pytest
+
+from derivater import (Add, NamedConstant, Symbol, mathify, e, pi, ln, sin,
+                       cos, tan, asin, acos, atan, sqrt)
+from derivater.pool import NodePool
+from derivater.__main__ import x, y, f
+
+
+EXPRESSIONS = [
+    x**2 + sin(x),
+    x**x,
+    2**x * ln(x) / (1 + y),
+    tan(x) + atan(x*y) - asin(x/2) + acos(x/3),
+    e**(3*x) + pi*sqrt(x) + NamedConstant('k', 1.5)*x,
+    mathify(-12345678901234567890),
+    Add([x, x]),
+]
+
+
+def test_round_trip(tmp_path):
+    pool = NodePool(EXPRESSIONS)
+    assert len(pool) == len(EXPRESSIONS)
+    for index, expr in enumerate(EXPRESSIONS):
+        assert pool[index] == expr
+    assert pool[-1] == Add([x, x])
+
+    pool.save(tmp_path / 'pool')
+    for memory_map in [True, False]:
+        loaded = NodePool.load(tmp_path / 'pool', memory_map=memory_map)
+        assert loaded.node_count == pool.node_count
+        # named constants compare by identity, and loading creates new ones
+        assert ([repr(loaded[i]) for i in range(len(loaded))] ==
+                list(map(repr, EXPRESSIONS)))
+        assert loaded[4] != EXPRESSIONS[4]
+        assert loaded.evaluate(4, {'x': 2}) == pool.evaluate(4, {'x': 2})
+
+        # adding copies the memory mapped arrays
+        assert loaded.add(x**2 + sin(x)) == len(EXPRESSIONS)
+        assert loaded.node_count == pool.node_count
+        assert loaded.add(cos(y)) == len(EXPRESSIONS) + 1
+        assert loaded[-1] == cos(y)
+
+
+def test_sharing():
+    pool = NodePool()
+    pool.add(sin(x**2 + y))
+    count = pool.node_count
+    pool.add(cos(x**2 + y))
+    assert pool.node_count == count + 1
+
+
+def test_evaluate():
+    pool = NodePool(EXPRESSIONS[:5])
+    values = {x: 0.3, 'y': 0.7}
+    for index, expr in enumerate(EXPRESSIONS[:5]):
+        expected = float(expr.replace(x, 3*mathify(1)/10)
+                         .replace(y, 7*mathify(1)/10))
+        assert pool.evaluate(index, values) == pytest.approx(expected)
+
+    with pytest.raises(ValueError, match='^no value for y was given$'):
+        pool.evaluate(2, {'x': 1})
+    with pytest.raises(TypeError, match=r"^cannot evaluate f'\(\)$"):
+        NodePool([f(x).derivative(x)]).evaluate(0, {'x': 1})
+
+
+def test_derivative():
+    pool = NodePool(EXPRESSIONS[:5] + [f(x**2)])
+    for index, expr in enumerate(EXPRESSIONS[:5]):
+        derivative = pool[pool.derivative(index, x)]
+        expected = expr.derivative(x)
+        for value in [0.3, 0.5]:
+            def evaluate(obj):
+                return float(obj.replace(x, mathify(int(value * 10)) / 10)
+                             .replace(y, mathify(7) / 10))
+            assert evaluate(derivative) == pytest.approx(evaluate(expected))
+
+    assert pool[pool.derivative(5, x)].gentle_simplify() == (
+        f(x**2).derivative(x))
+    assert pool[pool.derivative(0, Symbol('z'))] == mathify(0)
+
+
+def test_invalid_files(tmp_path):
+    path = tmp_path / 'pool'
+    path.write_bytes(b'lol')
+    with pytest.raises(ValueError):
+        NodePool.load(path)
+
+    NodePool(EXPRESSIONS).save(path)
+    path.write_bytes(path.read_bytes()[:100])
+    with pytest.raises(ValueError):
+        NodePool.load(path)
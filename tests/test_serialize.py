@@ -0,0 +1,124 @@
+import math
+
+import pytest
+
+from derivater import (dumps, loads, MathObject, NamedConstant, Symbol, Add,
+                       Mul, Pow, Derivative, mathify, eq_and_hash,
+                       register_function, sin, cos, tan, asin, acos, atan, ln,
+                       e, pi)
+from derivater.__main__ import x, y, f, g_
+
+
+@register_function(lambda arg: sinh(arg), math.cosh)
+@eq_and_hash({'arg': None})
+class HyperbolicCosine(MathObject):
+
+    def __init__(self, arg):
+        self.arg = mathify(arg)
+
+    def __repr__(self):
+        return 'cosh(%r)' % self.arg
+
+    def apply_to_content(self, func):
+        return HyperbolicCosine(func(self.arg))
+
+
+@register_function(lambda arg: HyperbolicCosine(arg), math.sinh)
+@eq_and_hash({'arg': None})
+class HyperbolicSine(MathObject):
+
+    def __init__(self, arg):
+        self.arg = mathify(arg)
+
+    def __repr__(self):
+        return 'sinh(%r)' % self.arg
+
+    def apply_to_content(self, func):
+        return HyperbolicSine(func(self.arg))
+
+
+sinh = HyperbolicSine
+
+
+def test_round_trip():
+    things = [
+        mathify(0), mathify(-123456789012345678901234567890), x, e, pi,
+        (x**x).derivative(x),
+        sin(x) + cos(x) + tan(x) + asin(x) + acos(x) + atan(x) + ln(x),
+        f(g_(x)*y).derivative(x),
+        Add([x, x]),
+        Mul([]),
+    ]
+    for thing in things:
+        loaded = loads(dumps(thing))
+        assert loaded == thing
+        assert type(loaded) is type(thing)
+        assert repr(loaded) == repr(thing)
+
+    # nothing is simplified
+    assert loads(dumps(Add([x, x]))).objects == (x, x)
+    assert loads(dumps(e)) is e
+
+
+def test_registered_functions_and_derivatives():
+    things = [
+        HyperbolicSine(x**2) + HyperbolicCosine(HyperbolicSine(y)),
+        Derivative(x**3 + sin(x), x, 2),
+        Derivative(HyperbolicSine(x*y), x, at=y + 1),
+    ]
+    for thing in things:
+        loaded = loads(dumps(thing))
+        assert loaded == thing
+        assert repr(loaded) == repr(thing)
+    assert loads(dumps(things[1])).n == 2
+
+    data = dumps(HyperbolicSine(x))
+    assert 'test_serialize.HyperbolicSine'.encode('ascii') in data
+    with pytest.raises(ValueError, match="unknown function"):
+        loads(data.replace(b'Hyperbolic', b'Hyperbolix'))
+
+
+def test_sharing():
+    thing = sin(x + y)
+    for i in range(30):
+        # this would be huge as a tree
+        thing = Add([thing, thing])
+    assert len(dumps(thing)) < 200
+
+    loaded = loads(dumps(thing))
+    assert loaded.objects[0] is loaded.objects[1]
+
+    # equal things are shared too
+    loaded = loads(dumps(Add([Pow(x, 2), Pow(x, 2)])))
+    assert loaded.objects[0] is loaded.objects[1]
+
+
+def test_deep():
+    thing = x
+    for i in range(3000):   # more than sys.getrecursionlimit()
+        thing = Pow(Add([thing, 1]), 2)
+    assert repr(loads(dumps(thing))) == repr(thing)
+
+
+def test_new_constants():
+    phi = NamedConstant('phi', 1.618)
+    loaded = loads(dumps(Add([phi, Mul([2, phi])])))
+    assert loaded.objects[0] is loaded.objects[1].objects[1]
+    assert loaded.objects[0] is not phi
+    assert str(loaded.objects[0]) == 'phi'
+    assert float(loaded.objects[0]) == 1.618
+
+
+def test_errors():
+    class Toot(MathObject):
+        pass
+
+    with pytest.raises(TypeError):
+        dumps(x + Toot())
+    with pytest.raises(TypeError):
+        dumps(Symbol)
+
+    data = dumps(x + y)
+    for bad_data in [b'', b'lol', data[:-1], data + b'\x00']:
+        with pytest.raises(ValueError):
+            loads(bad_data)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+
+from derivater.server import Server
+
+
+async def post(server, path, request):
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    body = json.dumps(request).encode('utf-8')
+    writer.write(b'POST %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s'
+                 % (path.encode('ascii'), len(body), body))
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b'\r\n\r\n', 1)
+    status = int(head.split()[1])
+    return (status, json.loads(body.decode('utf-8')))
+
+
+def run_with_server(function, **kwargs):
+    async def main():
+        server = Server(port=0, workers=2, **kwargs)
+        await server.start()
+        try:
+            return await function(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_operations():
+    async def function(server):
+        assert await post(server, '/derivative',
+                          {'expr': 'sin(x)*y', 'wrt': 'x'}) == (
+            200, {'result': 'y*cos(x)'})
+        assert await post(server, '/simplify', {'expr': 'x + x'}) == (
+            200, {'result': '2*x'})
+        assert await post(server, '/evaluate', {
+            'expr': '2*x*y + 1', 'values': {'x': 2, 'y': 0.25}}) == (
+            200, {'result': 2.0})
+
+    run_with_server(function)
+
+
+def test_errors():
+    async def function(server):
+        status, response = await post(server, '/derivative', {'expr': 'x'})
+        assert status == 400
+        assert response == {'error': '"wrt" must be the name of a variable'}
+
+        status, response = await post(server, '/simplify', {'expr': '(x'})
+        assert status == 400
+        assert response == {'error': "expected ')' at position 2 of '(x'"}
+
+        status, response = await post(server, '/evaluate', {'expr': 'x'})
+        assert status == 400        # x has no value
+
+        status, response = await post(server, '/evaluate', {
+            'expr': 'x', 'values': {'x': True}})
+        assert status == 400
+        assert response == {'error': '"values" must be an object with numbers'}
+
+        status, response = await post(server, '/lol', {'expr': 'x'})
+        assert status == 404
+
+        for request in [b'GET /derivative HTTP/1.1\r\n\r\n',
+                        b'POST /simplify HTTP/1.1\r\n'
+                        b'Content-Length: -1\r\n\r\n',
+                        b'POST /simplify HTTP/1.1\r\n'
+                        b'X-Lol: ' + b'a'*100000 + b'\r\n\r\n',
+                        b'POST /simplify HTTP/1.1\r\n'
+                        b'Content-Length: 100\r\n\r\n{}']:
+            reader, writer = await asyncio.open_connection(
+                '127.0.0.1', server.port)
+            writer.write(request)
+            writer.write_eof()
+            status = int((await reader.read()).split()[1])
+            assert status == (405 if request.startswith(b'GET') else 400)
+            writer.close()
+
+    run_with_server(function)
+
+
+def test_coalescing_and_cache():
+    async def function(server):
+        request = {'expr': 'x**x**x**x', 'wrt': 'x'}
+        results = await asyncio.gather(
+            *[post(server, '/derivative', request) for i in range(5)])
+        assert len(set(json.dumps(result) for result in results)) == 1
+        assert server.computed == 1
+        assert server.coalesced + server.cache_hits == 4
+
+        await post(server, '/derivative', request)
+        assert server.computed == 1
+
+        # the first one gets evicted from the cache
+        await post(server, '/simplify', {'expr': 'x'})
+        await post(server, '/simplify', {'expr': 'y'})
+        await post(server, '/derivative', request)
+        assert server.computed == 4
+
+    run_with_server(function, cache_size=2)
+
+
+def test_cancelled_request():
+    async def function(server):
+        request = {'expr': 'x**x**x**x', 'wrt': 'x'}
+        first = asyncio.ensure_future(server.compute('/derivative', request))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # the job is still running, so this waits for it
+        await server.compute('/derivative', request)
+        assert (server.computed, server.coalesced) == (1, 1)
+        await server.compute('/derivative', request)
+        assert server.cache_hits == 1
+
+    run_with_server(function)
+
+
+def test_time_limit():
+    async def function(server):
+        status, response = await post(
+            server, '/derivative', {'expr': 'x**x**x**x**x**x', 'wrt': 'x'})
+        assert status == 503
+        assert response == {'error': 'more than 1e-05 seconds elapsed'}
+        assert await post(server, '/simplify', {'expr': 'x'}) == (
+            200, {'result': 'x'})
+
+    run_with_server(function, time_limit=1e-5)
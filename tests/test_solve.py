@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+import derivater.solve
+from derivater import cos, ln, sqrt, e
+from derivater.__main__ import a, b, x, y
+from derivater.solve import newton
+
+
+def test_numbers_and_lists():
+    result = newton(x**3 - a*x - b, x, 1, {a: 2, 'b': 5})
+    assert result.converged is True
+    assert result.roots**3 - 2*result.roots - 5 == pytest.approx(0, abs=1e-12)
+    assert isinstance(result.iterations, int)
+
+    result = newton(cos(x) - x, x, [0, 1, 100])
+    assert result.roots == pytest.approx([0.7390851332151607] * 3)
+    assert result.converged == [True, True, True]
+
+    result = newton(x**2 - a, x, (1, 1, 1), {a: [2, 3, 4]})
+    assert result.roots == pytest.approx([math.sqrt(2), math.sqrt(3), 2])
+
+    assert newton(3*x - 6, x, 0).roots == 2
+
+
+def test_failures():
+    # ln(-1) is a ValueError, and the derivative of x**2 + 1 is 0 at x=0
+    result = newton(ln(x), x, [-1, 0.5])
+    assert result.converged == [False, True]
+    assert result.roots == pytest.approx([-1, 1])
+
+    result = newton(x**2 + 1, x, [1.0], max_iterations=5)
+    assert result.converged == [False]
+    result = newton(x**2 + 1, x, [3.0], max_iterations=5)
+    assert result.converged == [False]
+    assert result.iterations == [5]
+
+    with pytest.raises(ValueError):
+        newton(x*y, x, 1)
+    with pytest.raises(ValueError):
+        newton(x, x, 1, max_iterations=0)
+    with pytest.raises(TypeError):
+        newton(x, 'x', 1)
+
+
+def test_compiled_once():
+    derivater.solve._compile_newton.cache_clear()
+    for i in range(5):
+        newton(e**x - a, x, [1.0], {a: i + 1})
+    assert derivater.solve._compile_newton.cache_info().misses == 1
+
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    starts = numpy.linspace(0.5, 5, 12).reshape(3, 4)
+    result = newton(x**2 - a, x, starts, {a: numpy.arange(1, 5)})
+    assert result.roots.shape == (3, 4)
+    assert result.converged.all()
+    assert result.roots == pytest.approx(
+        numpy.broadcast_to(numpy.sqrt(numpy.arange(1, 5)), (3, 4)))
+
+    result = newton(sqrt(x) - 2, x, numpy.array([-1.0, 1.0]))
+    assert list(result.converged) == [False, True]
+    assert result.roots[1] == pytest.approx(4)
@@ -0,0 +1,81 @@
+import threading
+
+import derivater._base
+from derivater import collect_stats, pythonify, Add, Mul, Pow, mathify
+from derivater.__main__ import x, y, half
+
+
+def test_counting():
+    with collect_stats() as stats:
+        assert (x*y).derivative(x) == y
+        # from-imported pythonify is not counted, it's not replaced
+        assert derivater.pythonify(half) == pythonify(half)
+
+    assert stats.calls['Mul', 'derivative'] == 1
+    assert stats.calls['Symbol', 'derivative'] == 2
+    assert stats.calls['Pow', 'pythonify'] == 1
+    assert stats.times['Mul', 'derivative'] > 0
+    assert stats.allocations['Mul'] > 0
+    assert stats.peak_size >= 1
+    assert 'Mul.derivative' in stats.report()
+
+
+def test_super_calls_and_recursion():
+    with collect_stats() as stats:
+        Add([x, y]).replace(x, y)   # Add.replace() calls MathObject.replace()
+    assert stats.calls['Add', 'replace'] == 1
+
+    with collect_stats() as stats:
+        Add([Add([x, y]), y]).gentle_simplify()
+    assert stats.calls['Add', 'gentle_simplify'] >= 2
+    assert stats.times['Add', 'gentle_simplify'] > 0
+
+
+def test_nesting_and_uninstalling():
+    original_derivative = Pow.derivative
+    original_pythonify = derivater._base.pythonify
+
+    with collect_stats() as outer:
+        with collect_stats() as inner:
+            (x**3).derivative(x)
+        (x**2).derivative(x)
+        assert Pow.derivative is not original_derivative
+
+    assert inner.calls['Pow', 'derivative'] == 1
+    assert outer.calls['Pow', 'derivative'] == 2
+    assert Pow.derivative is original_derivative
+    assert derivater._base.pythonify is original_pythonify
+    assert derivater.pythonify is original_pythonify
+
+    # nothing is collected afterwards
+    count = outer.calls['Mul', 'gentle_simplify']
+    Mul([x, mathify(2)]).gentle_simplify()
+    assert outer.calls['Mul', 'gentle_simplify'] == count
+
+
+def test_threads():
+    original_derivative = Pow.derivative
+    a_started = threading.Event()
+    a_done = threading.Event()
+    results = {}
+
+    def thread_b():
+        # this starts while thread a collects stats, and ends after it
+        a_started.wait()
+        with collect_stats() as stats:
+            (x**2).derivative(x)
+            a_done.wait()
+            (x**2).derivative(x)
+        results['b'] = stats
+
+    thread = threading.Thread(target=thread_b)
+    thread.start()
+    with collect_stats() as stats:
+        a_started.set()
+        (x**3).derivative(x)
+    a_done.set()
+    thread.join()
+
+    assert stats.calls['Pow', 'derivative'] == 1
+    assert results['b'].calls['Pow', 'derivative'] == 2
+    assert Pow.derivative is original_derivative
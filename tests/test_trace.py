@@ -0,0 +1,69 @@
+import io
+import json
+import threading
+
+from derivater import (trace_rewrites, trig_simplify, Add, Mul, Pow,
+                       mathify, sin)
+from derivater.__main__ import x, y
+
+
+def test_entries():
+    with trace_rewrites() as trace:
+        assert Pow(x, 1).gentle_simplify() == x
+    [entry] = trace.entries
+    assert entry.rule == 'Pow.one-exponent'
+    assert entry.input_digest == Pow(x, 1).digest().hex()
+    assert entry.output_digest == x.digest().hex()
+    assert entry.size_delta == -2
+    assert entry.seconds >= 0
+
+    # nothing changes, nothing is recorded
+    with trace_rewrites() as trace:
+        Pow(x, y).gentle_simplify()
+        sin(x).gentle_simplify()
+    assert trace.entries == []
+
+
+def test_rules():
+    with trace_rewrites() as trace:
+        Add([Add([x, y]), 1]).gentle_simplify()
+        Mul([x, 0]).gentle_simplify()
+        Pow(0, x).gentle_simplify()
+        trig_simplify(1 - sin(x)**2)
+    histogram = trace.histogram()
+    assert histogram['Add.flatten'] == 1
+    assert histogram['Mul.zero-factor'] == 1
+    assert histogram['Pow.zero-base'] == 1
+    assert histogram['trig.one-minus-sin-squared'] == 1
+    assert histogram['trig.pythagorean'] == 0
+
+
+def test_nesting_and_jsonl():
+    with trace_rewrites() as outer:
+        with trace_rewrites() as inner:
+            Pow(x, 0).gentle_simplify()
+        Pow(1, x).gentle_simplify()
+    assert len(inner.entries) == 1
+    assert len(outer.entries) == 2
+
+    file = io.StringIO()
+    outer.write_jsonl(file)
+    lines = file.getvalue().splitlines()
+    assert [json.loads(line)['rule'] for line in lines] == [
+        'Pow.zero-exponent', 'Pow.one-base']
+    assert set(json.loads(lines[0])) == {
+        'rule', 'input_digest', 'output_digest', 'size_delta', 'seconds'}
+
+    # not recording anymore
+    Pow(x, 0).gentle_simplify()
+    assert len(outer.entries) == 2
+    assert mathify(1) == Pow(x, 0).gentle_simplify()
+
+
+def test_threads():
+    with trace_rewrites() as trace:
+        thread = threading.Thread(
+            target=(lambda: Pow(x, 1).gentle_simplify()))
+        thread.start()
+        thread.join()
+    assert trace.entries == []